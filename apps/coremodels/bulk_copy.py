@@ -0,0 +1,146 @@
+import csv
+import io
+
+import pandas as pd
+from django.db import connections, models
+
+'''
+==========================================================
+            Carga em massa via COPY (PostgreSQL)
+==========================================================
+'''
+
+NULL_MARKER = '\\N'
+
+
+def supports_copy(using='default'):
+    """Return True when the database behind `using` accepts COPY FROM STDIN."""
+    return connections[using].vendor == 'postgresql'
+
+
+def model_columns(model, frame):
+    """
+    Return the concrete, non-PK fields of `model` whose attname is a column of `frame`.
+    """
+    return [
+        field for field in model._meta.concrete_fields
+        if not field.primary_key and field.attname in frame.columns
+    ]
+
+
+def fill_model_defaults(model, frame):
+    """
+    Fill missing values with the Python-side model defaults.
+
+    The ORM applies `default=` when instantiating the model; COPY talks to the
+    table directly, so NOT NULL columns with a default must be filled here.
+    """
+    for field in model._meta.concrete_fields:
+        if field.primary_key or not field.has_default():
+            continue
+        if field.attname not in frame.columns:
+            frame[field.attname] = field.get_default()
+        elif not field.null:
+            frame[field.attname] = frame[field.attname].astype(object).where(
+                frame[field.attname].notna(), field.get_default()
+            )
+    return frame
+
+
+def create_staging_table(cursor, model, fields, name=None):
+    """
+    Create an empty temporary table with the same column types as `model`.
+    The table is dropped automatically when the transaction commits.
+    """
+    quote = cursor.db.ops.quote_name
+    staging = name or f"{model._meta.db_table}_staging"
+    columns = ', '.join(quote(field.column) for field in fields)
+    cursor.execute(f"DROP TABLE IF EXISTS {quote(staging)}")
+    cursor.execute(
+        f"CREATE TEMP TABLE {quote(staging)} ON COMMIT DROP AS "
+        f"SELECT {columns} FROM {quote(model._meta.db_table)} WITH NO DATA"
+    )
+    return staging
+
+
+def copy_payload(frame, fields):
+    """
+    Return the CSV text sent to COPY for the `fields` columns of `frame`,
+    with NULL_MARKER for missing values.
+    """
+    buffer = io.StringIO()
+    frame[[field.attname for field in fields]].to_csv(
+        buffer, index=False, header=False, na_rep=NULL_MARKER, quoting=csv.QUOTE_MINIMAL
+    )
+    return buffer.getvalue()
+
+
+def copy_frame(cursor, staging, frame, fields):
+    """
+    Stream `frame` into the staging table with a single COPY FROM STDIN.
+    """
+    quote = cursor.db.ops.quote_name
+    buffer = io.StringIO(copy_payload(frame, fields))
+
+    columns = ', '.join(quote(field.column) for field in fields)
+    sql = f"COPY {quote(staging)} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '{NULL_MARKER}')"
+
+    raw_cursor = cursor.cursor
+    if hasattr(raw_cursor, 'copy_expert'):
+        # psycopg2
+        raw_cursor.copy_expert(sql, buffer)
+    else:
+        # psycopg 3
+        with raw_cursor.copy(sql) as copy:
+            copy.write(buffer.getvalue())
+
+
+def merge_staging(cursor, model, staging, fields, conflict_fields):
+    """
+    Merge the staging table into the model table with one
+    INSERT ... ON CONFLICT DO UPDATE and return the number of affected rows.
+    """
+    quote = cursor.db.ops.quote_name
+    columns = ', '.join(quote(field.column) for field in fields)
+    conflict = ', '.join(quote(column) for column in conflict_fields)
+    updates = ', '.join(
+        f"{quote(field.column)} = EXCLUDED.{quote(field.column)}"
+        for field in fields if field.column not in conflict_fields
+    )
+
+    # DISTINCT ON keeps a single row per key, otherwise Postgres refuses to
+    # update the same target row twice within one statement.
+    cursor.execute(
+        f"INSERT INTO {quote(model._meta.db_table)} ({columns}) "
+        f"SELECT DISTINCT ON ({conflict}) {columns} FROM {quote(staging)} "
+        f"ON CONFLICT ({conflict}) DO UPDATE SET {updates}"
+    )
+    return cursor.rowcount
+
+
+def is_integer_column(field):
+    """True for integer fields and for foreign keys to an integer primary key."""
+    target = field.target_field if field.is_relation else field
+    return isinstance(target, models.IntegerField)
+
+
+def records_to_frame(model, records):
+    """
+    Build a DataFrame from record dicts, replacing model instances by their PK
+    under the field attname (e.g. `venda` -> `venda_id`).
+
+    The integer columns of `model` are cast to Int64 from the field type, so a
+    NULL in a column does not turn its ids into floats ('1.0' is rejected by COPY).
+    """
+    frame = pd.DataFrame.from_records(records)
+    for column in list(frame.columns):
+        sample = frame[column].dropna()
+        if not sample.empty and hasattr(sample.iloc[0], '_meta'):
+            frame[f"{column}_id"] = pd.Series(
+                [obj.pk if hasattr(obj, 'pk') else None for obj in frame.pop(column)],
+                index=frame.index, dtype=object
+            )
+    for field in model._meta.concrete_fields:
+        if field.attname in frame.columns and is_integer_column(field):
+            frame[field.attname] = pd.to_numeric(frame[field.attname]).astype('Int64')
+    return frame
@@ -0,0 +1,219 @@
+import json
+import os
+import re
+import tempfile
+import threading
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+'''
+==========================================================
+        Índice de faixas de CEP (Lista_de_CEPs.xlsx)
+==========================================================
+'''
+
+SOURCE_PATH = Path(settings.BASE_DIR) / 'datasets' / 'Lista_de_CEPs.xlsx'
+INDEX_DIR = Path(settings.BASE_DIR) / 'datasets' / 'cep_index'
+RANGES_FILE = 'faixas.npy'
+LOCALIDADES_FILE = 'localidades.json'
+
+NOT_FOUND = -1
+INVALID = -2
+
+# One row per CEP range, sorted by (inicio, fim, localidade) like the old list of tuples
+RANGE_DTYPE = np.dtype([('inicio', '<i4'), ('fim', '<i4'), ('localidade', '<i4')])
+
+_NON_DIGITS = re.compile(r'\D')
+
+
+def normalize_cep(cep):
+    """'12.345-678' / 12345678 -> 12345678; None for values that are not an 8-digit CEP."""
+    if cep is None:
+        return None
+    digits = _NON_DIGITS.sub('', str(cep))
+    if not digits or len(digits) > 8:
+        return None
+    return int(digits)
+
+
+# Longer strings are not taken as CEPs (keeps the character matrix below small)
+MAX_CEP_TEXT_LENGTH = 32
+
+
+def normalize_ceps(ceps):
+    """
+    Vectorized normalize_cep: int64 array with the numeric CEP of each value,
+    -1 where it is not a CEP. Values are compared as text, reading the digits
+    straight from the unicode code points instead of parsing each string.
+    """
+    try:
+        text = np.asarray(ceps if isinstance(ceps, np.ndarray) else list(ceps), dtype=str)
+    except ValueError:
+        text = None
+    if text is None or text.ndim != 1:
+        raise ValueError('Formato de entrada inválido. A lista de CEPs é esperada.')
+    if not len(text):
+        return np.empty(0, dtype=np.int64)
+    if text.itemsize > MAX_CEP_TEXT_LENGTH * 4:
+        text = np.asarray([value if len(value) <= MAX_CEP_TEXT_LENGTH else '' for value in text.tolist()], dtype=str)
+
+    # One row of UCS-4 code points per value, padded with 0
+    code_points = text.view(np.uint32).reshape(len(text), -1)
+    is_digit = (code_points >= ord('0')) & (code_points <= ord('9'))
+    digits = code_points.astype(np.int64) - ord('0')
+
+    numeric = np.zeros(len(text), dtype=np.int64)
+    for column in range(code_points.shape[1]):
+        numeric = np.where(is_digit[:, column], numeric * 10 + digits[:, column], numeric)
+
+    digit_count = is_digit.sum(axis=1)
+    numeric[(digit_count == 0) | (digit_count > 8)] = -1
+    return numeric
+
+
+def compile_index(source=SOURCE_PATH, index_dir=INDEX_DIR):
+    """
+    Read the spreadsheet once and write the compiled index: `faixas.npy` with
+    (inicio, fim, localidade id) rows and `localidades.json` with the
+    (localidade, estado) of each id. Returns the number of ranges.
+    """
+    import pandas as pd
+
+    table = pd.read_excel(source, usecols=['Estado', 'Localidade', 'Faixa de CEP'])
+    faixas = table['Faixa de CEP'].str.split(' a ', expand=True)
+    table['inicio'] = faixas[0].str.replace('-', '', regex=False).astype('int32')
+    table['fim'] = faixas[1].str.replace('-', '', regex=False).astype('int32')
+    table = table.sort_values(['inicio', 'fim', 'Localidade'], kind='stable')
+
+    # The same name exists in more than one state, so the id is per (localidade, estado)
+    codes, localidades = pd.factorize(pd.MultiIndex.from_frame(table[['Localidade', 'Estado']]))
+
+    ranges = np.empty(len(table), dtype=RANGE_DTYPE)
+    ranges['inicio'] = table['inicio'].to_numpy()
+    ranges['fim'] = table['fim'].to_numpy()
+    ranges['localidade'] = codes
+
+    index_dir = Path(index_dir)
+    index_dir.mkdir(parents=True, exist_ok=True)
+    # Written to temporary files and renamed, so a process loading the index never sees half a file
+    _atomic_write(index_dir / LOCALIDADES_FILE, lambda handle: handle.write(
+        json.dumps([list(localidade) for localidade in localidades], ensure_ascii=False).encode()
+    ))
+    _atomic_write(index_dir / RANGES_FILE, lambda handle: np.save(handle, ranges))
+    return len(ranges)
+
+
+def _atomic_write(path, write):
+    handle, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as tmp_file:
+            write(tmp_file)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class CepIndex:
+    """The compiled ranges (memory-mapped) and locality names."""
+
+    def __init__(self, index_dir=INDEX_DIR):
+        index_dir = Path(index_dir)
+        self.ranges = np.load(index_dir / RANGES_FILE, mmap_mode='r')
+        self.inicio = self.ranges['inicio']
+        self.fim = self.ranges['fim']
+        self.localidade_ids = self.ranges['localidade']
+        with open(index_dir / LOCALIDADES_FILE, encoding='utf-8') as handle:
+            self.localidades = [tuple(localidade) for localidade in json.load(handle)]
+
+    def lookup_ids(self, numeric_ceps):
+        """
+        Locality id of each CEP (NOT_FOUND when no range contains it), with the
+        same rule as the old bisect search: the first range starting at the
+        CEP, otherwise the last range starting before it.
+        """
+        ceps = np.asarray(numeric_ceps, dtype=np.int64)
+        result = np.full(ceps.shape, NOT_FOUND, dtype=np.int32)
+        if not len(self.ranges) or not ceps.size:
+            return result
+
+        idx = np.searchsorted(self.inicio, ceps, side='left')
+        at = np.minimum(idx, len(self.ranges) - 1)
+        exact = (idx < len(self.ranges)) & (self.inicio[at] == ceps)
+        result[exact] = self.localidade_ids[at[exact]]
+
+        before = ~exact & (idx > 0)
+        prev = idx[before] - 1
+        inside = ceps[before] <= self.fim[prev]
+        result[np.flatnonzero(before)[inside]] = self.localidade_ids[prev[inside]]
+        return result
+
+    def lookup(self, cep):
+        """(localidade, estado) of `cep`, or None."""
+        numeric_cep = normalize_cep(cep)
+        if numeric_cep is None:
+            return None
+        localidade_id = int(self.lookup_ids([numeric_cep])[0])
+        return None if localidade_id == NOT_FOUND else self.localidades[localidade_id]
+
+    def resolve_ids(self, ceps):
+        """
+        Locality id of each of `ceps` (strings or ints, formatted or not):
+        NOT_FOUND when no range contains it, INVALID when it is not a CEP.
+        The distinct CEPs are resolved in a single searchsorted.
+        """
+        return self.resolve_numeric(normalize_ceps(ceps))
+
+    def resolve_numeric(self, numeric):
+        """resolve_ids for the output of normalize_ceps (-1 marks invalid values)."""
+        ids = np.full(numeric.shape, INVALID, dtype=np.int32)
+        valid = numeric >= 0
+        distinct, inverse = np.unique(numeric[valid], return_inverse=True)
+        ids[valid] = self.lookup_ids(distinct)[inverse]
+        return ids
+
+    def lookup_many(self, ceps):
+        """(localidade, estado) or None for each of `ceps`, in one vectorized search."""
+        localidades = self.localidades
+        return [localidades[localidade_id] if localidade_id >= 0 else None
+                for localidade_id in self.resolve_ids(ceps).tolist()]
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def is_stale(source=SOURCE_PATH, index_dir=INDEX_DIR):
+    """True when the compiled files are missing or older than the spreadsheet."""
+    ranges_path = Path(index_dir) / RANGES_FILE
+    localidades_path = Path(index_dir) / LOCALIDADES_FILE
+    if not ranges_path.exists() or not localidades_path.exists():
+        return True
+    source = Path(source)
+    return source.exists() and source.stat().st_mtime > ranges_path.stat().st_mtime
+
+
+def get_index():
+    """
+    The process-wide CepIndex, loaded on first use. The spreadsheet is only
+    parsed when the compiled files are missing or out of date
+    (`manage.py build_cep_index` compiles them ahead of time).
+    """
+    global _index
+    if _index is None:
+        with _lock:
+            if _index is None:
+                if is_stale():
+                    compile_index()
+                _index = CepIndex()
+    return _index
+
+
+def reset():
+    """Forget the loaded index (after recompiling it)."""
+    global _index
+    with _lock:
+        _index = None
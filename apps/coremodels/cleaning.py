@@ -0,0 +1,167 @@
+import logging
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+from django.db import models
+
+logger = logging.getLogger(__name__)
+
+'''
+==========================================================
+            Limpeza vetorizada de colunas do CSV
+==========================================================
+'''
+
+EMPTY_VALUES = ('', '-')
+TRUE_VALUES = ('true', '1', 'yes', 'sim')
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y')
+INTEGER_PATTERN = r'\s*[+-]?\d+\s*'
+
+
+def _as_object(series):
+    """Return an object Series with every missing value replaced by None."""
+    series = series.astype(object)
+    return series.where(series.notna(), None)
+
+
+def clean_decimal(series):
+    if pd.api.types.is_numeric_dtype(series):
+        # Typed staging files store floats, str() gives back the shortest text of each value
+        valid = pd.Series(np.isfinite(series.astype(float)), index=series.index)
+        return series.astype(float).where(valid).map(lambda value: Decimal(str(value)), na_action='ignore'), valid
+    cleaned = series.astype(str).str.replace(r'[^\d.,-]', '', regex=True).str.replace(',', '.', regex=False)
+    valid = pd.to_numeric(cleaned, errors='coerce').notna()
+    # Build the Decimal from the cleaned text (not from the float) so the
+    # precision written to the database is the one in the file.
+    return cleaned.where(valid).map(Decimal, na_action='ignore'), valid
+
+
+def clean_date(series):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        # Already parsed when the typed staging file was written
+        valid = series.notna()
+        return series.dt.date.where(valid), valid
+    parsed = pd.Series(pd.NaT, index=series.index, dtype='datetime64[ns]')
+    # strptime only accepts text, numeric columns never hold a valid date
+    is_text = pd.Series(
+        pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series),
+        index=series.index
+    )
+    # Formats are tried in order, day-first before month-first, exactly like
+    # the strptime loop used before.
+    for fmt in DATE_FORMATS:
+        pending = is_text & parsed.isna()
+        if not pending.any():
+            break
+        parsed[pending] = pd.to_datetime(series[pending], format=fmt, errors='coerce')
+    valid = parsed.notna()
+    return parsed.dt.date.where(valid), valid
+
+
+def clean_boolean(series):
+    result = series.astype(str).str.lower().isin(TRUE_VALUES)
+    return result, pd.Series(True, index=series.index)
+
+
+def clean_integer(series):
+    if pd.api.types.is_numeric_dtype(series):
+        # int() truncates floats towards zero
+        valid = np.isfinite(series.astype(float))
+        return np.trunc(series.astype(float)).where(valid).astype('Int64'), valid
+    text = series.astype(str)
+    valid = text.str.fullmatch(INTEGER_PATTERN)
+    return pd.to_numeric(text.where(valid), errors='coerce').astype('Int64'), valid
+
+
+def clean_char(series):
+    return series.astype(str).str.strip(), pd.Series(True, index=series.index)
+
+
+def converter_for(field):
+    """Return the column converter matching the Django field type."""
+    if isinstance(field, models.DecimalField):
+        return clean_decimal
+    if isinstance(field, models.DateField):
+        return clean_date
+    if isinstance(field, models.BooleanField):
+        return clean_boolean
+    if isinstance(field, models.IntegerField):
+        return clean_integer
+    if isinstance(field, models.CharField):
+        return clean_char
+    return None
+
+
+# Arrow type stored in typed staging files for the values of each converter
+STAGING_KINDS = {
+    clean_decimal: 'float',
+    clean_integer: 'int',
+    clean_date: 'date',
+}
+
+
+def _valid_values(converter):
+    def parse(series):
+        converted, valid = converter(series)
+        return converted.where(valid)
+    return parse
+
+
+def staging_parsers(model, mapping):
+    """
+    Return {CSV column: (kind, parser)} for the mapped decimal, integer and
+    date fields, which Parquet/Feather staging files store already parsed.
+    """
+    parsers = {}
+    for csv_column, (model_field, converter) in ColumnCleaner(model, mapping).converters.items():
+        if converter in STAGING_KINDS:
+            parsers[csv_column] = (STAGING_KINDS[converter], _valid_values(converter))
+    return parsers
+
+
+class ColumnCleaner:
+    """
+    Column-wise replacement for cleaning a CSV row by row.
+
+    The converters are resolved once from the model fields in `mapping`
+    (CSV column -> model field) and each column is converted in a single
+    vectorized pass. Empty cells ('', '-' or NaN) and values that cannot be
+    converted become None.
+    """
+
+    def __init__(self, model, mapping):
+        self.model = model
+        self.converters = {}
+        for csv_column, model_field in mapping.items():
+            field = model._meta.get_field(model_field)
+            self.converters[csv_column.lower().strip()] = (model_field, converter_for(field))
+
+    def clean(self, df):
+        """
+        Return a new DataFrame with one column per model field, holding plain
+        Python values (Decimal, date, bool, int, str or None).
+        """
+        cleaned = pd.DataFrame(index=df.index)
+        for csv_column, (model_field, converter) in self.converters.items():
+            if csv_column not in df.columns:
+                continue
+
+            raw = df[csv_column]
+            empty = raw.isna() | raw.isin(EMPTY_VALUES)
+            values = raw[~empty]
+
+            if converter is None:
+                result = _as_object(values)
+            else:
+                converted, valid = converter(values)
+                invalid = int((~valid).sum())
+                if invalid:
+                    logger.error(f"{invalid} invalid values for field '{model_field}' were set to None")
+                result = _as_object(converted.where(valid))
+
+            column = pd.Series(np.nan, index=df.index, dtype=object)
+            column[~empty] = result
+            cleaned[model_field] = _as_object(column)
+
+        return cleaned
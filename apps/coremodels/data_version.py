@@ -0,0 +1,37 @@
+import time
+
+from django.core.cache import cache
+
+'''
+==========================================================
+            Versão dos dados importados (cache)
+==========================================================
+'''
+
+# Bumped by every import, so cached responses built from older data stop matching.
+# The default cache is shared by every process (settings.CACHES), so a bump in an
+# import command is seen by all the API workers.
+DATA_VERSION_KEY = 'dados_importados_versao'
+
+
+def _new_version():
+    # Microseconds since the epoch: if the key is culled from the cache, the version
+    # that replaces it is newer than any before it, so old keys never match again
+    return time.time_ns() // 1000
+
+
+def current():
+    """Return the current data version."""
+    return cache.get_or_set(DATA_VERSION_KEY, _new_version, timeout=None)
+
+
+def bump():
+    """Invalidate every cache key built with `cache_key`."""
+    # Never behind the clock, so a version recreated after a cull is still newer than this one
+    version = cache.get(DATA_VERSION_KEY)
+    cache.set(DATA_VERSION_KEY, max((version or 0) + 1, _new_version()), timeout=None)
+
+
+def cache_key(prefix, *parts):
+    """Cache key for `prefix` and `parts` under the current data version."""
+    return ':'.join(str(part) for part in (prefix, f'v{current()}', *parts))
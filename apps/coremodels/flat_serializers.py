@@ -0,0 +1,76 @@
+from decimal import ROUND_HALF_EVEN, Decimal
+
+'''
+==========================================================
+        Serializers "planos" sobre .values_list()
+==========================================================
+'''
+
+
+def decimal_string(decimal_places=2):
+    """Decimal/float -> fixed-point string, like DRF's DecimalField (same half-even rounding)."""
+    exponent = Decimal(1).scaleb(-decimal_places)
+
+    def convert(value):
+        if not isinstance(value, Decimal):
+            value = Decimal(str(value).strip())
+        return format(value.quantize(exponent, rounding=ROUND_HALF_EVEN), 'f')
+    return convert
+
+
+def iso_date(value):
+    """date/datetime -> ISO 8601 string, like DRF's DateField."""
+    return value if isinstance(value, str) else value.isoformat()
+
+
+class FlatSerializer:
+    """
+    Turn `.values_list(*serializer.sources)` rows into output dicts.
+
+    Each field is a `name`, or a `(name, source)` / `(name, source, converter)`
+    tuple where `source` is an ORM lookup (e.g. 'venda__data_compra') and
+    `converter` is applied to non-null values. The lookups and converters
+    are resolved once, so serializing a row is a zip plus the conversions,
+    without DRF's per-field objects.
+    """
+
+    def __init__(self, *fields):
+        self.names = []
+        self.sources = []
+        converters = []
+        for index, field in enumerate(fields):
+            if isinstance(field, str):
+                field = (field,)
+            name, source, converter = (tuple(field) + (None, None))[:3]
+            self.names.append(name)
+            self.sources.append(source or name)
+            if converter is not None:
+                converters.append((index, converter))
+        self.names = tuple(self.names)
+        self.sources = tuple(self.sources)
+        self.converters = tuple(converters)
+
+    def values(self, queryset):
+        """The rows of `queryset` this serializer reads."""
+        return queryset.values_list(*self.sources)
+
+    def iter_rows(self, rows):
+        names, converters = self.names, self.converters
+        if not converters:
+            for row in rows:
+                yield dict(zip(names, row))
+            return
+
+        for row in rows:
+            values = list(row)
+            for index, convert in converters:
+                value = values[index]
+                if value is not None:
+                    values[index] = convert(value)
+            yield dict(zip(names, values))
+
+    def serialize(self, rows):
+        return list(self.iter_rows(rows))
+
+    def serialize_queryset(self, queryset):
+        return self.serialize(self.values(queryset))
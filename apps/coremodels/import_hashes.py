@@ -0,0 +1,66 @@
+import pandas as pd
+
+from apps.coremodels.models import HashesImportacao
+
+'''
+==========================================================
+        Importação incremental por hash de conteúdo
+==========================================================
+'''
+
+LOOKUP_BATCH_SIZE = 5000
+
+
+def row_hashes(frame):
+    """
+    Return one 16-char hex hash per row of `frame`, computed over the values of
+    every column (in column order) in a single vectorized pass.
+    """
+    hashed = pd.util.hash_pandas_object(frame, index=False)
+    return hashed.map('{:016x}'.format)
+
+
+def key_string(values):
+    """Join the normalized natural key values into the `chave` stored in HashesImportacao."""
+    return '|'.join('' if value is None else str(value) for value in values)
+
+
+def load_hashes(modelo, chaves):
+    """Return {chave: hash} for the given keys of `modelo`."""
+    chaves = list(chaves)
+    stored = {}
+    for start in range(0, len(chaves), LOOKUP_BATCH_SIZE):
+        batch = chaves[start:start + LOOKUP_BATCH_SIZE]
+        stored.update(
+            HashesImportacao.objects.filter(modelo=modelo, chave__in=batch).values_list('chave', 'hash')
+        )
+    return stored
+
+
+def save_hashes(modelo, hashes):
+    """Insert or update the {chave: hash} pairs of `modelo`."""
+    if not hashes:
+        return
+    HashesImportacao.objects.bulk_create(
+        [HashesImportacao(modelo=modelo, chave=chave, hash=value) for chave, value in hashes.items()],
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['modelo', 'chave'],
+        update_fields=['hash'],
+    )
+
+
+class ImportStats:
+    """Counters reported at the end of an import."""
+
+    def __init__(self):
+        self.created = 0
+        self.changed = 0
+        self.unchanged = 0
+        self.skipped = 0
+
+    def summary(self):
+        return (
+            f"created: {self.created}, changed: {self.changed}, "
+            f"unchanged: {self.unchanged}, skipped: {self.skipped}"
+        )
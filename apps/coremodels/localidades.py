@@ -0,0 +1,159 @@
+import unicodedata
+
+from django.db import connections
+from django.db.models import Q
+
+from apps.coremodels import cep_index, rollups
+from apps.coremodels.models import CidadesRotas, Clientes
+
+'''
+==========================================================
+        Localidade e rota dos clientes (pelo CEP)
+==========================================================
+'''
+
+# Clientes columns written by assign_localidades
+LOCALIDADE_FIELDS = ['localidade', 'localidade_chave', 'cep_resolvido', 'rota']
+
+
+def normalize_city(name):
+    """'  São  Paulo ' -> 'sao paulo': no accents, casefolded, single spaces. None for blanks."""
+    if name is None:
+        return None
+    decomposed = unicodedata.normalize('NFKD', str(name))
+    text = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    text = ' '.join(text.casefold().split())
+    return text or None
+
+
+def routes_by_city():
+    """{normalized city: rota_id} from CidadesRotas; a city in several routes keeps the lowest rota id."""
+    rotas = {}
+    for chave, rota_id in CidadesRotas.objects.order_by('rota_id', 'id').values_list('cidade_chave', 'rota_id'):
+        if chave is not None:
+            rotas.setdefault(chave, rota_id)
+    return rotas
+
+
+def needs_resolution(cliente, cep, cidade):
+    """True when a client's stored locality was not resolved from this CEP/cidade."""
+    return cliente.localidade_chave is None or cliente.cep != cep or cliente.cidade != cidade
+
+
+def assign_localidades(clientes, assign_rota=True, rotas=None):
+    """
+    Resolve the CEP of each (unsaved or to be bulk-updated) client once, in a
+    single vectorized lookup, and set `localidade`, `localidade_chave`,
+    `cep_resolvido` and, with `assign_rota`, the route of that city in
+    CidadesRotas (None when no route serves it).
+
+    Returns the ids of the existing clients whose route changed, whose
+    sales must be recalculated in VendasDiarias.
+    """
+    clientes = list(clientes)
+    if not clientes:
+        return set()
+    if assign_rota and rotas is None:
+        rotas = routes_by_city()
+
+    index = cep_index.get_index()
+    numeric = cep_index.normalize_ceps([cliente.cep for cliente in clientes])
+    localidade_ids = index.resolve_numeric(numeric)
+
+    rota_changed = set()
+    for cliente, numeric_cep, localidade_id in zip(clientes, numeric.tolist(), localidade_ids.tolist()):
+        cliente.cep_resolvido = f'{numeric_cep:08d}' if numeric_cep >= 0 else None
+        cliente.localidade = index.localidades[localidade_id][0] if localidade_id >= 0 else None
+        # CEPs outside the table fall back to the city typed in the register
+        cliente.localidade_chave = normalize_city(cliente.localidade or cliente.cidade)
+
+        if assign_rota:
+            rota_id = rotas.get(cliente.localidade_chave)
+            if rota_id != cliente.rota_id:
+                if cliente.pk is not None and not cliente._state.adding:
+                    rota_changed.add(cliente.pk)
+                cliente.rota_id = rota_id
+    return rota_changed
+
+
+def reassign_routes(cidades=None, rotas=(), overwrite=False, using='default'):
+    """
+    Set `Clientes.rota` of the clients in `cidades` (names, normalized here;
+    None for all cities) to the route serving that city in CidadesRotas (the
+    lowest rota id when several do), or NULL when no route serves it anymore.
+    Clients are matched on `localidade_chave`, so they must have been resolved
+    (import or refresh_client_localidades).
+
+    Only clients without a route and clients of the routes in `rotas` (the
+    routes whose cities changed) are reassigned: any other route was chosen
+    by hand and is kept, unless `overwrite` is set.
+
+    The days of the clients whose route changed are recalculated in
+    VendasDiarias. Returns their ids.
+    """
+    if cidades is None:
+        chaves = set(
+            Clientes.objects.using(using).exclude(localidade_chave=None)
+            .values_list('localidade_chave', flat=True).distinct()
+        )
+    else:
+        chaves = {normalize_city(cidade) for cidade in cidades} - {None}
+    if not chaves:
+        return set()
+    rotas = None if overwrite else sorted(set(rotas))
+
+    if connections[using].vendor == 'postgresql':
+        changed = _reassign_with_update_from(sorted(chaves), rotas, using)
+    else:
+        changed = _reassign_by_route(chaves, rotas, using)
+
+    if changed:
+        rollups.refresh_daily_sales(rollups.dates_of_clientes(changed))
+    return changed
+
+
+def _reassign_with_update_from(chaves, rotas, using):
+    """One UPDATE ... FROM over the affected cities (sent as a single array), returning the changed ids."""
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    clientes = quote(Clientes._meta.db_table)
+    cidades_rotas = quote(CidadesRotas._meta.db_table)
+    params = [chaves]
+    only_mapped = ''
+    if rotas is not None:
+        only_mapped = f"AND (c.{quote('rota_id')} IS NULL OR c.{quote('rota_id')} = ANY(%s::integer[])) "
+        params.append(rotas)
+    sql = (
+        f"UPDATE {clientes} AS c SET {quote('rota_id')} = r.rota_id "
+        f"FROM ("
+        f"SELECT k.chave, (SELECT MIN(cr.{quote('rota_id')}) FROM {cidades_rotas} cr "
+        f"WHERE cr.{quote('cidade_chave')} = k.chave) AS rota_id "
+        f"FROM unnest(%s::text[]) AS k(chave)"
+        f") AS r "
+        f"WHERE c.{quote('localidade_chave')} = r.chave AND c.{quote('rota_id')} IS DISTINCT FROM r.rota_id "
+        f"{only_mapped}"
+        f"RETURNING c.{quote('id')}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return {row[0] for row in cursor.fetchall()}
+
+
+def _reassign_by_route(chaves, rotas, using):
+    """Other backends: one UPDATE per target route (not per client)."""
+    rotas_por_cidade = routes_by_city()
+    por_rota = {}
+    for chave in chaves:
+        por_rota.setdefault(rotas_por_cidade.get(chave), []).append(chave)
+
+    changed = set()
+    for rota_id, chaves_rota in por_rota.items():
+        clientes = Clientes.objects.using(using).filter(localidade_chave__in=chaves_rota)
+        if rotas is not None:
+            clientes = clientes.filter(Q(rota=None) | Q(rota_id__in=rotas))
+        clientes = clientes.exclude(rota=None) if rota_id is None else clientes.exclude(rota_id=rota_id)
+        ids = list(clientes.values_list('id', flat=True))
+        if ids:
+            Clientes.objects.using(using).filter(id__in=ids).update(rota_id=rota_id)
+            changed.update(ids)
+    return changed
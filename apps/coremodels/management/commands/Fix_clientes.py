@@ -1,8 +1,11 @@
 # myapp/management/commands/process_csv.py
 import csv
 import os
+import pandas as pd
 from django.core.management.base import BaseCommand
 
+from apps.coremodels import staging
+
 
 class Command(BaseCommand):
     help = "Processa um CSV de clientes conforme requisitos, mescla duplicatas, divide em arquivos menores e remove a coluna 'origem'"
@@ -24,7 +27,8 @@ class Command(BaseCommand):
 
         try:
             processed_rows = self.process_csv(input_csv)
-            self.write_csv_in_chunks(output_dir, processed_rows, chunk_size=30000)
+            extension = os.path.splitext(input_csv)[1] or '.csv'
+            self.write_csv_in_chunks(output_dir, processed_rows, chunk_size=30000, extension=extension)
             self.stdout.write(self.style.SUCCESS(f"CSV processado e arquivos salvos em {output_dir}"))
         except Exception as e:
             self.stderr.write(self.style.ERROR(f"Erro ao processar CSV: {e}"))
@@ -37,23 +41,21 @@ class Command(BaseCommand):
             """Normaliza texto para comparação, removendo espaços e ignorando capitalização."""
             return ' '.join(word.capitalize() for word in text.split())
 
-        with open(input_csv, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                # Normalizar o nome para comparação
-                normalized_name = normalize_text(row['Nome'])
-                origem = row.get('loja', '').strip().lower()
-                row['Nome'] = normalized_name  # Atualiza para Camel Case no resultado
-
-                # Agrupar por Nome (chave normalizada)
-                if normalized_name not in merged:
-                    merged[normalized_name] = {'servi': None, 'imp': None}
-
-                # Armazenar linha com base na origem
-                if origem == 'servi':
-                    merged[normalized_name]['servi'] = row
-                elif origem == 'imp':
-                    merged[normalized_name]['imp'] = row
+        for row in self.read_rows(input_csv):
+            # Normalizar o nome para comparação
+            normalized_name = normalize_text(row['Nome'])
+            origem = row.get('loja', '').strip().lower()
+            row['Nome'] = normalized_name  # Atualiza para Camel Case no resultado
+
+            # Agrupar por Nome (chave normalizada)
+            if normalized_name not in merged:
+                merged[normalized_name] = {'servi': None, 'imp': None}
+
+            # Armazenar linha com base na origem
+            if origem == 'servi':
+                merged[normalized_name]['servi'] = row
+            elif origem == 'imp':
+                merged[normalized_name]['imp'] = row
 
         # Resolver duplicatas priorizando servi
         for name, sources in merged.items():
@@ -71,13 +73,29 @@ class Command(BaseCommand):
 
         return rows
 
-    def write_csv_in_chunks(self, output_dir, rows, chunk_size=900000):
+    def read_rows(self, input_csv):
+        """ Gera as linhas do arquivo como dicionários de texto, como o csv.DictReader. """
+        if staging.is_columnar(input_csv):
+            # Os tipos do arquivo (ID inteiro, datas, números) são mantidos e gravados de volta
+            self.schema, rows = staging.read_rows(input_csv)
+            yield from rows
+            return
+
+        with open(input_csv, 'r', encoding='utf-8') as file:
+            yield from csv.DictReader(file)
+
+    def write_csv_in_chunks(self, output_dir, rows, chunk_size=900000, extension='.csv'):
         file_count = 0
 
         for i in range(0, len(rows), chunk_size):
             file_count += 1
             chunk = rows[i:i + chunk_size]
-            output_file = os.path.join(output_dir, f"Clientes.csv")
+            output_file = os.path.join(output_dir, f"Clientes{extension}")
+
+            if staging.is_columnar(output_file):
+                schema = staging.select_schema(self.schema, chunk[0].keys())
+                staging.write_frame(pd.DataFrame(chunk, columns=schema.names), output_file, schema)
+                continue
 
             with open(output_file, 'w', newline='', encoding='utf-8') as file:
                 writer = csv.DictWriter(file, fieldnames=chunk[0].keys())
@@ -0,0 +1,89 @@
+import re
+import time
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand
+
+from apps.coremodels.management.commands.send_data_to_db import Command as SendDataCommand
+
+
+class Command(BaseCommand):
+    help = 'Compara o cálculo antigo (apply por linha e por pedido) e o vetorizado de valor_total/preco_final num arquivo sintético de ItemVenda'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=500_000, help='Número de itens do arquivo sintético')
+        parser.add_argument('--items-per-order', type=int, default=4, help='Média de itens por pedido')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **kwargs):
+        rows = kwargs['rows']
+        data = self.synthetic_items(rows, kwargs['items_per_order'], kwargs['seed'])
+        self.stdout.write(f"Arquivo sintético: {rows} itens, {data['venda'].nunique()} pedidos")
+
+        start = time.perf_counter()
+        legacy = self.legacy_preco_final(data.copy())
+        legacy_time = time.perf_counter() - start
+        self.stdout.write(f"  {legacy_time:8.2f}s  apply por linha + groupby.apply")
+
+        start = time.perf_counter()
+        vectorized = self.vectorized_preco_final(data.copy())
+        vectorized_time = time.perf_counter() - start
+        self.stdout.write(f"  {vectorized_time:8.2f}s  vetorizado + groupby.transform('sum')")
+
+        self.stdout.write(self.style.SUCCESS(f"Speedup: {legacy_time / vectorized_time:.1f}x"))
+
+        # The old totals are float sums of unrounded items; compared at the stored precision
+        # they can only differ by the cents rounded away in each item
+        difference = (legacy.round(2) - vectorized).abs()
+        self.stdout.write(
+            f"Itens com preco_final diferente: {int((difference > 0.005).sum())} "
+            f"(maior diferença: {difference.max():.2f})"
+        )
+
+    def synthetic_items(self, rows, items_per_order, seed):
+        """Build the columns used by the calculation, as text like the values read from the CSV."""
+        rng = np.random.default_rng(seed)
+        orders = max(rows // items_per_order, 1)
+        quantidade = rng.integers(1, 10, rows).astype(str)
+        # A few fractional quantities, which produce items with more than 2 decimals
+        fractional = rng.random(rows) < 0.05
+        quantidade[fractional] = np.char.add(quantidade[fractional], ',5')
+        valor_unitario = np.char.replace(np.round(rng.uniform(0.5, 500, rows), 2).astype(str), '.', ',')
+        return pd.DataFrame({
+            'venda': rng.integers(1, orders + 1, rows).astype(str),
+            'quantidade_produto': quantidade,
+            'valor_unitario': valor_unitario,
+        })
+
+    def legacy_preco_final(self, dataframe):
+        """The row-wise calculation used by send_data_to_db before it was vectorized."""
+        def clean_numeric(value):
+            if pd.isna(value):
+                return 0.0
+            if isinstance(value, str):
+                value = re.sub(r'[^\d,\.]', '', value)
+                value = value.replace(',', '.')
+            try:
+                return float(value)
+            except ValueError:
+                return 0.0
+
+        def calculate_valor_total(row):
+            try:
+                return row['valor_unitario'] * row['quantidade_produto']
+            except TypeError:
+                return None
+
+        for column in ['quantidade_produto', 'valor_unitario']:
+            dataframe[column] = dataframe[column].apply(clean_numeric)
+        dataframe['valor_total'] = dataframe.apply(calculate_valor_total, axis=1)
+        dataframe['valor_total'] = dataframe['valor_total'].apply(clean_numeric)
+
+        preco_final = dataframe.groupby('venda').apply(lambda group: sum(group['valor_total']), include_groups=False)
+        return dataframe['venda'].map(preco_final)
+
+    def vectorized_preco_final(self, dataframe):
+        loader = SendDataCommand()
+        loader.clean_numeric_columns(dataframe)
+        return loader.compute_preco_final(dataframe)
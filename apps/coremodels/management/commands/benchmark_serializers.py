@@ -0,0 +1,117 @@
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from apps.coremodels.models import Clientes, ItemVenda, Produtos, Vendas
+from apps.costumers.serializers import PURCHASE_FLAT_SERIALIZER, PurchaseSerializer
+from apps.sells.serializers import ITEM_VENDA_FLAT_SERIALIZER, VENDA_FLAT_SERIALIZER, VendasSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compara os serializers DRF (PurchaseSerializer, VendasSerializer) com os serializers planos sobre tuplas de values_list()'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000], help='Números de itens sintéticos')
+        parser.add_argument('--items-per-order', type=int, default=4, help='Média de itens por pedido')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **kwargs):
+        for rows in kwargs['rows']:
+            itens = self.synthetic_items(rows, kwargs['items_per_order'], kwargs['seed'])
+            vendas = list({item.venda.id: item.venda for item in itens}.values())
+            for venda in vendas:
+                # Stand-in for prefetch_related('itens_venda'), without the database
+                venda._prefetched_objects_cache = {'itens_venda': []}
+            for item in itens:
+                item.venda._prefetched_objects_cache['itens_venda'].append(item)
+            self.stdout.write(f"\n{rows} itens, {len(vendas)} pedidos (objetos em memória, sem banco)")
+
+            # The tuples values_list() would return; building them is not timed
+            purchase_rows = self.as_rows(itens, PURCHASE_FLAT_SERIALIZER.sources)
+            venda_rows = self.as_rows(vendas, VENDA_FLAT_SERIALIZER.sources)
+            item_rows = {
+                venda.id: self.as_rows(venda.itens_venda.all(), ITEM_VENDA_FLAT_SERIALIZER.sources)
+                for venda in vendas
+            }
+
+            self.compare(
+                'PurchaseSerializer',
+                lambda: PurchaseSerializer(itens, many=True).data,
+                lambda: PURCHASE_FLAT_SERIALIZER.serialize(purchase_rows),
+            )
+            self.compare(
+                'VendasSerializer',
+                lambda: VendasSerializer(vendas, many=True).data,
+                lambda: self.flat_vendas(venda_rows, item_rows),
+            )
+
+    def compare(self, label, drf, flat):
+        start = time.perf_counter()
+        drf_data = drf()
+        drf_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        flat_data = flat()
+        flat_time = time.perf_counter() - start
+
+        same = [dict(row) for row in drf_data] == flat_data
+        self.stdout.write(f"  {label}")
+        self.stdout.write(f"    {drf_time:8.3f}s  DRF")
+        self.stdout.write(f"    {flat_time:8.3f}s  FlatSerializer (speedup {drf_time / flat_time:.1f}x)")
+        if same:
+            self.stdout.write(self.style.SUCCESS("    Saídas idênticas"))
+        else:
+            self.stdout.write(self.style.ERROR("    Saídas diferentes!"))
+
+    def flat_vendas(self, venda_rows, item_rows):
+        data = VENDA_FLAT_SERIALIZER.serialize(venda_rows)
+        for venda in data:
+            venda['itens_venda'] = ITEM_VENDA_FLAT_SERIALIZER.serialize(item_rows[venda['id']])
+        return data
+
+    def as_rows(self, objects, sources):
+        """The values_list() tuples of `objects`, read through the same lookups."""
+        def lookup(obj, source):
+            for attribute in source.split('__'):
+                obj = getattr(obj, attribute)
+            return obj
+        return [tuple(lookup(obj, source) for source in sources) for obj in objects]
+
+    def synthetic_items(self, rows, items_per_order, seed):
+        rng = np.random.default_rng(seed)
+        cliente = Clientes(id=1, nome='Cliente')
+        produtos = [
+            Produtos(sku=f'SKU{index:05d}', descricao=f'Produto {index}', preco=Decimal(f'{price:.2f}'))
+            for index, price in enumerate(rng.uniform(0.5, 500, 500))
+        ]
+        orders = max(rows // items_per_order, 1)
+        vendas = [
+            Vendas(id=index + 1, numero=index + 1, canal_venda='Pdv', situacao='Atendido', loja='Loja',
+                   data_compra=date(2024, 1, 1) + timedelta(days=int(day)))
+            for index, day in enumerate(rng.integers(0, 365, orders))
+        ]
+
+        itens = []
+        quantidades = rng.integers(1, 10, rows)
+        valores = np.round(rng.uniform(0.5, 500, rows), 2)
+        for index in range(rows):
+            produto = produtos[index % len(produtos)]
+            valor_unitario = Decimal(f'{valores[index]:.2f}')
+            valor_total = valor_unitario * int(quantidades[index])
+            itens.append(ItemVenda(
+                id_item_venda=index + 1,
+                venda=vendas[int(rng.integers(0, orders))],
+                cliente=cliente,
+                produto=produto,
+                quantidade_produto=float(quantidades[index]),
+                valor_unitario=valor_unitario,
+                valor_total=valor_total,
+                valor_desconto=Decimal('0.00'),
+                frete=Decimal('0.00'),
+                preco_final=valor_total,
+                loja='Loja',
+            ))
+        return itens
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.coremodels import cep_index
+
+
+class Command(BaseCommand):
+    help = 'Compila datasets/Lista_de_CEPs.xlsx no índice de faixas de CEP (arquivo NumPy) usado nas buscas por CEP'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', type=str, default=str(cep_index.SOURCE_PATH), help='Planilha de faixas de CEP')
+        parser.add_argument('--output', type=str, default=str(cep_index.INDEX_DIR), help='Pasta do índice compilado')
+
+    def handle(self, *args, **kwargs):
+        start_time = time.time()
+        self.stdout.write(f"Compilando {kwargs['source']}...")
+        rows = cep_index.compile_index(kwargs['source'], kwargs['output'])
+        cep_index.reset()
+        total_time = time.time() - start_time
+        self.stdout.write(self.style.SUCCESS(f"{rows} faixas gravadas em {kwargs['output']} em {total_time:.2f} segundos."))
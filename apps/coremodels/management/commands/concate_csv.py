@@ -7,6 +7,9 @@ import mimetypes
 import xlrd
 import openpyxl
 
+from apps.coremodels import staging
+from apps.coremodels.management.commands import send_data_to_db, send_simple_data_to_db
+
 # Configurar o logger
 logging.basicConfig(
     level=logging.INFO,
@@ -23,84 +26,49 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument('name', type=str, help='Nome do arquivo CSV final')
+        parser.add_argument(
+            '--chunksize',
+            type=int,
+            default=None,
+            help='Lê e grava os arquivos em blocos deste número de linhas, sem manter todos em memória'
+        )
+        parser.add_argument(
+            '--format',
+            choices=list(staging.FORMATS),
+            default='csv',
+            help='Formato do arquivo final: csv, ou parquet/feather (colunas tipadas, lidas via pyarrow pelos comandos de importação)'
+        )
 
     def handle(self, *args, **kwargs):
         name = kwargs['name']
+        chunksize = kwargs.get('chunksize')
+        file_format = kwargs.get('format') or 'csv'
         pre_process_dirs = {
             'servi': Path('temporary_files/servi'),
             'imp': Path('temporary_files/imp')
         }
         final_csv_dir = Path('datasets/csv')
-        final_csv_name = f"{name}.csv"
+        final_csv_name = f"{name}{staging.FORMATS[file_format]}"
 
         # Verificar se o diretório de destino existe, senão criar
         if not final_csv_dir.exists():
             final_csv_dir.mkdir(parents=True, exist_ok=True)
             logger.info(f"Diretório de destino criado em: {final_csv_dir}")
 
-        # Suportes de formatos de arquivo
-        supported_formats = ['*.csv', '*.xlsx', '*.xls']
-
-        # Lista para armazenar os DataFrames
-        csv_dataframes = []
-
-        # Processar os arquivos em cada diretório de origem
-        for loja, pre_process_dir in pre_process_dirs.items():
-            if not pre_process_dir.exists():
-                logger.warning(f"Diretório de origem {pre_process_dir} não encontrado. Pulando.")
-                continue
-
-            for pattern in supported_formats:
-                for file in pre_process_dir.glob(pattern):
-                    if not self.is_valid_file(file):
-                        logger.warning(f"Arquivo {file.name} está corrompido ou vazio. Pulando.")
-                        self.stdout.write(self.style.WARNING(f"Arquivo {file.name} está corrompido ou vazio. Pulando."))
-                        continue
-
-                    try:
-                        if file.suffix.lower() == '.csv':
-                            df = pd.read_csv(file, dtype=str, encoding='utf-8', low_memory=False)
-                        elif file.suffix.lower() == '.xlsx':
-                            df = pd.read_excel(file, dtype=str, engine='openpyxl')
-                        elif file.suffix.lower() == '.xls':
-                            workbook = xlrd.open_workbook(file, ignore_workbook_corruption=True)
-                            df = pd.read_excel(workbook, dtype=str, engine='xlrd')
-                        else:
-                            logger.warning(f"Formato de arquivo não suportado: {file}")
-                            self.stdout.write(self.style.WARNING(f"Formato de arquivo não suportado: {file}"))
-                            continue
-
-                        # Adicionar a coluna "loja" se necessário
-                        if name in ['Clientes','Vendas', 'ItemVenda']:
-                            df['loja'] = loja
-                            logger.info(f"Coluna 'loja' adicionada com valor '{loja}' para o arquivo {file.name}.")
-
-                        csv_dataframes.append(df)
-                        logger.info(f"Arquivo {file.name} lido com sucesso.")
-                    except Exception as e:
-                        logger.error(f"Erro ao ler o arquivo {file.name}: {e}")
-                        self.stdout.write(self.style.ERROR(f"Erro ao ler o arquivo {file.name}: {e}"))
-                        continue
-
-        if not csv_dataframes:
-            self.stdout.write(self.style.ERROR("Nenhum arquivo válido foi processado."))
-            logger.error("Nenhum arquivo válido foi processado.")
-            return
+        source_files = self.collect_source_files(pre_process_dirs)
 
         try:
-            # Concatenar todos os DataFrames
-            self.stdout.write("Concatenando os DataFrames...")
-            final_df = pd.concat(csv_dataframes, ignore_index=True, sort=False)
-            logger.info("Todos os DataFrames foram concatenados.")
+            final_csv_path = final_csv_dir / final_csv_name
+            if chunksize:
+                exported = self.stream_concat(source_files, name, final_csv_path, chunksize)
+            else:
+                exported = self.concat_in_memory(source_files, name, final_csv_path)
 
-            # Remover registros duplicados
-            final_df.drop_duplicates(inplace=True)
-            self.stdout.write(self.style.SUCCESS("Registros duplicados removidos."))
-            logger.info("Registros duplicados removidos.")
+            if not exported:
+                self.stdout.write(self.style.ERROR("Nenhum arquivo válido foi processado."))
+                logger.error("Nenhum arquivo válido foi processado.")
+                return
 
-            # Salvar o DataFrame final como CSV
-            final_csv_path = final_csv_dir / final_csv_name
-            final_df.to_csv(final_csv_path, index=False, encoding='utf-8')
             self.stdout.write(
                 self.style.SUCCESS(f"Arquivo {final_csv_name} exportado com sucesso para {final_csv_dir}."))
             logger.info(f"Arquivo {final_csv_name} exportado com sucesso para {final_csv_dir}.")
@@ -123,6 +91,150 @@ class Command(BaseCommand):
             logger.error(f"Erro durante a execução do comando: {e}")
             self.stdout.write(self.style.ERROR(f"Erro durante a execução do comando: {e}"))
 
+    def collect_source_files(self, pre_process_dirs):
+        """ Retorna a lista de (loja, arquivo) válidos em cada diretório de origem. """
+        # Suportes de formatos de arquivo
+        supported_formats = ['*.csv', '*.xlsx', '*.xls']
+
+        source_files = []
+        for loja, pre_process_dir in pre_process_dirs.items():
+            if not pre_process_dir.exists():
+                logger.warning(f"Diretório de origem {pre_process_dir} não encontrado. Pulando.")
+                continue
+
+            for pattern in supported_formats:
+                for file in pre_process_dir.glob(pattern):
+                    if not self.is_valid_file(file):
+                        logger.warning(f"Arquivo {file.name} está corrompido ou vazio. Pulando.")
+                        self.stdout.write(self.style.WARNING(f"Arquivo {file.name} está corrompido ou vazio. Pulando."))
+                        continue
+                    source_files.append((loja, file))
+        return source_files
+
+    def read_file(self, file, name, loja, chunksize=None):
+        """
+        Gera os DataFrames de um arquivo (um por bloco, quando `chunksize` é informado).
+        Planilhas Excel não podem ser lidas em blocos e são lidas inteiras.
+        """
+        if file.suffix.lower() == '.csv':
+            if chunksize:
+                frames = pd.read_csv(file, dtype=str, encoding='utf-8', chunksize=chunksize)
+            else:
+                frames = [pd.read_csv(file, dtype=str, encoding='utf-8', low_memory=False)]
+        elif file.suffix.lower() == '.xlsx':
+            frames = [pd.read_excel(file, dtype=str, engine='openpyxl')]
+        elif file.suffix.lower() == '.xls':
+            workbook = xlrd.open_workbook(file, ignore_workbook_corruption=True)
+            frames = [pd.read_excel(workbook, dtype=str, engine='xlrd')]
+        else:
+            raise ValueError(f"Formato de arquivo não suportado: {file}")
+
+        for df in frames:
+            # Adicionar a coluna "loja" se necessário
+            if name in ['Clientes','Vendas', 'ItemVenda']:
+                df['loja'] = loja
+            yield df
+
+    def staging_parsers(self, name):
+        """ Colunas gravadas com tipo (número/data) nos arquivos Parquet/Feather, conforme o importador do modelo. """
+        if name == 'ItemVenda':
+            return send_data_to_db.Command.staging_parsers()
+        return send_simple_data_to_db.Command.staging_parsers(name)
+
+    def concat_in_memory(self, source_files, name, final_csv_path):
+        """ Lê todos os arquivos, concatena, remove duplicados e exporta de uma vez. """
+        # Lista para armazenar os DataFrames
+        csv_dataframes = []
+
+        for loja, file in source_files:
+            try:
+                csv_dataframes.extend(self.read_file(file, name, loja))
+                logger.info(f"Arquivo {file.name} lido com sucesso.")
+            except Exception as e:
+                logger.error(f"Erro ao ler o arquivo {file.name}: {e}")
+                self.stdout.write(self.style.ERROR(f"Erro ao ler o arquivo {file.name}: {e}"))
+                continue
+
+        if not csv_dataframes:
+            return False
+
+        # Concatenar todos os DataFrames
+        self.stdout.write("Concatenando os DataFrames...")
+        final_df = pd.concat(csv_dataframes, ignore_index=True, sort=False)
+        logger.info("Todos os DataFrames foram concatenados.")
+
+        # Remover registros duplicados
+        final_df.drop_duplicates(inplace=True)
+        self.stdout.write(self.style.SUCCESS("Registros duplicados removidos."))
+        logger.info("Registros duplicados removidos.")
+
+        # Salvar o DataFrame final como CSV (ou Parquet/Feather, com as colunas numéricas e de data já convertidas)
+        if staging.is_columnar(final_csv_path):
+            parsers = self.staging_parsers(name)
+            staging.write_frame(
+                staging.parse_columns(final_df, parsers), final_csv_path,
+                staging.typed_schema(final_df.columns, parsers)
+            )
+        else:
+            final_df.to_csv(final_csv_path, index=False, encoding='utf-8')
+        return True
+
+    def stream_concat(self, source_files, name, final_csv_path, chunksize):
+        """
+        Grava cada bloco diretamente no CSV final. Os duplicados são removidos
+        com um conjunto de hashes das linhas já gravadas, então a memória usada
+        não depende do tamanho total dos arquivos.
+        """
+        # As colunas do arquivo final são a união dos cabeçalhos, na ordem em que aparecem
+        columns = []
+        readable_files = []
+        for loja, file in source_files:
+            try:
+                header = next(self.read_file(file, name, loja, chunksize=1))
+            except Exception as e:
+                logger.error(f"Erro ao ler o arquivo {file.name}: {e}")
+                self.stdout.write(self.style.ERROR(f"Erro ao ler o arquivo {file.name}: {e}"))
+                continue
+            columns.extend(col for col in header.columns if col not in columns)
+            readable_files.append((loja, file))
+
+        if not readable_files:
+            return False
+
+        seen_rows = set()
+        write_header = True
+        columnar = staging.is_columnar(final_csv_path)
+        if columnar:
+            # Os arquivos são lidos com dtype=str; as colunas mapeadas pelo importador são convertidas ao gravar
+            parsers = self.staging_parsers(name)
+            schema = staging.typed_schema(columns, parsers)
+            output = staging.open_writer(final_csv_path, schema)
+        else:
+            output = open(final_csv_path, 'w', newline='', encoding='utf-8')
+        with output:
+            for loja, file in readable_files:
+                try:
+                    for df in self.read_file(file, name, loja, chunksize):
+                        df = df.reindex(columns=columns)
+                        row_hashes = pd.util.hash_pandas_object(df, index=False)
+                        df = df[~row_hashes.duplicated().to_numpy() & ~row_hashes.isin(seen_rows).to_numpy()]
+                        seen_rows.update(row_hashes.unique().tolist())
+
+                        if columnar:
+                            output.write_table(staging.to_table(staging.parse_columns(df, parsers), schema))
+                        else:
+                            df.to_csv(output, index=False, header=write_header)
+                        write_header = False
+                    logger.info(f"Arquivo {file.name} lido com sucesso.")
+                except Exception as e:
+                    logger.error(f"Erro ao ler o arquivo {file.name}: {e}")
+                    self.stdout.write(self.style.ERROR(f"Erro ao ler o arquivo {file.name}: {e}"))
+                    continue
+
+        self.stdout.write(self.style.SUCCESS("Registros duplicados removidos."))
+        logger.info("Registros duplicados removidos.")
+        return True
+
     def is_valid_file(self, file_path):
         """ Verifica se o arquivo não está corrompido e pode ser lido. """
         if file_path.stat().st_size == 0:
@@ -5,17 +5,26 @@ from django.core.management import call_command
 import json
 import time
 
+from apps.coremodels import staging
+
 class Command(BaseCommand):
     help = 'Executa comandos Django em sequência'
 
     def add_arguments(self, parser):
         parser.add_argument('model', type=str, help='Modelo para atualizar')
+        parser.add_argument(
+            '--format',
+            choices=list(staging.FORMATS),
+            default='csv',
+            help='Formato dos arquivos intermediários em datasets/csv (csv, parquet ou feather)'
+        )
 
     def handle(self, *args, **kwargs):
         model = kwargs['model']
         link = get_link(model)
         links_json = json.dumps(link)
-        caminho_csv = f"datasets/csv/{model}.csv"
+        file_format = kwargs.get('format') or 'csv'
+        caminho_csv = str(staging.staging_path("datasets/csv", model, file_format))
 
         try:
             # Download data from tiny website
@@ -27,21 +36,21 @@ class Command(BaseCommand):
                 call_command(f'download_data_ItemVenda')
                 call_command(f'unzipSaleOrders', 'imp')
                 call_command(f'unzipSaleOrders', 'servi')
-                call_command(f'prepareSalesRegisters')
+                call_command(f'prepareSalesRegisters', '--format', file_format)
             else:
                 self.stdout.write("Fazendo o download dos dados pelo Tiny")
                 call_command(f'download_data_{model}')
             
             if not model == "ItemVenda":
                 # Join the download files in a singular csv
-                call_command('concate_csv', model)
+                call_command('concate_csv', model, '--format', file_format)
 
             # If its Clients, fix the ids
             if model == "Clientes":
                 if model == "Clientes":
                     call_command(
                         f'Fix_clientes', 
-                        "datasets/csv/Clientes.csv", 
+                        caminho_csv,
                         "datasets/csv"
                     )
     
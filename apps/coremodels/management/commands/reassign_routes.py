@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.coremodels import data_version, localidades
+
+
+class Command(BaseCommand):
+    help = 'Reatribui Clientes.rota a partir de CidadesRotas, pela localidade normalizada dos clientes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cidades', type=str, default=None, help='Cidades afetadas separadas por vírgula')
+        parser.add_argument('--all', action='store_true', help='Reatribui os clientes de todas as cidades')
+        parser.add_argument(
+            '--rotas',
+            type=str,
+            default=None,
+            help='IDs das rotas cujas cidades mudaram, separados por vírgula (seus clientes também são reatribuídos)'
+        )
+        parser.add_argument(
+            '--sobrescrever-rotas',
+            action='store_true',
+            help='Também troca rotas escolhidas manualmente (padrão: só clientes sem rota ou das rotas em --rotas)'
+        )
+
+    def handle(self, *args, **kwargs):
+        start_time = time.time()
+        cidades = kwargs.get('cidades')
+
+        if cidades:
+            cidades = [cidade for cidade in cidades.split(',') if cidade.strip()]
+            self.stdout.write(f"Reatribuindo rotas dos clientes de {len(cidades)} cidades...")
+        elif kwargs['all']:
+            cidades = None
+            self.stdout.write("Reatribuindo rotas dos clientes de todas as cidades...")
+        else:
+            raise CommandError("Informe --cidades ou --all.")
+
+        try:
+            rotas = [int(rota_id) for rota_id in (kwargs.get('rotas') or '').split(',') if rota_id.strip()]
+        except ValueError:
+            raise CommandError("--rotas deve conter IDs numéricos separados por vírgula.")
+
+        with transaction.atomic():
+            changed = localidades.reassign_routes(cidades, rotas=rotas, overwrite=kwargs['sobrescrever_rotas'])
+
+        data_version.bump()
+        total_time = time.time() - start_time
+        self.stdout.write(self.style.SUCCESS(f"{len(changed)} clientes mudaram de rota em {total_time:.2f} segundos."))
@@ -0,0 +1,71 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.coremodels import cep_index, data_version, localidades, rollups
+from apps.coremodels.models import Clientes
+
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = 'Resolve a localidade (pelo CEP) e a rota (por CidadesRotas) dos clientes ainda não resolvidos ou cujo CEP mudou'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Resolve todos os clientes, não só os pendentes')
+        parser.add_argument(
+            '--sobrescrever-rotas',
+            action='store_true',
+            help='Também troca a rota de clientes que já têm uma (padrão: só preenche clientes sem rota)'
+        )
+
+    def handle(self, *args, **kwargs):
+        start_time = time.time()
+        resolve_all = kwargs['all']
+        overwrite = kwargs['sobrescrever_rotas']
+
+        rotas = localidades.routes_by_city()
+        clientes = Clientes.objects.only('id', 'cep', 'cidade', 'rota', *localidades.LOCALIDADE_FIELDS).order_by('id')
+
+        resolved = 0
+        rota_changed = set()
+        with transaction.atomic():
+            batch = []
+            for cliente in clientes.iterator(chunk_size=BATCH_SIZE):
+                batch.append(cliente)
+                if len(batch) >= BATCH_SIZE:
+                    resolved += self.resolve_batch(batch, resolve_all, overwrite, rotas, rota_changed)
+                    batch = []
+            if batch:
+                resolved += self.resolve_batch(batch, resolve_all, overwrite, rotas, rota_changed)
+
+            if rota_changed:
+                self.stdout.write(f"Recalculando vendas diárias de {len(rota_changed)} clientes que mudaram de rota...")
+                rollups.refresh_daily_sales(rollups.dates_of_clientes(rota_changed))
+
+        data_version.bump()
+        total_time = time.time() - start_time
+        self.stdout.write(self.style.SUCCESS(
+            f"{resolved} clientes resolvidos ({len(rota_changed)} com nova rota) em {total_time:.2f} segundos."
+        ))
+
+    def resolve_batch(self, batch, resolve_all, overwrite, rotas, rota_changed):
+        if not resolve_all:
+            numeric = cep_index.normalize_ceps([cliente.cep for cliente in batch]).tolist()
+            batch = [
+                cliente for cliente, numeric_cep in zip(batch, numeric)
+                if cliente.localidade_chave is None
+                or cliente.cep_resolvido != (f'{numeric_cep:08d}' if numeric_cep >= 0 else None)
+            ]
+        if not batch:
+            return 0
+
+        sem_rota = [cliente for cliente in batch if cliente.rota_id is None or overwrite]
+        com_rota = [cliente for cliente in batch if cliente.rota_id is not None and not overwrite]
+        rota_changed.update(localidades.assign_localidades(sem_rota, rotas=rotas))
+        localidades.assign_localidades(com_rota, assign_rota=False)
+
+        Clientes.objects.bulk_update(batch, fields=localidades.LOCALIDADE_FIELDS, batch_size=1000)
+        self.stdout.write(f"  {len(batch)} clientes resolvidos...")
+        return len(batch)
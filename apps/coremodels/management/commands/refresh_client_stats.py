@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.coremodels import data_version, rollups
+
+
+class Command(BaseCommand):
+    help = 'Recalcula a tabela EstatisticasClientes (compras por cliente e canal) a partir de ItemVenda'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clientes', type=str, default=None, help='IDs dos clientes separados por vírgula (padrão: todos)')
+
+    def handle(self, *args, **kwargs):
+        start_time = time.time()
+        clientes = kwargs.get('clientes')
+
+        if clientes:
+            try:
+                cliente_ids = [int(cliente_id) for cliente_id in clientes.split(',') if cliente_id.strip()]
+            except ValueError:
+                raise CommandError(f"IDs inválidos: {clientes}")
+            self.stdout.write(f"Recalculando {len(cliente_ids)} clientes...")
+            rows = rollups.refresh_client_stats(cliente_ids)
+        else:
+            self.stdout.write("Recalculando todos os clientes...")
+            rows = rollups.refresh_client_stats()
+
+        data_version.bump()
+        total_time = time.time() - start_time
+        self.stdout.write(self.style.SUCCESS(f"{rows} linhas gravadas em EstatisticasClientes em {total_time:.2f} segundos."))
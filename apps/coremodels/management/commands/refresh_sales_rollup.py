@@ -0,0 +1,43 @@
+from datetime import date, datetime, timedelta
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.coremodels import data_version, rollups
+
+
+class Command(BaseCommand):
+    help = 'Recalcula a tabela VendasDiarias (resumo diário usado pela homepage) a partir de ItemVenda'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=str, default=None, help='Primeiro dia a recalcular (YYYY-MM-DD)')
+        parser.add_argument('--end', type=str, default=None, help='Último dia a recalcular (YYYY-MM-DD, padrão: hoje)')
+
+    def handle(self, *args, **kwargs):
+        start_time = time.time()
+        start = self.parse_date(kwargs.get('start'))
+        end = self.parse_date(kwargs.get('end'))
+
+        if start is None and end is None:
+            self.stdout.write("Recalculando todo o histórico...")
+            rows = rollups.refresh_daily_sales()
+        else:
+            start = start or end
+            end = end or date.today()
+            if start > end:
+                raise CommandError('--start deve ser anterior a --end')
+            self.stdout.write(f"Recalculando de {start} a {end}...")
+            dates = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+            rows = rollups.refresh_daily_sales(dates)
+
+        data_version.bump()
+        total_time = time.time() - start_time
+        self.stdout.write(self.style.SUCCESS(f"{rows} linhas gravadas em VendasDiarias em {total_time:.2f} segundos."))
+
+    def parse_date(self, value):
+        if not value:
+            return None
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f"Data inválida: {value}. Use YYYY-MM-DD.")
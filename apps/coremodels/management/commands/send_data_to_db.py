@@ -1,11 +1,14 @@
 import pandas as pd
 from django.core.management.base import BaseCommand
 from django.apps import apps
-from django.db import transaction
+from django.db import connection, models, transaction
+from django.db.models.functions import Lower
+from contextlib import contextmanager
 from decimal import Decimal
-import re
+import time
 
-from apps.coremodels.models import Clientes, ItemVenda, Produtos, Vendas, Vendedores
+from apps.coremodels import bulk_copy, cleaning, data_version, import_hashes, rollups, staging
+from apps.coremodels.natural_keys import LOOKUP_BATCH_SIZE
 
 class Command(BaseCommand):
     help = 'Importa dados de um arquivo CSV para o modelo ItemVenda'
@@ -74,39 +77,123 @@ class Command(BaseCommand):
     }
 
     def add_arguments(self, parser):
-        parser.add_argument('csv_file', type=str, help='Caminho para o arquivo CSV de ItemVenda')
+        parser.add_argument('csv_file', type=str, help='Caminho para o arquivo de ItemVenda (.csv, .parquet ou .feather)')
+        parser.add_argument(
+            '--engine',
+            choices=['orm', 'copy'],
+            default='orm',
+            help='orm: bulk_create/bulk_update do Django. copy: COPY FROM STDIN + INSERT ... ON CONFLICT (somente PostgreSQL)'
+        )
+        parser.add_argument(
+            '--chunksize',
+            type=int,
+            default=None,
+            help='Lê, processa e grava o CSV em blocos com este número de linhas (memória constante)'
+        )
 
     def handle(self, *args, **kwargs):
         csv_file_path = kwargs['csv_file']
+        engine = kwargs.get('engine', 'orm')
+        chunksize = kwargs.get('chunksize')
+        self.timings = {}
+        self.stats = import_hashes.ImportStats()
+        self.seen_keys = set()
+        # Vendas whose items were written, their days are recalculated in VendasDiarias
+        self.touched_vendas = set()
+        # Clientes whose items were written (or moved away), recalculated in EstatisticasClientes
+        self.touched_clientes = set()
+
+        if engine == 'copy' and not bulk_copy.supports_copy():
+            self.stdout.write(self.style.WARNING(
+                f"Engine 'copy' requires PostgreSQL (current: {connection.vendor}). Falling back to 'orm'."
+            ))
+            engine = 'orm'
+
+        with self.phase("Loading ItemVenda model"):
+            item_venda_model = self.get_model('ItemVenda')
+
+        preco_final = None
+        if chunksize:
+            # An order can be split between two chunks, so its total is computed beforehand
+            with self.phase("Computing order totals"):
+                preco_final = self.load_preco_final(csv_file_path, chunksize)
+            data_frames = self.iter_csv(csv_file_path, chunksize)
+        else:
+            with self.phase(f"Loading data from CSV file: {csv_file_path}"):
+                data_frames = [self.load_csv(csv_file_path)]
+
+        for number, data_df in enumerate(data_frames, start=1):
+            if chunksize:
+                print(f"Chunk {number}: {len(data_df)} rows")
+            self.import_frame(data_df, item_venda_model, engine, preco_final)
 
-        print(f"Loading ItemVenda model...")
-        # Load the ItemVenda model
-        item_venda_model = self.get_model('ItemVenda')
+        if self.touched_vendas:
+            with self.phase("Refreshing daily sales rollup"):
+                rollups.refresh_daily_sales(rollups.dates_of_vendas(self.touched_vendas))
 
-        print(f"Loading data from CSV file: {csv_file_path}")
-        # Load data from the CSV file
-        data_df = self.load_csv(csv_file_path)
+        if self.touched_clientes:
+            with self.phase("Refreshing client stats"):
+                rollups.refresh_client_stats(self.touched_clientes)
 
-        print("Mapping columns and validating...")
-        # Map columns and validate
-        self.validate_csv_columns(data_df)
+        if self.stats.created or self.stats.changed:
+            data_version.bump()
 
-        print("Preparing caches...")
-        # Prepare caches
-        caches = self.prepare_related_caches()
+        self.stdout.write(f"Rows {self.stats.summary()}")
+        self.print_timings()
 
-        print("Processing records...")
-        # Process records
-        new_records, updated_records = self.prepare_records(data_df, item_venda_model, caches)
+    def import_frame(self, data_df, item_venda_model, engine, preco_final=None):
+        """Validate, prepare and write one DataFrame (the whole file or a chunk)."""
+        self.pending_hashes = {}
+        self.pending_clientes = set()
 
-        print("Bulk creating new records...")
-        # Bulk create and update
-        self.bulk_create_new_records(item_venda_model, new_records)
-        print("Bulk creating new records... done")
+        with self.phase("Mapping columns and validating"):
+            self.validate_csv_columns(data_df)
+            data_df = self.prepare_columns(data_df, preco_final)
 
-        print("Bulk updating existing records...")
-        self.bulk_update_existing_records(item_venda_model, updated_records)
-        print("Bulk updating existing records... done")
+        # Only the related rows referenced by this frame are loaded
+        with self.phase("Preparing caches"):
+            caches = self.prepare_related_caches(data_df)
+
+        with self.phase("Processing records"):
+            new_records, updated_records = self.prepare_records(data_df, item_venda_model, caches)
+
+        if engine == 'copy':
+            written = self.copy_upsert_records(item_venda_model, new_records + updated_records)
+        else:
+            with self.phase("Bulk creating new records"):
+                created = self.bulk_create_new_records(item_venda_model, new_records)
+
+            with self.phase("Bulk updating existing records"):
+                updated = self.bulk_update_existing_records(item_venda_model, updated_records)
+            written = created and updated
+
+        # Hashes are only stored once the rows they describe were written
+        if written:
+            with self.phase("Saving import hashes"):
+                import_hashes.save_hashes('ItemVenda', self.pending_hashes)
+            self.touched_vendas.update(record['venda_id'] for record in new_records + updated_records)
+            self.touched_clientes.update(
+                record['cliente_id'] for record in new_records + updated_records if record['cliente_id'] is not None
+            )
+            self.touched_clientes.update(self.pending_clientes)
+
+    @contextmanager
+    def phase(self, label):
+        """Print the start/end of a phase and record how long it took."""
+        print(f"{label}...")
+        start = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - start
+        # Phases repeated for every chunk are added up
+        self.timings[label] = self.timings.get(label, 0) + elapsed
+        print(f"{label}... done ({elapsed:.2f}s)")
+
+    def print_timings(self):
+        total = sum(self.timings.values())
+        self.stdout.write("Phase timings:")
+        for label, elapsed in self.timings.items():
+            self.stdout.write(f"  {elapsed:8.2f}s  {label}")
+        self.stdout.write(self.style.SUCCESS(f"Import completed in {total:.2f} seconds."))
 
     def get_model(self, model_name):
         try:
@@ -114,100 +201,133 @@ class Command(BaseCommand):
         except LookupError:
             raise ValueError(f"Model '{model_name}' not found.")
 
-    def load_csv(self, csv_file):
+    def load_csv(self, csv_file, columns=None):
+        """
+        Load only the mapped columns (or `columns`) of the file, from CSV or,
+        for .parquet/.feather files, through pyarrow without re-parsing text.
+        """
+        wanted = set(columns or self.COLUMN_MAPPINGS)
         try:
-            df = pd.read_csv(csv_file, encoding='utf-8', low_memory=False)
+            if staging.is_columnar(csv_file):
+                return staging.read_frame(csv_file, columns=wanted)
+            df = pd.read_csv(
+                csv_file, encoding='utf-8', low_memory=False,
+                usecols=lambda col: col.strip().lower() in wanted
+            )
             df.columns = [col.strip().lower() for col in df.columns]
             return df
         except Exception as e:
             raise ValueError(f"Error loading CSV file: {e}")
 
+    def iter_csv(self, csv_file, chunksize, columns=None):
+        """Yield the file in DataFrames of `chunksize` rows with normalized column names."""
+        wanted = set(columns or self.COLUMN_MAPPINGS)
+        try:
+            if staging.is_columnar(csv_file):
+                reader = staging.iter_frames(csv_file, chunksize, columns=wanted)
+            else:
+                reader = pd.read_csv(
+                    csv_file, encoding='utf-8', chunksize=chunksize,
+                    usecols=lambda col: col.strip().lower() in wanted
+                )
+        except Exception as e:
+            raise ValueError(f"Error loading CSV file: {e}")
+        while True:
+            with self.phase("Reading CSV chunk"):
+                df = next(reader, None)
+            if df is None:
+                return
+            df.columns = [col.strip().lower() for col in df.columns]
+            yield df
+
+    def load_preco_final(self, csv_file, chunksize):
+        """
+        First pass over the file, reading only the columns needed to compute
+        the total of each order (`preco_final`).
+        """
+        totals = pd.Series(dtype='int64')
+        reader = self.iter_csv(csv_file, chunksize, columns=['número do pedido', 'quantidade', 'valor unitário'])
+        for df in reader:
+            df.rename(columns=self.COLUMN_MAPPINGS, inplace=True)
+            self.clean_numeric_columns(df)
+            df['venda'] = df['venda'].fillna('').astype(str).str.strip().str.lower()
+            # Partial totals are kept in cents, so adding chunks does not accumulate float errors
+            cents = self.to_cents(df['valor_total']).groupby(df['venda']).sum()
+            totals = totals.add(cents, fill_value=0)
+        return totals / 100
+
     def validate_csv_columns(self, df):
         missing_cols = [col for col in self.COLUMN_MAPPINGS if col not in df.columns]
         if missing_cols:
             raise ValueError(f'Colunas faltando no CSV: {", ".join(missing_cols)}')
 
-    def prepare_related_caches(self):
+    def prepare_related_caches(self, dataframe):
         """
-        Load caches for related models with corrected client IDs.
+        Load {lookup key: primary key} caches for the related models, limited
+        to the keys present in `dataframe`.
         """
-        caches = {
-            'vendas_cache': self.load_cache('Vendas', 'numero', 'loja'),
-            'vendedores_cache': self.load_cache('Vendedores', 'nome'),
-            'produtos_cache': self.load_cache('Produtos', 'sku'),
-            'clientes_cache': self.load_cache('Clientes', 'id'),  # Keep as is, but ensure proper int casting
+        return {
+            'vendas_cache': self.load_cache('Vendas', dataframe['venda_key'], 'numero', 'loja'),
+            'vendedores_cache': self.load_cache('Vendedores', dataframe['vendedor_key'], 'nome'),
+            'produtos_cache': self.load_cache('Produtos', dataframe['produto_key'], 'sku'),
+            'clientes_cache': self.load_cache('Clientes', dataframe['cliente_key'], 'id'),
         }
 
-        # Convert all client IDs in the cache to integers for consistent comparison
-        caches['clientes_cache'] = {str(int(key)): value for key, value in caches['clientes_cache'].items()}
-        return caches
-
-    def load_cache(self, model_name: str, *fields: str) -> dict:
+    def load_cache(self, model_name: str, keys: pd.Series, *fields: str) -> dict:
         """
-        Load a cache of objects from the given model.
+        Load the primary keys of the rows of the given model whose key is in `keys`.
+
+        Only the key fields and the PK are fetched (`values_list`), filtered in
+        batches on the first key field; text fields are compared through
+        `lower()`, matching the normalized keys built in `prepare_columns`.
 
         :param model_name: The name of the model to load.
+        :param keys: The normalized keys ('|'-joined, stripped, lowercase) to look up.
         :param fields: The fields to use as the cache key.
-        :return: A dictionary mapping cache keys to model objects.
+        :return: A dictionary mapping cache keys to primary keys.
         """
         model = apps.get_model('coremodels', model_name)
+        wanted = set(keys.dropna().unique())
+        if not wanted:
+            return {}
+
+        first = model._meta.get_field(fields[0])
         queryset = model.objects.all()
+        first_values = {key.split('|')[0] for key in wanted}
+        if isinstance(first, models.CharField):
+            queryset = queryset.annotate(_lookup_key=Lower(fields[0]))
+            lookup = '_lookup_key__in'
+        else:
+            lookup = f'{fields[0]}__in'
+            first_values = {int(value) for value in first_values if value.lstrip('-').isdigit()}
+        first_values = sorted(first_values)
+
         cache = {}
-        for obj in queryset:
-            key = '|'.join(str(getattr(obj, field)).strip().lower() for field in fields)
-            cache[key] = obj
+        for start in range(0, len(first_values), LOOKUP_BATCH_SIZE):
+            batch = first_values[start:start + LOOKUP_BATCH_SIZE]
+            for *values, pk in queryset.filter(**{lookup: batch}).values_list(*fields, 'pk'):
+                key = '|'.join(str(value).strip().lower() for value in values)
+                if key in wanted:
+                    cache[key] = pk
         return cache
 
-    def prepare_records(self, dataframe: pd.DataFrame, model, caches: dict) -> tuple:
-        dataframe.rename(columns=self.COLUMN_MAPPINGS, inplace=True)
-
-        # Ensure numeric fields are properly cleaned
-        def clean_numeric(value):
-            if pd.isna(value):  # Handle NaN
-                return 0.0
-            if isinstance(value, str):
-                value = re.sub(r'[^\d,\.]', '', value)  # Remove invalid characters
-                value = value.replace(',', '.')  # Convert commas to dots for decimals
-            try:
-                return float(value)
-            except ValueError:
-                return 0.0
-
-        # Calculate `valor_total`
-        def calculate_valor_total(row):
-            try:
-                return row['valor_unitario'] * row['quantidade_produto']
-            except TypeError:
-                return None  # Handle missing or invalid data gracefully
-
-        numeric_columns = ['quantidade_produto', 'valor_unitario', 'valor_desconto', 'frete',
-                        'despesas_rateadas', 'desconto_rateado', 'frete_rateado']
-        for column in numeric_columns:
-            if column in dataframe.columns:
-                dataframe[column] = dataframe[column].apply(clean_numeric)
+    def prepare_columns(self, dataframe: pd.DataFrame, preco_final=None) -> pd.DataFrame:
+        """
+        Rename the CSV columns to the model fields, clean the numeric columns,
+        compute `preco_final` and build the normalized lookup key columns.
+        """
+        dataframe = dataframe.rename(columns=self.COLUMN_MAPPINGS)
 
-        dataframe['valor_total'] = dataframe.apply(calculate_valor_total, axis=1)
+        self.clean_numeric_columns(dataframe)
         print(f'valor total:{dataframe['valor_total'].head()}')
-        
-        numeric_columns = ['valor_total']
-        for column in numeric_columns:
-            if column in dataframe.columns:
-                dataframe[column] = dataframe[column].apply(clean_numeric)
 
-        # Calculate `preco_final` (total for each `venda`) and subtract `frete`
+        # Calculate `preco_final` (total for each `venda`)
         dataframe['venda'] = dataframe['venda'].fillna('').astype(str).str.strip().str.lower()
+        if preco_final is None:
+            dataframe['preco_final'] = self.compute_preco_final(dataframe)
+        else:
+            dataframe['preco_final'] = dataframe['venda'].map(preco_final)
 
-        # Group by `venda` and calculate `preco_final` using Decimal
-        preco_final_df = (
-            dataframe.groupby('venda')
-            .apply(lambda group: sum(group['valor_total']))
-            .reset_index(name='preco_final')
-        )
-
-        print(f'venda = 564265: {preco_final_df.loc[preco_final_df["venda"] == "564265"]}')
-
-        dataframe = dataframe.merge(preco_final_df, on='venda', how='left')
-        
         print(f'preco final:{dataframe["preco_final"].head()}')
 
         # Additional processing and normalization
@@ -216,109 +336,157 @@ class Command(BaseCommand):
         dataframe['produto_key'] = dataframe['produto'].fillna('').astype(str).str.strip().str.lower()
         dataframe['cliente_key'] = dataframe['cliente'].fillna(0).astype(int).astype(str)
         dataframe['vendedor_key'] = dataframe['vendedor'].fillna('').astype(str).str.strip().str.lower()
+        return dataframe
 
-        # Perform lookup
-        dataframe['venda'] = dataframe['venda_key'].map(caches['vendas_cache'])
-        dataframe['produto'] = dataframe['produto_key'].map(caches['produtos_cache'])
-        dataframe['cliente'] = dataframe['cliente_key'].map(caches['clientes_cache'])
-        dataframe['vendedor'] = dataframe['vendedor_key'].map(caches['vendedores_cache'])
+    def prepare_records(self, dataframe: pd.DataFrame, model, caches: dict) -> tuple:
+        # Resolve the related rows to their primary keys
+        dataframe['venda_id'] = dataframe['venda_key'].map(caches['vendas_cache'])
+        dataframe['produto_id'] = dataframe['produto_key'].map(caches['produtos_cache'])
+        dataframe['cliente_id'] = dataframe['cliente_key'].map(caches['clientes_cache'])
+        dataframe['vendedor_id'] = dataframe['vendedor_key'].map(caches['vendedores_cache']).astype('Int64')
 
         # Check for missing mappings
-        missing_vendas = dataframe[dataframe['venda'].isnull()]
+        missing_vendas = dataframe[dataframe['venda_id'].isnull()]
         if not missing_vendas.empty:
             print("[DEBUG] Missing 'venda' mappings for the following keys:", missing_vendas['venda_key'].unique())
 
-        dataframe.dropna(subset=['venda', 'produto', 'quantidade_produto', 'cliente'], inplace=True)
-
-        existing_records = set(
-            model.objects.filter(
-                venda__in=dataframe['venda'],
-                produto__in=dataframe['produto'],
-            ).values_list('venda_id', 'produto_id')
-        )
-        dataframe_existing = dataframe[
-            dataframe.apply(lambda row: (row['venda'].numero, row['produto'].sku) in existing_records, axis=1)
-        ]
-        dataframe_new = dataframe[
-            dataframe.apply(lambda row: (row['venda'].numero, row['produto'].sku) not in existing_records, axis=1)
-        ]
-
-        # Filter columns to match model fields
+        rows_before = len(dataframe)
+        dataframe.dropna(subset=['venda_id', 'produto_id', 'quantidade_produto', 'cliente_id'], inplace=True)
+        self.stats.skipped += rows_before - len(dataframe)
+        # Produtos is keyed by its SKU, the other keys are integers
+        dataframe = dataframe.astype({'venda_id': 'int64', 'cliente_id': 'int64'})
+
+        # A single row per (venda, produto); the first one in the file wins,
+        # including across chunks
+        rows_before = len(dataframe)
+        dataframe = dataframe.drop_duplicates(subset=['venda_id', 'produto_id'], keep='first')
+        keys = pd.MultiIndex.from_frame(dataframe[['venda_id', 'produto_id']])
+        already_seen = keys.isin(self.seen_keys)
+        dataframe = dataframe[~already_seen]
+        self.seen_keys.update(keys[~already_seen])
+        self.stats.skipped += rows_before - len(dataframe)
+
+        # Hash the row content, using the lookup keys instead of the related ids
         model_fields = [f.name for f in model._meta.fields]
-        dataframe_new = dataframe_new[[col for col in dataframe_new.columns if col in model_fields]]
-        dataframe_existing = dataframe_existing[[col for col in dataframe_existing.columns if col in model_fields]]
-
-        new_records = dataframe_new.apply(self.clean_record, axis=1).tolist()
-        updated_records = dataframe_existing.apply(self.clean_record, axis=1).to_dict(orient='records')
+        foreign_keys = ['venda', 'produto', 'cliente', 'vendedor']
+        content_columns = [col for col in dataframe.columns if col in model_fields and col not in foreign_keys]
+        content_columns += [f'{key}_key' for key in foreign_keys]
+        dataframe['row_hash'] = import_hashes.row_hashes(dataframe[content_columns])
+        dataframe['chave'] = dataframe['venda_id'].astype(str) + '|' + dataframe['produto_id'].astype(str)
+
+        # New/existing split with a merge on the (venda_id, produto_id) key columns
+        existing_records = pd.DataFrame(
+            list(model.objects.filter(
+                venda_id__in=dataframe['venda_id'].unique().tolist(),
+                produto_id__in=dataframe['produto_id'].unique().tolist(),
+            ).values_list('venda_id', 'produto_id', 'pk', 'cliente_id')),
+            columns=['venda_id', 'produto_id', 'existing_pk', 'existing_cliente_id'],
+        ).astype({'venda_id': 'int64', 'produto_id': object, 'existing_pk': 'int64', 'existing_cliente_id': 'int64'})
+        dataframe = dataframe.merge(existing_records, on=['venda_id', 'produto_id'], how='left', indicator=True)
+        stored_hashes = import_hashes.load_hashes('ItemVenda', dataframe['chave'])
+
+        is_existing = dataframe['_merge'] == 'both'
+        unchanged = is_existing & (dataframe['chave'].map(stored_hashes) == dataframe['row_hash'])
+        self.stats.unchanged += int(unchanged.sum())
+
+        dataframe_existing = dataframe[is_existing & ~unchanged]
+        dataframe_new = dataframe[~is_existing]
+        self.pending_hashes.update(zip(dataframe_existing['chave'], dataframe_existing['row_hash']))
+        self.pending_hashes.update(zip(dataframe_new['chave'], dataframe_new['row_hash']))
+        # An updated item may move to another client, whose stats change as well
+        self.pending_clientes.update(dataframe_existing['existing_cliente_id'].astype('int64').tolist())
+
+        # Keep the model columns, normalized column by column
+        field_columns = [col for col in dataframe.columns if col in model_fields and col not in foreign_keys]
+        columns = field_columns + [f'{key}_id' for key in foreign_keys]
+        dataframe_new = self.normalize_columns(dataframe_new[columns], field_columns)
+        dataframe_existing = self.normalize_columns(dataframe_existing[columns + ['existing_pk']], field_columns)
+        dataframe_existing = dataframe_existing.rename(columns={'existing_pk': model._meta.pk.name})
+
+        # Plain dicts are only built here, at the very end
+        new_records = self.frame_to_records(dataframe_new)
+        updated_records = self.frame_to_records(dataframe_existing)
+        self.stats.created += len(new_records)
+        self.stats.changed += len(updated_records)
 
         print(f"Prepared {len(new_records)} new records and {len(updated_records)} updated records.")
         return new_records, updated_records
 
 
-    def clean_record(self, record_data):
+    NUMERIC_COLUMNS = ['quantidade_produto', 'valor_unitario', 'valor_desconto', 'frete',
+                       'despesas_rateadas', 'desconto_rateado', 'frete_rateado']
+
+    @staticmethod
+    def parse_numeric(series):
         """
-        Clean a single record and prepare it for insertion/update in the database.
+        Convert a column to floats: text keeps only digits, ',' and '.', with ','
+        read as the decimal separator. Missing or unparseable values become NaN.
         """
-        normalized_data = self.normalize_data(record_data)
-        cleaned_data = {}
-
-        for field_name, value in normalized_data.items():
-            # Handle foreign key validations
-            if field_name == 'venda' and not isinstance(value, Vendas):
-                raise ValueError(f"`venda` value must be a Vendas instance. Got: {type(value)}")
-            elif field_name == 'produto' and not isinstance(value, Produtos):
-                raise ValueError(f"`produto` value must be a Produtos instance. Got: {type(value)}")
-            elif field_name == 'cliente' and not isinstance(value, Clientes):
-                raise ValueError(f"`cliente` value must be a Clientes instance. Got: {type(value)}")
-            elif field_name == 'vendedor':
-                if isinstance(value, Vendedores) or value is None:
-                    cleaned_value = value
-                elif pd.isna(value):  # Check for nan values
-                    cleaned_value = None
-                else:
-                    raise ValueError(f"`vendedor` value must be a Vendedores instance or None. Got: {type(value)} - {value}")
-            else:
-                cleaned_value = value
+        if pd.api.types.is_numeric_dtype(series):
+            return series.astype(float)
+        text = series.astype(str).str.replace(r'[^\d,\.]', '', regex=True).str.replace(',', '.', regex=False)
+        return pd.to_numeric(text, errors='coerce').where(series.notna())
 
-            cleaned_data[field_name] = cleaned_value
+    def clean_numeric(self, series):
+        """parse_numeric with missing or unparseable values as 0.0."""
+        return self.parse_numeric(series).fillna(0.0)
 
-        return cleaned_data
-    
-    def normalize_data(self, record_data):
+    @classmethod
+    def staging_parsers(cls):
         """
-        Normalize data for a single record, skipping foreign key fields.
+        Return {CSV column: (kind, parser)} for the columns that Parquet/Feather
+        staging files store already parsed: the numeric columns as floats and
+        the client id as an integer.
         """
-        normalized_data = {}
-        for field_name, value in record_data.items():
-            # Skip foreign key fields
-            if field_name in ['venda', 'produto', 'cliente', 'vendedor']:
-                normalized_data[field_name] = value
-                continue
+        parsers = {'id contato': ('int', lambda series: cleaning.clean_integer(series)[0])}
+        for csv_column, field in cls.COLUMN_MAPPINGS.items():
+            if field in cls.NUMERIC_COLUMNS:
+                parsers[csv_column] = ('float', cls.parse_numeric)
+        return parsers
+
+    def to_cents(self, values):
+        """Round money values to whole cents (int64), the precision of the DecimalFields."""
+        return (values * 100).round().astype('int64')
+
+    def clean_numeric_columns(self, dataframe):
+        """Clean the numeric columns in place and calculate `valor_total`."""
+        for column in self.NUMERIC_COLUMNS:
+            if column in dataframe.columns:
+                dataframe[column] = self.clean_numeric(dataframe[column])
+
+        # Rounded to cents like the stored value, so `preco_final` is the exact sum of the items
+        valor_total = (dataframe['valor_unitario'] * dataframe['quantidade_produto']).fillna(0.0)
+        dataframe['valor_total'] = self.to_cents(valor_total) / 100
+
+    def compute_preco_final(self, dataframe):
+        """Return, for every row, the total of its `venda` (sum of `valor_total`, added in cents)."""
+        cents = self.to_cents(dataframe['valor_total'])
+        return cents.groupby(dataframe['venda']).transform('sum') / 100
 
+    def normalize_columns(self, dataframe, field_columns):
+        """
+        Convert each model column to its type from FIELD_TYPE_MAPPINGS, one column at a time.
+        The `*_id` foreign key columns are already integers and are left untouched.
+        """
+        dataframe = dataframe.copy()
+        for field_name in field_columns:
             field_type = self.FIELD_TYPE_MAPPINGS.get(field_name, 'str')
-            
+            column = dataframe[field_name]
             try:
                 if field_type == 'int':
-                    normalized_data[field_name] = int(value) if not pd.isna(value) else None
+                    dataframe[field_name] = pd.to_numeric(column).astype('Int64')
                 elif field_type == 'float':
-                    if isinstance(value, str):
-                        # Handle the case for `valor_total` and `preco_final` where commas and periods may be used incorrectly
-                        if field_name in ['valor_total', 'preco_final']:
-                            # Replace commas with periods for decimals and remove periods for thousands
-                            value = value.replace('.', '').replace(',', '.')
-                        else:
-                            # Standard float conversion logic
-                            value = value.replace(',', '.').replace('.', '', 1) if ',' in value else value
-                    normalized_data[field_name] = float(value) if value not in [None, '', 'NaN'] else None
+                    dataframe[field_name] = pd.to_numeric(column)
                 elif field_type == 'str':
-                    normalized_data[field_name] = str(value).strip() if not pd.isna(value) else ''
-                else:
-                    # Default case: assign the value as-is
-                    normalized_data[field_name] = value
+                    dataframe[field_name] = column.fillna('').astype(str).str.strip()
             except (ValueError, TypeError) as e:
-                raise ValueError(f"Error normalizing field '{field_name}': {value} ({e})")
+                raise ValueError(f"Error normalizing field '{field_name}': {e}")
+        return dataframe
 
-        return normalized_data
+    def frame_to_records(self, dataframe):
+        """Return the rows as dicts of plain Python values, with None for missing values."""
+        dataframe = dataframe.astype(object).where(dataframe.notna(), None)
+        return dataframe.to_dict(orient='records')
 
     def bulk_create_new_records(self, model, new_records):
         print(f"Creating {len(new_records)} new records...")
@@ -326,19 +494,53 @@ class Command(BaseCommand):
             item_venda_instances = [model(**record) for record in new_records]
             model.objects.bulk_create(item_venda_instances, batch_size=500, ignore_conflicts=True)
             print(f"Created {len(new_records)} new records.")
+            return True
         except Exception as e:
             print(f"[ERROR] Failed to create new records: {e}")
+            return False
     
     def bulk_update_existing_records(self, model, updated_records):
         print("[DEBUG] Entering bulk_update_existing_records method.")
         if updated_records:
             print(f"[DEBUG] Number of records to update: {len(updated_records)}")
-            fields = [f.name for f in model._meta.fields if f.name != model._meta.pk.name]
+            fields = [f.name for f in model._meta.fields if f.name != model._meta.pk.name and f.attname in updated_records[0]]
             print(f"[DEBUG] Fields to update: {fields}")
             try:
-                model.objects.bulk_update(updated_records, fields=fields, batch_size=500, ignore_conflicts=True)
+                instances = [model(**record) for record in updated_records]
+                model.objects.bulk_update(instances, fields=fields, batch_size=500)
                 self.stdout.write(f"[INFO] Updated {len(updated_records)} records.")
             except Exception as e:
                 print(f"[ERROR] An error occurred during bulk update: {e}")
+                return False
         else:
             print("[DEBUG] No records to update.")
+        return True
+
+    def copy_upsert_records(self, model, records):
+        """
+        Stream the records into a staging table with COPY and merge them into
+        the ItemVenda table with a single INSERT ... ON CONFLICT DO UPDATE.
+        """
+        if not records:
+            print("[DEBUG] No records to copy.")
+            return True
+
+        with self.phase("Building COPY frame"):
+            frame = bulk_copy.records_to_frame(model, records)
+            frame = bulk_copy.fill_model_defaults(model, frame)
+            conflict_fields = ['venda_id', 'produto_id']
+            frame.drop_duplicates(subset=conflict_fields, keep='first', inplace=True)
+            fields = bulk_copy.model_columns(model, frame)
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            with self.phase("Creating staging table"):
+                staging_table = bulk_copy.create_staging_table(cursor, model, fields)
+
+            with self.phase(f"COPY {len(frame)} rows into {staging_table}"):
+                bulk_copy.copy_frame(cursor, staging_table, frame, fields)
+
+            with self.phase(f"Merging {staging_table} into {model._meta.db_table}"):
+                affected = bulk_copy.merge_staging(cursor, model, staging_table, fields, conflict_fields)
+
+        self.stdout.write(f"[INFO] Upserted {affected} records.")
+        return True
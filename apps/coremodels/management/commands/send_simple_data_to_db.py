@@ -3,14 +3,15 @@ import pandas as pd
 from django.core.management.base import BaseCommand
 from django.apps import apps
 from django.db import transaction, IntegrityError
-from decimal import Decimal, InvalidOperation
-from datetime import datetime
+from decimal import Decimal
 import logging
-import re
 import traceback
-from django.db import models
 import time
 
+from apps.coremodels import data_version, import_hashes, localidades, natural_keys, rollups, staging
+from apps.coremodels.cleaning import ColumnCleaner, staging_parsers
+from apps.coremodels.models import ItemVenda
+
 
 logger = logging.getLogger(__name__)
 
@@ -68,12 +69,19 @@ class Command(BaseCommand):
     }
 
     def add_arguments(self, parser):
-        parser.add_argument('csv_file', type=str, help='Caminho para o arquivo CSV a ser importado')
+        parser.add_argument('csv_file', type=str, help='Caminho para o arquivo a ser importado (.csv, .parquet ou .feather)')
+        parser.add_argument(
+            '--chunksize',
+            type=int,
+            default=None,
+            help='Lê, processa e grava o CSV em blocos com este número de linhas (memória constante)'
+        )
 
     def handle(self, *args, **kwargs):
         start_time = time.time()
 
         csv_file = kwargs['csv_file']
+        chunksize = kwargs.get('chunksize')
         model_name = self.get_model_name_from_file(csv_file)
         model = self.get_model(model_name)
         if not model:
@@ -87,24 +95,52 @@ class Command(BaseCommand):
             self.stdout.write(self.style.ERROR(f'No column mapping defined for model "{model.__name__}".'))
             return
 
-        data_frame = self.load_csv(csv_file)
-        self.stdout.write(f'Loaded CSV with {len(data_frame)} rows')
-        self.validate_csv_columns(data_frame, column_mapping)
-
-        self.stdout.write('Validating columns...')
+        # Only the mapped columns are read from the file
+        if chunksize:
+            data_frames = self.iter_csv(csv_file, chunksize, column_mapping)
+        else:
+            data_frames = [self.load_csv(csv_file, column_mapping)]
+
+        self.stats = import_hashes.ImportStats()
+        # Keys already imported in this run, shared by all chunks
+        self.processed_unique_keys = set()
+        # Days whose sales changed, recalculated in VendasDiarias at the end
+        self.touched_dates = set()
+        # Vendas changed by this import, their clients are recalculated in EstatisticasClientes
+        self.touched_vendas = set()
         with transaction.atomic():
             self.clean_consumidor_final(model)
-            existing_objects = self.get_existing_objects(model, data_frame, column_mapping, model_name)
-            new_records, updated_records = self.prepare_records(data_frame, column_mapping, existing_objects, model, model_name)
-
-            self.stdout.write(f'Creating {len(new_records)} new records')
-            self.bulk_create_new_records(model, new_records)
-            self.stdout.write(f'Updating {len(updated_records)} existing records')
-            self.bulk_update_existing_records(model, updated_records)
-
+            for data_frame in data_frames:
+                self.stdout.write(f'Loaded {"chunk" if chunksize else "CSV"} with {len(data_frame)} rows')
+                self.import_frame(data_frame, column_mapping, model, model_name)
+
+            if self.touched_dates:
+                self.stdout.write(f'Refreshing daily sales rollup for {len(self.touched_dates)} days')
+                rollups.refresh_daily_sales(self.touched_dates)
+            if self.touched_vendas:
+                self.stdout.write(f'Refreshing client stats for {len(self.touched_vendas)} changed sales')
+                rollups.refresh_client_stats(rollups.clientes_of_vendas(self.touched_vendas))
+
+        data_version.bump()
+        self.stdout.write(f'Rows {self.stats.summary()}')
         total_time = time.time() - start_time
         self.stdout.write(self.style.SUCCESS(f'Import completed successfully in {total_time:.2f} seconds.'))
 
+    def import_frame(self, data_frame, column_mapping, model, model_name):
+        """Validate, prepare and write one DataFrame (the whole file or a chunk)."""
+        self.validate_csv_columns(data_frame, column_mapping)
+
+        self.stdout.write('Validating columns...')
+        self.pending_hashes = {}
+        existing_objects = self.get_existing_objects(model, data_frame, column_mapping, model_name)
+        new_records, updated_records = self.prepare_records(data_frame, column_mapping, existing_objects, model, model_name)
+
+        self.stdout.write(f'Creating {len(new_records)} new records')
+        self.bulk_create_new_records(model, new_records)
+        self.stdout.write(f'Updating {len(updated_records)} existing records')
+        self.bulk_update_existing_records(model, updated_records, column_mapping)
+        import_hashes.save_hashes(model_name, self.pending_hashes)
+
     def get_model_name_from_file(self, csv_file):
         return os.path.splitext(os.path.basename(csv_file))[0]
 
@@ -118,12 +154,31 @@ class Command(BaseCommand):
     def get_column_mapping(self, model):
         return self.COLUMN_MAPPINGS.get(model.__name__)
 
-    def load_csv(self, csv_file):
+    @classmethod
+    def staging_parsers(cls, model_name):
+        """
+        Return {CSV column: (kind, parser)} for the columns of `model_name` that
+        Parquet/Feather staging files store already parsed.
+        """
+        mapping = cls.COLUMN_MAPPINGS.get(model_name)
+        if not mapping:
+            return {}
+        return staging_parsers(apps.get_model('coremodels', model_name), mapping)
+
+    def load_csv(self, csv_file, columns=None):
         """
-        Load the CSV file and normalize column names.
+        Load the file and normalize column names. Parquet/Feather files are
+        read through pyarrow with their stored types. When `columns` is given,
+        only those columns are read.
         """
+        wanted = None if columns is None else {col.strip().lower() for col in columns}
         try:
-            df = pd.read_csv(csv_file, encoding='utf-8', low_memory=False)
+            if staging.is_columnar(csv_file):
+                return staging.read_frame(csv_file, columns=wanted)
+            df = pd.read_csv(
+                csv_file, encoding='utf-8', low_memory=False,
+                usecols=None if wanted is None else (lambda col: col.strip().lower() in wanted)
+            )
             # Normalize columns by stripping and lowercasing
             df.columns = [col.strip().lower() for col in df.columns]
             return df
@@ -131,6 +186,26 @@ class Command(BaseCommand):
             logger.error(f'Erro ao carregar CSV: {e}')
             raise
 
+    def iter_csv(self, csv_file, chunksize, columns=None):
+        """
+        Yield the file in DataFrames of `chunksize` rows with normalized column names.
+        """
+        wanted = None if columns is None else {col.strip().lower() for col in columns}
+        try:
+            if staging.is_columnar(csv_file):
+                reader = staging.iter_frames(csv_file, chunksize, columns=wanted)
+            else:
+                reader = pd.read_csv(
+                    csv_file, encoding='utf-8', chunksize=chunksize,
+                    usecols=None if wanted is None else (lambda col: col.strip().lower() in wanted)
+                )
+        except Exception as e:
+            logger.error(f'Erro ao carregar CSV: {e}')
+            raise
+        for df in reader:
+            df.columns = [col.strip().lower() for col in df.columns]
+            yield df
+
     def validate_csv_columns(self, df: pd.DataFrame, column_mapping: dict) -> None:
         """
         Validate that the CSV columns match the expected column mapping.
@@ -149,60 +224,27 @@ class Command(BaseCommand):
 
     def clean_consumidor_final(self, model):
         if model.__name__ == 'Clientes':
+            # Their items are deleted in cascade, so those days must be recalculated
+            self.touched_dates.update(
+                ItemVenda.objects.filter(cliente__nome='Consumidor Final')
+                .values_list('venda__data_compra', flat=True).distinct()
+            )
             model.objects.filter(nome='Consumidor Final').delete()
 
     def get_existing_objects(self, model, df, column_mapping, model_name):
         """
-        Retrieve existing objects based on unique fields, with caching for efficiency.
+        Retrieve the existing objects matching the unique fields of the rows in `df`.
         """
-        if not hasattr(self, 'existing_objects_cache'):
-            self.existing_objects_cache = {}
-
-        cache_key = f"{model_name}_existing_objects"
-        if cache_key in self.existing_objects_cache:
-            return self.existing_objects_cache[cache_key]
-
-        from django.db.models import Q
-
         unique_fields = self.UNIQUE_FIELDS.get(model_name, [])
         if not unique_fields:
             raise ValueError(f"No unique fields defined for model '{model_name}'.")
 
-        df_normalized = df.copy()
-        for csv_col, model_field in column_mapping.items():
-            if model_field in unique_fields:
-                df_normalized[csv_col] = (
-                    df_normalized[csv_col]
-                    .astype(str)
-                    .str.strip()
-                    .str.lower()
-                )
+        # Only the key columns are cleaned here, with the same rules used for the records
+        key_mapping = {csv_col: field for csv_col, field in column_mapping.items() if field in unique_fields}
+        keys_df = ColumnCleaner(model, key_mapping).clean(df)
+        keys = natural_keys.normalize_keys(model, unique_fields, keys_df)
 
-        unique_values_set = {
-            tuple(
-                str(row[csv_col]).strip().lower() if pd.notna(row[csv_col]) else None
-                for csv_col, field in column_mapping.items() if field in unique_fields
-            )
-            for _, row in df_normalized.iterrows()
-            if None not in [
-                row[csv_col] for csv_col in column_mapping if column_mapping[csv_col] in unique_fields
-            ]
-        }
-
-        query_filters = (
-            Q(
-                *[
-                    Q(**{f"{field}__iexact": value for field, value in zip(unique_fields, values)})
-                    for values in unique_values_set
-                ],
-                _connector=Q.OR
-            )
-            if unique_values_set else Q()
-        )
-
-        queryset = model.objects.filter(query_filters)
-        self.existing_objects_cache[cache_key] = queryset
-        return queryset
+        return natural_keys.fetch_by_natural_keys(model, unique_fields, keys)
 
     def prepare_records(self, df, mapping, existing_objects, model, model_name):
         """
@@ -210,7 +252,7 @@ class Command(BaseCommand):
         """
         new_records = []
         updated_records = []
-        processed_unique_keys = set()
+        processed_unique_keys = self.processed_unique_keys
 
         unique_fields = self.UNIQUE_FIELDS.get(model_name)
         if not unique_fields:
@@ -229,16 +271,17 @@ class Command(BaseCommand):
             for obj in existing_objects
         }
 
-        for index, row in df.iterrows():
-            record_data = self.process_row(mapping, row, model)
-
-            if record_data is None:
-                continue
+        cleaned_df = self.clean_dataframe(df, mapping, model)
+        row_hashes = import_hashes.row_hashes(cleaned_df)
 
+        candidates = []
+        to_resolve = []
+        for index, record_data, row_hash in zip(cleaned_df.index, cleaned_df.to_dict(orient='records'), row_hashes):
             # Debugging logs for missing fields
             missing_fields = [field for field in unique_fields if field not in record_data]
             if missing_fields:
                 logger.error(f"Row {index}: Missing required unique fields: {missing_fields}")
+                self.stats.skipped += 1
                 continue  # Skip rows with missing unique fields
 
             unique_key = tuple(
@@ -246,87 +289,79 @@ class Command(BaseCommand):
             )
 
             if unique_key in processed_unique_keys:
+                self.stats.skipped += 1
                 continue
 
             processed_unique_keys.add(unique_key)
+            candidates.append((unique_key, record_data, row_hash))
 
+        stored_hashes = import_hashes.load_hashes(
+            model_name, (import_hashes.key_string(key) for key, _, _ in candidates)
+        )
+
+        for unique_key, record_data, row_hash in candidates:
+            chave = import_hashes.key_string(unique_key)
             existing_record = existing_objects_lookup.get(unique_key)
 
             if existing_record:
+                if stored_hashes.get(chave) == row_hash:
+                    self.stats.unchanged += 1
+                    continue
+                if model_name == 'Vendas':
+                    # Date, channel or status changes move the sale between rollup rows
+                    self.touched_dates.update({existing_record.data_compra, record_data.get('data_compra')} - {None})
+                    self.touched_vendas.add(existing_record.pk)
+                if model_name == 'Clientes' and localidades.needs_resolution(
+                    existing_record, record_data.get('cep'), record_data.get('cidade')
+                ):
+                    to_resolve.append(existing_record)
                 for field, value in record_data.items():
                     setattr(existing_record, field, value)
                 updated_records.append(existing_record)
+                self.stats.changed += 1
             else:
+                # Clientes without a name cannot be created
+                if model_name == 'Clientes' and record_data.get('nome') is None:
+                    self.stats.skipped += 1
+                    continue
                 new_records.append(model(**record_data))
+                if model_name == 'Clientes':
+                    to_resolve.append(new_records[-1])
+                self.stats.created += 1
+
+            self.pending_hashes[chave] = row_hash
+
+        if to_resolve:
+            # Only new clients and clients whose CEP or city changed are resolved again
+            self.stdout.write(f'Resolving locality and route of {len(to_resolve)} clients')
+            # A route chosen by hand is kept: only clients without one get the route of their city
+            sem_rota = [cliente for cliente in to_resolve if cliente.rota_id is None]
+            com_rota = [cliente for cliente in to_resolve if cliente.rota_id is not None]
+            rota_changed = localidades.assign_localidades(sem_rota)
+            localidades.assign_localidades(com_rota, assign_rota=False)
+            if rota_changed:
+                # VendasDiarias sums each client's sales under their route
+                self.touched_dates.update(rollups.dates_of_clientes(rota_changed))
 
         return new_records, updated_records
 
-    def process_row(self, mapping, row, model):
-        """Process a single row of data from the CSV and clean it based on the model fields."""
-
-        data = {}
-        for csv_column, model_field in mapping.items():
-            # Normalize CSV column name to match with column_mapping
-            csv_column = csv_column.lower().strip()
-            if csv_column in row:
-                raw_value = row[csv_column]
-                cleaned_value = self.clean_value(model_field, model, raw_value)
-
-                if model.__name__ == 'Vendas' and model_field == 'canal_venda':
-                    cleaned_value = cleaned_value or 'Pdv'
-
-                data[model_field] = cleaned_value
+    def clean_dataframe(self, df, mapping, model):
+        """
+        Clean every mapped column of the CSV at once, based on the model field types.
+        """
+        cleaned_df = ColumnCleaner(model, mapping).clean(df)
 
-        # Debugging logs for processed data
-        logger.debug(f"Processed row data: {data}")
-        return data
+        if model.__name__ == 'Vendas' and 'canal_venda' in cleaned_df.columns:
+            canal = cleaned_df['canal_venda']
+            cleaned_df['canal_venda'] = canal.where(canal.notna() & (canal != ''), 'Pdv')
 
-    def clean_value(self, field_name, model, value):
-        if pd.isna(value) or value in (None, '', '-'):
-            return None
-    
-        # Get the field type from the model
-        field = model._meta.get_field(field_name)
-    
-        # Handle different field types
-        try:
-            if isinstance(field, models.DecimalField):
-                # Handle commas and convert to Decimal
-                value = re.sub(r'[^\d.,-]', '', str(value))
-                return Decimal(value.replace(',', '.'))
-            elif isinstance(field, models.DateField):
-                # Parse date in multiple formats
-                for fmt in ('%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y'):
-                    try:
-                        return datetime.strptime(value, fmt).date()
-                    except ValueError:
-                        continue
-                raise ValueError(f"Invalid date format for field '{field_name}': {value}")
-            elif isinstance(field, models.BooleanField):
-                # Normalize boolean values
-                return str(value).lower() in ('true', '1', 'yes', 'sim')
-            elif isinstance(field, models.IntegerField):
-                return int(value)  # No need to call strip on integer values
-            elif isinstance(field, models.CharField):
-                return str(value).strip()
-            elif isinstance(field, models.EmailField):
-                # Validate email format
-                return str(value).strip()
-            # Add more field types as needed
-            return value
-        except (ValueError, InvalidOperation, TypeError) as e:
-            logger.error(f"Error converting value '{value}' for field '{field_name}': {e}")
-            return None
+        return cleaned_df
 
     def bulk_create_new_records(self, model, new_records):
         if new_records:
             print(f'Creating new records of model {model.__name__}')
             print(f'Number of new records: {len(new_records)}')
 
-            # Remove rows where nome is null before creating
-            if model.__name__ == 'Clientes':
-                new_records = [record for record in new_records if record.nome is not None]
-
             try:
                 model.objects.bulk_create(new_records, ignore_conflicts=True)
                 print(f'Finished creating new records of model {model.__name__}')
@@ -335,11 +370,19 @@ class Command(BaseCommand):
                 print(f'Erro ao criar novos registros: {e}')
                 raise
 
-    def bulk_update_existing_records(self, model, updated_records):
+    def bulk_update_existing_records(self, model, updated_records, mapping):
         if not updated_records:
             return
 
-        fields_to_update = [field.name for field in model._meta.fields if field.name != model._meta.pk.name]
+        # Only the columns that come from the file can have changed
+        mapped_fields = set(mapping.values())
+        if model.__name__ == 'Clientes':
+            # Written by localidades.assign_localidades for the changed rows
+            mapped_fields.update(localidades.LOCALIDADE_FIELDS)
+        fields_to_update = [
+            field.name for field in model._meta.fields
+            if field.name != model._meta.pk.name and field.name in mapped_fields
+        ]
 
         try:
             model.objects.bulk_update(updated_records, fields=fields_to_update)
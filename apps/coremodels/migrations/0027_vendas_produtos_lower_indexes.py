@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:44
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coremodels', '0026_alter_clientes_rota'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='produtos',
+            index=models.Index(django.db.models.functions.text.Lower('sku'), name='produtos_sku_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vendas',
+            index=models.Index(models.F('numero'), django.db.models.functions.text.Lower('loja'), name='vendas_numero_loja_lower_idx'),
+        ),
+    ]
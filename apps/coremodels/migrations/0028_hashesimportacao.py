@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coremodels', '0027_vendas_produtos_lower_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HashesImportacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(max_length=50)),
+                ('chave', models.CharField(max_length=255)),
+                ('hash', models.CharField(max_length=16)),
+            ],
+            options={
+                'unique_together': {('modelo', 'chave')},
+            },
+        ),
+    ]
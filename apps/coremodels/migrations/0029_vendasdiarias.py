@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:03
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coremodels', '0028_hashesimportacao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VendasDiarias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField()),
+                ('canal_venda', models.CharField(max_length=255, null=True)),
+                ('situacao', models.CharField(max_length=255, null=True)),
+                ('loja', models.CharField(max_length=255, null=True)),
+                ('valor_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('valor_com_desconto', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('quantidade_itens', models.FloatField(default=0)),
+                ('numero_itens', models.IntegerField(default=0)),
+                ('numero_vendas', models.IntegerField(default=0)),
+                ('rota', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='coremodels.rotas')),
+                ('vendedor', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='coremodels.vendedores')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['data'], name='vendas_diarias_data_idx')],
+            },
+        ),
+    ]
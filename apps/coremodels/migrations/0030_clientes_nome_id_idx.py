@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coremodels', '0029_vendasdiarias'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='clientes',
+            index=models.Index(fields=['nome', 'id'], name='clientes_nome_id_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:12
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+
+
+def populate_client_stats(apps, schema_editor):
+    ItemVenda = apps.get_model('coremodels', 'ItemVenda')
+    EstatisticasClientes = apps.get_model('coremodels', 'EstatisticasClientes')
+    grouped = ItemVenda.objects.exclude(venda__situacao='Cancelado').values(
+        'cliente_id', 'venda__canal_venda'
+    ).annotate(
+        primeira=Min('venda__data_compra'),
+        ultima=Max('venda__data_compra'),
+        compras=Count('venda', distinct=True),
+        total=Sum('valor_total'),
+    ).order_by()
+    EstatisticasClientes.objects.bulk_create(
+        (
+            EstatisticasClientes(
+                cliente_id=row['cliente_id'],
+                canal_venda=row['venda__canal_venda'],
+                primeira_compra=row['primeira'],
+                ultima_compra=row['ultima'],
+                numero_compras=row['compras'],
+                total_gasto=row['total'] or Decimal('0.00'),
+            )
+            for row in grouped.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coremodels', '0030_clientes_nome_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstatisticasClientes',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('canal_venda', models.CharField(max_length=255, null=True)),
+                ('primeira_compra', models.DateField()),
+                ('ultima_compra', models.DateField()),
+                ('numero_compras', models.IntegerField(default=0)),
+                ('total_gasto', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='estatisticas', to='coremodels.clientes')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['canal_venda', 'ultima_compra'], name='estat_cli_canal_ultima_idx'), models.Index(fields=['canal_venda', '-total_gasto'], name='estat_cli_canal_total_idx')],
+                'unique_together': {('cliente', 'canal_venda')},
+            },
+        ),
+        migrations.RunPython(populate_client_stats, migrations.RunPython.noop),
+    ]
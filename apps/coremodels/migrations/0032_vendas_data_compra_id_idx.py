@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coremodels', '0031_estatisticasclientes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vendas',
+            index=models.Index(fields=['data_compra', 'id'], name='vendas_data_compra_id_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coremodels', '0032_vendas_data_compra_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clientes',
+            name='cep_resolvido',
+            field=models.CharField(blank=True, max_length=8, null=True),
+        ),
+        migrations.AddField(
+            model_name='clientes',
+            name='localidade',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='clientes',
+            name='localidade_chave',
+            field=models.CharField(blank=True, db_index=True, max_length=255, null=True),
+        ),
+    ]
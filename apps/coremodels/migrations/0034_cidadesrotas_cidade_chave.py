@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:30
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+def normalize_city(name):
+    # Same rule as apps.coremodels.localidades.normalize_city
+    if name is None:
+        return None
+    decomposed = unicodedata.normalize('NFKD', str(name))
+    text = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(text.casefold().split()) or None
+
+
+def populate_cidade_chave(apps, schema_editor):
+    CidadesRotas = apps.get_model('coremodels', 'CidadesRotas')
+    cidades = list(CidadesRotas.objects.all())
+    for cidade in cidades:
+        cidade.cidade_chave = normalize_city(cidade.cidade)
+    CidadesRotas.objects.bulk_update(cidades, ['cidade_chave'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coremodels', '0033_clientes_localidade'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cidadesrotas',
+            name='cidade_chave',
+            field=models.CharField(blank=True, db_index=True, max_length=255, null=True),
+        ),
+        migrations.RunPython(populate_cidade_chave, migrations.RunPython.noop),
+    ]
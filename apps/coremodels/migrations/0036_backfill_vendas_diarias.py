@@ -0,0 +1,23 @@
+from django.db import migrations
+
+from apps.coremodels import rollups
+
+
+def backfill_vendas_diarias(apps, schema_editor):
+    # The homepage reads VendasDiarias as soon as it has rows, and imports only refresh
+    # the days they touch: the whole history is rolled up once here
+    ItemVenda = apps.get_model('coremodels', 'ItemVenda')
+    VendasDiarias = apps.get_model('coremodels', 'VendasDiarias')
+    VendasDiarias.objects.all().delete()
+    VendasDiarias.objects.bulk_create(rollups.daily_sales_rows(ItemVenda.objects.all(), VendasDiarias), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coremodels', '0035_cache_table'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_vendas_diarias, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations
+
+from apps.coremodels import rollups
+
+
+def backfill_estatisticas_clientes(apps, schema_editor):
+    # The clients listing, rankings and inactive clients read EstatisticasClientes, and
+    # imports only refresh the clients they touch: every client is summarized once here
+    ItemVenda = apps.get_model('coremodels', 'ItemVenda')
+    EstatisticasClientes = apps.get_model('coremodels', 'EstatisticasClientes')
+    EstatisticasClientes.objects.all().delete()
+    EstatisticasClientes.objects.bulk_create(
+        rollups.client_stats_rows(ItemVenda.objects.all(), EstatisticasClientes), batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coremodels', '0036_backfill_vendas_diarias'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_estatisticas_clientes, migrations.RunPython.noop),
+    ]
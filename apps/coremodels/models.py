@@ -7,7 +7,8 @@ from django.contrib.auth.models import (
     Permission
 )
 from decimal import Decimal
-from django.db.models import Sum, F
+from django.db.models import Sum, F, Q, Max, Count
+from django.db.models.functions import Lower
 
 '''
 ==========================================================
@@ -15,6 +16,22 @@ from django.db.models import Sum, F
 ==========================================================
 '''
 
+class ClientesQuerySet(models.QuerySet):
+    def with_purchase_stats(self):
+        """
+        Anota as compras Pdv não canceladas de cada cliente numa única query:
+        `ultima_compra`, `total_gasto` e `numero_compras`.
+        """
+        compras_pdv = (
+            Q(compras_cliente__venda__canal_venda="Pdv")
+            & ~Q(compras_cliente__venda__situacao="Cancelado")
+        )
+        return self.annotate(
+            ultima_compra=Max("compras_cliente__venda__data_compra", filter=compras_pdv),
+            total_gasto=Sum("compras_cliente__valor_total", filter=compras_pdv),
+            numero_compras=Count("compras_cliente__venda", filter=compras_pdv, distinct=True),
+        )
+
 class Clientes(models.Model):
     # Identificação Básica
     id = models.AutoField(primary_key=True)
@@ -42,6 +59,12 @@ class Clientes(models.Model):
     cidade = models.CharField(max_length=100, null=True, blank=True)
     estado = models.CharField(max_length=100, null=True, blank=True)
 
+    # Resolvidos na importação (apps.coremodels.localidades): cidade do CEP na tabela de faixas,
+    # chave normalizada (cidade do CEP ou, sem ela, `cidade`) usada para a rota, e o CEP resolvido
+    localidade = models.CharField(max_length=255, null=True, blank=True)
+    localidade_chave = models.CharField(max_length=255, null=True, blank=True, db_index=True)
+    cep_resolvido = models.CharField(max_length=8, null=True, blank=True)
+
     # Classificação e Situação
     situacao = models.CharField(
         max_length=200,
@@ -53,6 +76,8 @@ class Clientes(models.Model):
     codigo_regime_tributario = models.CharField(max_length=50, null=True, blank=True)
     limite_credito = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True)
 
+    objects = ClientesQuerySet.as_manager()
+
     def __str__(self):
         return f"Cliente {self.nome} ({self.cpf_cnpj})"
 
@@ -68,6 +93,10 @@ class Clientes(models.Model):
         verbose_name = "Cliente"
         verbose_name_plural = "Clientes"
         ordering = ['nome']
+        indexes = [
+            # Keyset pagination of the clients listing
+            models.Index(fields=['nome', 'id'], name='clientes_nome_id_idx'),
+        ]
 
 '''
 ==========================================================
@@ -97,6 +126,9 @@ class Produtos(models.Model):
         verbose_name = "Produto"
         verbose_name_plural = "Produtos"
         ordering = ['descricao']
+        indexes = [
+            models.Index(Lower('sku'), name='produtos_sku_lower_idx'),
+        ]
 
 '''
 ==========================================================
@@ -144,6 +176,13 @@ class Vendas(models.Model):
         """Calcula o valor total desta venda."""
         return self.itens_venda.aggregate(total=Sum(F('preco_final') - F('valor_desconto')))['total'] or Decimal('0.00')
 
+    class Meta:
+        indexes = [
+            models.Index(F('numero'), Lower('loja'), name='vendas_numero_loja_lower_idx'),
+            # Date-range listing of VendasListAPIView, newest first
+            models.Index(fields=['data_compra', 'id'], name='vendas_data_compra_id_idx'),
+        ]
+
 '''
 ==========================================================
                 Model de Itens por Venda
@@ -204,10 +243,95 @@ class CidadesRotas(models.Model):
     id = models.AutoField(primary_key=True)
     rota = models.ForeignKey('Rotas', on_delete=models.CASCADE, related_name='cidades_rota')
     cidade = models.CharField(max_length=255)
+    # cidade normalizada, comparada com Clientes.localidade_chave (bulk_create deve preenchê-la)
+    cidade_chave = models.CharField(max_length=255, null=True, blank=True, db_index=True)
 
     def __str__(self):
         return self.cidade
+
+    def save(self, *args, **kwargs):
+        from apps.coremodels.localidades import normalize_city
+        self.cidade_chave = normalize_city(self.cidade)
+        super().save(*args, **kwargs)
     
+'''
+==========================================================
+                Hashes de Importação
+==========================================================
+'''
+
+class HashesImportacao(models.Model):
+    """Hash do conteúdo importado de cada registro, usado para pular linhas que não mudaram."""
+    modelo = models.CharField(max_length=50)
+    chave = models.CharField(max_length=255)
+    hash = models.CharField(max_length=16)
+
+    class Meta:
+        unique_together = ('modelo', 'chave')
+
+    def __str__(self):
+        return f"{self.modelo} {self.chave}: {self.hash}"
+
+'''
+==========================================================
+            Resumo Diário de Vendas (Homepage)
+==========================================================
+'''
+
+class VendasDiarias(models.Model):
+    """
+    Itens de venda agregados por dia, canal, situação, loja, vendedor e rota.
+    Mantido pelos comandos de importação e por `refresh_sales_rollup`.
+    """
+    data = models.DateField()
+    canal_venda = models.CharField(max_length=255, null=True)
+    situacao = models.CharField(max_length=255, null=True)
+    loja = models.CharField(max_length=255, null=True)
+    vendedor = models.ForeignKey('Vendedores', on_delete=models.SET_NULL, related_name='+', null=True)
+    rota = models.ForeignKey('Rotas', on_delete=models.SET_NULL, related_name='+', null=True)
+
+    valor_total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    valor_com_desconto = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    quantidade_itens = models.FloatField(default=0)
+    numero_itens = models.IntegerField(default=0)
+    numero_vendas = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['data'], name='vendas_diarias_data_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.data} {self.canal_venda} {self.situacao}: {self.valor_total}"
+
+'''
+==========================================================
+        Resumo de Compras por Cliente (Recência/Frequência/Valor)
+==========================================================
+'''
+
+class EstatisticasClientes(models.Model):
+    """
+    Compras não canceladas de cada cliente por canal de venda.
+    Mantido pelos comandos de importação e por `refresh_client_stats`.
+    """
+    cliente = models.ForeignKey('Clientes', on_delete=models.CASCADE, related_name='estatisticas')
+    canal_venda = models.CharField(max_length=255, null=True)
+    primeira_compra = models.DateField()
+    ultima_compra = models.DateField()
+    numero_compras = models.IntegerField(default=0)
+    total_gasto = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        unique_together = ('cliente', 'canal_venda')
+        indexes = [
+            models.Index(fields=['canal_venda', 'ultima_compra'], name='estat_cli_canal_ultima_idx'),
+            models.Index(fields=['canal_venda', '-total_gasto'], name='estat_cli_canal_total_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.cliente_id} {self.canal_venda}: {self.numero_compras} compras, {self.total_gasto}"
+
 '''
 ==========================================================
                     User Auth Models
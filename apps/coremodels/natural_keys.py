@@ -0,0 +1,96 @@
+from django.db import connections, models
+from django.db.models.functions import Lower
+
+'''
+==========================================================
+        Busca de registros existentes por chave natural
+==========================================================
+'''
+
+LOOKUP_BATCH_SIZE = 5000
+
+
+def is_text_field(field):
+    return isinstance(field, models.CharField)
+
+
+def normalize_keys(model, fields, keys_df):
+    """
+    Return the distinct, non-null key tuples of `keys_df[fields]`, with text
+    fields stripped and lowercased (the form matched against `lower(column)`).
+    """
+    keys_df = keys_df[fields].dropna().copy()
+    for name in fields:
+        if is_text_field(model._meta.get_field(name)):
+            keys_df[name] = keys_df[name].astype(str).str.strip().str.lower()
+    keys_df = keys_df.drop_duplicates()
+    return list(keys_df.itertuples(index=False, name=None))
+
+
+def fetch_by_natural_keys(model, fields, keys, using='default'):
+    """
+    Return the `model` rows whose `fields` match one of the normalized `keys`.
+
+    On PostgreSQL the keys are sent as one array parameter per field and joined
+    with unnest(), so the statement has a fixed size no matter how many keys
+    there are (text fields are compared through `lower()`, backed by the
+    functional indexes on Vendas and Produtos). Other backends use batched
+    `IN` queries.
+    """
+    if not keys:
+        return []
+    if connections[using].vendor == 'postgresql':
+        return _fetch_with_unnest(model, fields, keys, using)
+    return _fetch_in_batches(model, fields, keys, using)
+
+
+def _fetch_with_unnest(model, fields, keys, using):
+    connection = connections[using]
+    quote = connection.ops.quote_name
+
+    arrays = []
+    casts = []
+    conditions = []
+    for position, name in enumerate(fields):
+        field = model._meta.get_field(name)
+        alias = f"k{position}"
+        arrays.append([key[position] for key in keys])
+        if is_text_field(field):
+            casts.append('%s::text[]')
+            conditions.append(f"lower(t.{quote(field.column)}) = k.{alias}")
+        else:
+            casts.append(f"%s::{field.db_type(connection)}[]")
+            conditions.append(f"t.{quote(field.column)} = k.{alias}")
+
+    aliases = ', '.join(f"k{position}" for position in range(len(fields)))
+    sql = (
+        f"SELECT t.* FROM {quote(model._meta.db_table)} t "
+        f"JOIN unnest({', '.join(casts)}) AS k({aliases}) ON {' AND '.join(conditions)}"
+    )
+    return list(model.objects.using(using).raw(sql, arrays))
+
+
+def _fetch_in_batches(model, fields, keys, using):
+    first = model._meta.get_field(fields[0])
+    wanted = set(keys)
+
+    queryset = model.objects.using(using)
+    if is_text_field(first):
+        queryset = queryset.annotate(_lookup_key=Lower(fields[0]))
+        lookup = '_lookup_key__in'
+    else:
+        lookup = f"{fields[0]}__in"
+
+    first_values = sorted({key[0] for key in keys}, key=str)
+    found = []
+    for start in range(0, len(first_values), LOOKUP_BATCH_SIZE):
+        batch = first_values[start:start + LOOKUP_BATCH_SIZE]
+        for obj in queryset.filter(**{lookup: batch}):
+            key = tuple(
+                str(getattr(obj, name)).strip().lower()
+                if is_text_field(model._meta.get_field(name)) else getattr(obj, name)
+                for name in fields
+            )
+            if key in wanted:
+                found.append(obj)
+    return found
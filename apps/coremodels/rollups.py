@@ -0,0 +1,175 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Max, Min, Sum, Value
+from django.db.models.functions import Coalesce
+
+from apps.coremodels.models import EstatisticasClientes, ItemVenda, Vendas, VendasDiarias
+
+'''
+==========================================================
+            Resumo diário de vendas (VendasDiarias)
+==========================================================
+'''
+
+LOOKUP_BATCH_SIZE = 5000
+
+# Mesma regra do total com desconto da homepage
+DISCOUNTED_VALUE = ExpressionWrapper(
+    F('valor_total') * (1 - F('valor_desconto') / 100),
+    output_field=DecimalField(max_digits=14, decimal_places=2)
+)
+
+
+def daily_sales_values(items, *group_by):
+    """
+    Group the ItemVenda queryset `items` by `group_by` and sum the sales
+    metrics of each group (total, total_com_desconto, quantidade, itens, vendas).
+
+    `vendas` is the number of distinct sales in the group; a sale whose items
+    fall into different groups (e.g. two vendedores) is counted in each of them.
+    """
+    return items.values(*group_by).annotate(
+        total=Coalesce(Sum('valor_total'), Value(Decimal('0.00')), output_field=DecimalField()),
+        total_com_desconto=Coalesce(Sum(DISCOUNTED_VALUE), Value(Decimal('0.00')), output_field=DecimalField()),
+        quantidade=Sum('quantidade_produto'),
+        itens=Count('pk'),
+        vendas=Count('venda_id', distinct=True),
+    ).order_by()
+
+
+def daily_sales_rows(items, model=VendasDiarias):
+    """
+    Aggregate the ItemVenda queryset `items` into unsaved VendasDiarias rows
+    (`model` is the historical model in data migrations).
+    """
+    grouped = daily_sales_values(
+        items,
+        'venda__data_compra', 'venda__canal_venda', 'venda__situacao', 'venda__loja',
+        'vendedor_id', 'cliente__rota_id'
+    )
+
+    return [
+        model(
+            data=row['venda__data_compra'],
+            canal_venda=row['venda__canal_venda'],
+            situacao=row['venda__situacao'],
+            loja=row['venda__loja'],
+            vendedor_id=row['vendedor_id'],
+            rota_id=row['cliente__rota_id'],
+            valor_total=row['total'],
+            valor_com_desconto=row['total_com_desconto'],
+            quantidade_itens=row['quantidade'] or 0,
+            numero_itens=row['itens'],
+            numero_vendas=row['vendas'],
+        )
+        for row in grouped
+    ]
+
+
+def refresh_daily_sales(dates=None):
+    """
+    Rebuild the VendasDiarias rows of the given dates (every date when
+    `dates` is None) from ItemVenda. Returns the number of rows written.
+    """
+    items = ItemVenda.objects.all()
+    existing = VendasDiarias.objects.all()
+    if dates is not None:
+        dates = sorted(set(dates))
+        if not dates:
+            return 0
+        items = items.filter(venda__data_compra__in=dates)
+        existing = existing.filter(data__in=dates)
+
+    with transaction.atomic():
+        existing.delete()
+        rows = daily_sales_rows(items)
+        VendasDiarias.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def dates_of_vendas(venda_ids):
+    """Return the distinct `data_compra` of the given Vendas ids."""
+    venda_ids = list(venda_ids)
+    dates = set()
+    for start in range(0, len(venda_ids), LOOKUP_BATCH_SIZE):
+        batch = venda_ids[start:start + LOOKUP_BATCH_SIZE]
+        dates.update(Vendas.objects.filter(id__in=batch).values_list('data_compra', flat=True).distinct())
+    return dates
+
+
+def dates_of_clientes(cliente_ids):
+    """Return the distinct sale dates of the items bought by the given Clientes ids (e.g. after a route change)."""
+    cliente_ids = list(cliente_ids)
+    dates = set()
+    for start in range(0, len(cliente_ids), LOOKUP_BATCH_SIZE):
+        batch = cliente_ids[start:start + LOOKUP_BATCH_SIZE]
+        dates.update(
+            ItemVenda.objects.filter(cliente_id__in=batch).values_list('venda__data_compra', flat=True).distinct()
+        )
+    return dates
+
+
+'''
+==========================================================
+        Resumo de compras por cliente (EstatisticasClientes)
+==========================================================
+'''
+
+def client_stats_rows(items, model=EstatisticasClientes):
+    """
+    Aggregate the ItemVenda queryset `items` into unsaved EstatisticasClientes rows, one per client
+    and channel (`model` is the historical model in data migrations).
+    """
+    grouped = items.exclude(venda__situacao="Cancelado").values('cliente_id', 'venda__canal_venda').annotate(
+        primeira=Min('venda__data_compra'),
+        ultima=Max('venda__data_compra'),
+        compras=Count('venda', distinct=True),
+        total=Coalesce(Sum('valor_total'), Value(Decimal('0.00')), output_field=DecimalField()),
+    ).order_by()
+
+    return [
+        model(
+            cliente_id=row['cliente_id'],
+            canal_venda=row['venda__canal_venda'],
+            primeira_compra=row['primeira'],
+            ultima_compra=row['ultima'],
+            numero_compras=row['compras'],
+            total_gasto=row['total'],
+        )
+        for row in grouped
+    ]
+
+
+def refresh_client_stats(cliente_ids=None):
+    """
+    Rebuild the EstatisticasClientes rows of the given Clientes ids (every
+    client when `cliente_ids` is None) from ItemVenda. Returns the number of rows written.
+    """
+    if cliente_ids is None:
+        with transaction.atomic():
+            EstatisticasClientes.objects.all().delete()
+            rows = client_stats_rows(ItemVenda.objects.all())
+            EstatisticasClientes.objects.bulk_create(rows, batch_size=1000)
+        return len(rows)
+
+    cliente_ids = sorted(set(cliente_ids))
+    written = 0
+    with transaction.atomic():
+        for start in range(0, len(cliente_ids), LOOKUP_BATCH_SIZE):
+            batch = cliente_ids[start:start + LOOKUP_BATCH_SIZE]
+            EstatisticasClientes.objects.filter(cliente_id__in=batch).delete()
+            rows = client_stats_rows(ItemVenda.objects.filter(cliente_id__in=batch))
+            EstatisticasClientes.objects.bulk_create(rows, batch_size=1000)
+            written += len(rows)
+    return written
+
+
+def clientes_of_vendas(venda_ids):
+    """Return the Clientes ids with items in the given Vendas ids."""
+    venda_ids = list(venda_ids)
+    clientes = set()
+    for start in range(0, len(venda_ids), LOOKUP_BATCH_SIZE):
+        batch = venda_ids[start:start + LOOKUP_BATCH_SIZE]
+        clientes.update(ItemVenda.objects.filter(venda_id__in=batch).values_list('cliente_id', flat=True).distinct())
+    return clientes
@@ -0,0 +1,187 @@
+import logging
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+'''
+==========================================================
+        Arquivos intermediários (CSV, Parquet, Feather)
+==========================================================
+'''
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    'csv': '.csv',
+    'parquet': '.parquet',
+    'feather': '.feather',
+}
+
+
+def staging_path(folder, name, fmt='csv'):
+    """Return `folder/name` with the extension of `fmt` (e.g. datasets/csv/Produtos.parquet)."""
+    return Path(folder) / f"{name}{FORMATS[fmt]}"
+
+
+def is_columnar(path):
+    """Return True for Parquet/Feather files, which are read through pyarrow instead of read_csv."""
+    return Path(path).suffix.lower() in (FORMATS['parquet'], FORMATS['feather'])
+
+
+ARROW_TYPES = {
+    'float': pa.float64(),
+    'int': pa.int64(),
+    'date': pa.date32(),
+}
+
+EMPTY_VALUES = ('', '-')
+
+
+def typed_schema(columns, parsers):
+    """
+    Schema for `columns` where the ones in `parsers` ({normalized name: (kind, parser)})
+    have the Arrow type of their kind (see ARROW_TYPES) and the rest are strings.
+    """
+    return pa.schema([
+        (column, ARROW_TYPES[parsers[column.strip().lower()][0]] if column.strip().lower() in parsers else pa.string())
+        for column in columns
+    ])
+
+
+def parse_columns(df, parsers):
+    """
+    Return a copy of `df` (read with dtype=str) with the columns in `parsers`
+    converted once by their parser, so the importers read numbers and dates
+    instead of parsing the text again. Empty cells and values the parser
+    rejects become null.
+    """
+    df = df.copy()
+    for column in df.columns:
+        kind, parse = parsers.get(column.strip().lower(), (None, None))
+        if parse is None:
+            continue
+        raw = df[column]
+        filled = raw.notna() & ~raw.isin(EMPTY_VALUES)
+        values = pd.Series(None, index=df.index, dtype=object)
+        if filled.any():
+            parsed = parse(raw[filled])
+            values[filled] = parsed.astype(float) if kind == 'float' else parsed.astype(object)
+        values = values.where(values.notna(), None)
+        invalid = int(filled.sum()) - int(values.notna().sum())
+        if invalid:
+            logger.warning(f"{invalid} valores inválidos na coluna '{column}' foram gravados como nulos")
+        df[column] = values
+    return df
+
+
+def to_table(df, schema=None):
+    """
+    Convert `df` to a pyarrow Table with explicit column types.
+
+    Numeric, boolean and datetime columns keep their dtype; object columns are
+    stored as strings, so a column mixing numbers and text is not rejected.
+    When a schema is given, its string columns are stored as text and the
+    others are converted to their Arrow type.
+    """
+    df = df.copy()
+    for column in df.columns:
+        as_text = df[column].dtype == object if schema is None else schema.field(column).type == pa.string()
+        if as_text:
+            values = df[column].astype(object)
+            df[column] = values.where(values.isna(), values.astype(str)).where(values.notna(), None)
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+
+def write_frame(df, path, schema=None):
+    """Write `df` as Parquet or Feather, depending on the extension of `path`."""
+    table = to_table(df, schema)
+    if Path(path).suffix.lower() == FORMATS['feather']:
+        feather.write_feather(table, path)
+    else:
+        pq.write_table(table, path)
+
+
+def open_writer(path, schema):
+    """
+    Return a writer that appends Tables of `schema` to `path` (Parquet row
+    groups or Feather record batches). Use it as a context manager.
+    """
+    if Path(path).suffix.lower() == FORMATS['feather']:
+        return pa.ipc.new_file(str(path), schema)
+    return pq.ParquetWriter(str(path), schema)
+
+
+def file_columns(path):
+    """Return the column names stored in a Parquet/Feather file without reading the data."""
+    if Path(path).suffix.lower() == FORMATS['feather']:
+        with pa.memory_map(str(path)) as source:
+            return pa.ipc.open_file(source).schema.names
+    return pq.read_schema(path).names
+
+
+def project(path, columns):
+    """
+    Return the stored column names whose normalized form (stripped, lowercase)
+    is in `columns`. With `columns=None` every column is read.
+    """
+    if columns is None:
+        return None
+    wanted = {column.strip().lower() for column in columns}
+    return [name for name in file_columns(path) if name.strip().lower() in wanted]
+
+
+def _normalized(table):
+    # Dates come back as datetime64 (not datetime.date objects), which the cleaners read without parsing
+    df = table.to_pandas(date_as_object=False)
+    df.columns = [col.strip().lower() for col in df.columns]
+    return df
+
+
+def read_table(path, columns=None):
+    """Read a Parquet/Feather file into a pyarrow Table, with the stored column names and types."""
+    if Path(path).suffix.lower() == FORMATS['feather']:
+        return feather.read_table(path, columns=columns)
+    return pq.read_table(path, columns=columns)
+
+
+def read_frame(path, columns=None):
+    """
+    Read a Parquet/Feather file into a DataFrame with normalized column names,
+    loading only the `columns` given (compared after strip/lower).
+    """
+    return _normalized(read_table(path, columns=project(path, columns)))
+
+
+def read_rows(path):
+    """
+    Read a Parquet/Feather file as (schema, list of row dicts) with the stored
+    column names. Typed values keep their type, with None when null (integers
+    do not become floats); null text is '' like in a CSV read.
+    """
+    table = read_table(path)
+    df = table.to_pandas(types_mapper={pa.int64(): pd.Int64Dtype()}.get)
+    for field in table.schema:
+        if field.type == pa.string():
+            df[field.name] = df[field.name].fillna('')
+    df = df.astype(object).where(df.notna(), None)
+    return table.schema, df.to_dict(orient='records')
+
+
+def select_schema(schema, columns):
+    """The fields of `schema` named in `columns`, in the order of `columns`."""
+    return pa.schema([schema.field(column) for column in columns])
+
+
+def iter_frames(path, chunksize, columns=None):
+    """Yield the file in DataFrames of at most `chunksize` rows, like read_csv(chunksize=...)."""
+    selected = project(path, columns)
+    if Path(path).suffix.lower() == FORMATS['feather']:
+        # Feather files are memory mapped, slicing them does not copy the data
+        batches = feather.read_table(path, columns=selected, memory_map=True).to_batches(max_chunksize=chunksize)
+    else:
+        batches = pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=selected)
+    for batch in batches:
+        yield _normalized(pa.Table.from_batches([batch]))
@@ -0,0 +1,110 @@
+import json
+
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+'''
+==========================================================
+            Respostas JSON / NDJSON em streaming
+==========================================================
+'''
+
+# Rows read from the database per round trip (queryset.iterator) and
+# rows encoded per chunk sent to the client
+STREAM_CHUNK_SIZE = 2000
+ROWS_PER_WRITE = 500
+
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
+
+def stream_mode(request):
+    """
+    Return 'json' or 'ndjson' when the request asks for a streamed response
+    (?stream=json, ?stream=ndjson / ?format=ndjson or an
+    `Accept: application/x-ndjson` header), None for the regular DRF response.
+    """
+    mode = (request.GET.get('stream') or '').lower()
+    if mode in ('ndjson', 'jsonl'):
+        return 'ndjson'
+    if mode in ('1', 'true', 'json'):
+        return 'json'
+    if request.GET.get('format') == 'ndjson' or NDJSON_CONTENT_TYPE in request.META.get('HTTP_ACCEPT', ''):
+        return 'ndjson'
+    return None
+
+
+def encode(value):
+    # Same encoder DRF uses (Decimal, date, UUID...)
+    return json.dumps(value, cls=JSONEncoder, ensure_ascii=False)
+
+
+def iter_json_array(rows, key=None, extra=None):
+    """
+    Encode `rows` as a JSON array, ROWS_PER_WRITE rows per chunk. With `key`
+    the array is wrapped in an object: {"<key>": [...], **extra}.
+    """
+    yield f'{{{encode(key)}:[' if key is not None else '['
+    buffer = []
+    first = True
+    for row in rows:
+        buffer.append(encode(row))
+        if len(buffer) >= ROWS_PER_WRITE:
+            yield ('' if first else ',') + ','.join(buffer)
+            first = False
+            buffer = []
+    if buffer:
+        yield ('' if first else ',') + ','.join(buffer)
+
+    if key is None:
+        yield ']'
+    else:
+        tail = ''.join(f',{encode(name)}:{encode(value)}' for name, value in (extra or {}).items())
+        yield f']{tail}}}'
+
+
+def iter_ndjson(rows):
+    """Encode `rows` as newline-delimited JSON, ROWS_PER_WRITE rows per chunk."""
+    buffer = []
+    for row in rows:
+        buffer.append(encode(row))
+        if len(buffer) >= ROWS_PER_WRITE:
+            yield '\n'.join(buffer) + '\n'
+            buffer = []
+    if buffer:
+        yield '\n'.join(buffer) + '\n'
+
+
+def streaming_response(rows, mode, key=None, extra=None, status=200):
+    """
+    StreamingHttpResponse over the iterable `rows` (ideally fed by
+    `queryset.iterator(chunk_size=STREAM_CHUNK_SIZE)`), so the rows are
+    encoded and sent as they are read instead of being held in memory.
+
+    In NDJSON mode there is one row per line; the `extra` values (e.g. a
+    pagination cursor) are sent as `X-<Name>` headers instead.
+    """
+    if mode == 'ndjson':
+        response = StreamingHttpResponse(iter_ndjson(rows), content_type=NDJSON_CONTENT_TYPE, status=status)
+        for name, value in (extra or {}).items():
+            if value is not None:
+                response['X-' + name.replace('_', '-').title()] = str(value)
+        return response
+    return StreamingHttpResponse(iter_json_array(rows, key, extra), content_type='application/json', status=status)
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Lets DRF accept `Accept: application/x-ndjson` (content negotiation runs
+    before the view). Views that stream return their own response; a regular
+    list Response is rendered one item per line.
+    """
+    media_type = NDJSON_CONTENT_TYPE
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        rows = data if isinstance(data, list) else [data]
+        return ''.join(iter_ndjson(rows)).encode(self.charset)
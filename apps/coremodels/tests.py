@@ -1,3 +1,491 @@
+import json
+import os
+import tempfile
+from contextlib import redirect_stdout
+from datetime import date
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
+
+import numpy as np
+import pandas as pd
+from django.apps import apps as django_apps
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
 
-# Create your tests here.
+from apps.coremodels import bulk_copy, cep_index, localidades, natural_keys, rollups, staging
+from apps.coremodels.cleaning import ColumnCleaner
+from apps.coremodels.management.commands import send_data_to_db, send_simple_data_to_db
+from apps.coremodels.models import (
+    CidadesRotas, Clientes, ItemVenda, Produtos, Rotas, Vendas, VendasDiarias, Vendedores,
+)
+
+
+def build_cep_index(index_dir, faixas):
+    """Write a compiled CEP index from [(inicio, fim, localidade, estado)] rows, sorted like compile_index."""
+    faixas = sorted(faixas)
+    localidades = list(dict.fromkeys((localidade, estado) for _, _, localidade, estado in faixas))
+    ranges = np.empty(len(faixas), dtype=cep_index.RANGE_DTYPE)
+    ranges['inicio'] = [inicio for inicio, _, _, _ in faixas]
+    ranges['fim'] = [fim for _, fim, _, _ in faixas]
+    ranges['localidade'] = [localidades.index((localidade, estado)) for _, _, localidade, estado in faixas]
+    np.save(Path(index_dir) / cep_index.RANGES_FILE, ranges)
+    (Path(index_dir) / cep_index.LOCALIDADES_FILE).write_text(
+        json.dumps([list(localidade) for localidade in localidades]), encoding='utf-8'
+    )
+    return cep_index.CepIndex(index_dir)
+
+
+FAIXAS = [
+    (13000000, 13139999, 'Campinas', 'SP'),
+    (13140000, 13149999, 'Paulínia', 'SP'),
+    (13300000, 13314999, 'Itu', 'SP'),
+]
+
+
+class CepIndexTestCase(TestCase):
+    """Runs with a small compiled CEP index instead of the one built from the spreadsheet."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.index = build_cep_index(self.tmp.name, FAIXAS)
+        patcher = mock.patch.object(cep_index, '_index', self.index)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class ClientesImportRouteTests(CepIndexTestCase):
+    def setUp(self):
+        super().setUp()
+        self.rota_campinas = Rotas.objects.create(nome_rota='Campinas', dia_semana=1, Numero_rota=1)
+        self.rota_manual = Rotas.objects.create(nome_rota='Manual', dia_semana=2, Numero_rota=2)
+        CidadesRotas.objects.create(rota=self.rota_campinas, cidade='Campinas')
+
+    def import_clientes(self, rows):
+        path = Path(self.tmp.name) / 'Clientes.csv'
+        columns = ['ID', 'Nome', 'Fantasia', 'Endereço', 'Número', 'Complemento', 'Bairro', 'CEP', 'Cidade',
+                   'Estado', 'CNPJ / CPF', 'Celular', 'Fone', 'Tipo pessoa', 'Contribuinte',
+                   'Código de regime tributário', 'Limite de crédito']
+        defaults = {'Contribuinte': 'Não'}
+        pd.DataFrame([{column: row.get(column, defaults.get(column, '')) for column in columns} for row in rows]).to_csv(
+            path, index=False
+        )
+        call_command('send_simple_data_to_db', str(path), stdout=StringIO())
+
+    def test_manual_route_survives_a_reimport(self):
+        # Registered before the locality columns existed (localidade_chave is NULL) and routed by hand
+        Clientes.objects.create(
+            id=1, nome='Mercado', tipo_pessoa='J', cpf_cnpj='111', cep='13010-000', endereco='Rua 1',
+            cidade='Campinas', rota=self.rota_manual,
+        )
+        self.import_clientes([
+            {'ID': 1, 'Nome': 'Mercado', 'CEP': '13010-000', 'Cidade': 'Campinas', 'CNPJ / CPF': '111',
+             'Endereço': 'Rua 1', 'Tipo pessoa': 'J', 'Fone': 'novo'},
+            {'ID': 2, 'Nome': 'Padaria', 'CEP': '13020-000', 'Cidade': 'Campinas', 'CNPJ / CPF': '222',
+             'Endereço': 'Rua 2', 'Tipo pessoa': 'J'},
+        ])
+
+        existente = Clientes.objects.get(id=1)
+        self.assertEqual(existente.fone, 'novo')
+        self.assertEqual(existente.localidade_chave, 'campinas')
+        self.assertEqual(existente.rota_id, self.rota_manual.id)
+        # New clients get the route of their city
+        self.assertEqual(Clientes.objects.get(id=2).rota_id, self.rota_campinas.id)
+
+
+class DailySalesValuesTests(TestCase):
+    def setUp(self):
+        produtos = [Produtos.objects.create(sku=f'SKU{index}', descricao=f'Produto {index}') for index in range(3)]
+        cliente = Clientes.objects.create(nome='Cliente', tipo_pessoa='F', cpf_cnpj='1', cep='00000-000', endereco='Rua 1')
+        vendedores = [Vendedores.objects.create(id=index, nome=f'Vendedor {index}') for index in (1, 2)]
+        venda = Vendas.objects.create(numero=1, canal_venda='Pdv', situacao='Atendido', data_compra=date(2024, 1, 1))
+        # Two items of vendedor 1 and one of vendedor 2 in the same sale
+        for produto, vendedor in zip(produtos, [vendedores[0], vendedores[0], vendedores[1]]):
+            ItemVenda.objects.create(
+                venda=venda, cliente=cliente, produto=produto, vendedor=vendedor, quantidade_produto=1,
+                valor_total=Decimal('10.00'), preco_final=Decimal('30.00'),
+            )
+
+    def test_sales_are_counted_once_per_group(self):
+        grouped = rollups.daily_sales_values(ItemVenda.objects.all(), 'vendedor_id')
+        self.assertEqual(
+            sorted((row['vendedor_id'], row['itens'], row['vendas'], row['total']) for row in grouped),
+            [(1, 2, 1, Decimal('20.00')), (2, 1, 1, Decimal('10.00'))],
+        )
+
+    def test_migration_rolls_up_the_whole_history(self):
+        migration = import_module('apps.coremodels.migrations.0036_backfill_vendas_diarias')
+        VendasDiarias.objects.create(data=date(2023, 1, 1), valor_total=Decimal('99.00'))
+
+        migration.backfill_vendas_diarias(django_apps, None)
+        self.assertEqual(
+            sorted(VendasDiarias.objects.values_list('data', 'vendedor_id', 'numero_itens', 'valor_total')),
+            [(date(2024, 1, 1), 1, 2, Decimal('20.00')), (date(2024, 1, 1), 2, 1, Decimal('10.00'))],
+        )
+
+
+class ItemVendaImportTestCase(TestCase):
+    """Imports ItemVenda files against two sales, two products, one client and one vendedor."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.cliente = Clientes.objects.create(
+            id=10, nome='Cliente', tipo_pessoa='F', cpf_cnpj='10', cep='00000-000', endereco='Rua 1'
+        )
+        Vendedores.objects.create(id=1, nome='Ana')
+        for sku in ('SKU1', 'SKU2'):
+            Produtos.objects.create(sku=sku, descricao=sku)
+        for numero in (1, 2):
+            Vendas.objects.create(numero=numero, canal_venda='Pdv', situacao='Atendido', loja='servi',
+                                  data_compra=date(2024, 1, numero))
+
+    def item_row(self, pedido, sku, quantidade='1', valor='10,00', **columns):
+        row = {column: '' for column in send_data_to_db.Command.COLUMN_MAPPINGS}
+        row.update({
+            'número do pedido': pedido, 'código (sku)': sku, 'id contato': '10', 'quantidade': quantidade,
+            'valor unitário': valor, 'loja': 'SERVI', 'vendedor': 'ana',
+        })
+        row.update(columns)
+        return row
+
+    def import_items(self, rows, name='itemVenda.csv', **options):
+        path = Path(self.tmp.name) / name
+        pd.DataFrame(rows).to_csv(path, index=False)
+        out = StringIO()
+        # The loader prints its progress
+        with redirect_stdout(StringIO()):
+            call_command('send_data_to_db', str(path), stdout=out, **options)
+        return out.getvalue()
+
+    def stored_items(self):
+        return list(ItemVenda.objects.order_by('venda__numero', 'produto_id').values_list(
+            'venda__numero', 'produto_id', 'quantidade_produto', 'valor_total', 'preco_final', 'vendedor_id'
+        ))
+
+
+class CopyEngineTests(ItemVendaImportTestCase):
+    def test_copy_engine_falls_back_to_the_orm_off_postgresql(self):
+        if connection.vendor == 'postgresql':
+            self.skipTest('COPY is available')
+        output = self.import_items([self.item_row('1', 'SKU1', '2'), self.item_row('1', 'sku2')], engine='copy')
+
+        self.assertIn("Falling back to 'orm'", output)
+        self.assertEqual(self.stored_items(), [
+            (1, 'SKU1', 2.0, Decimal('20.00'), Decimal('30.00'), 1),
+            (1, 'SKU2', 1.0, Decimal('10.00'), Decimal('30.00'), 1),
+        ])
+
+    @skipUnless(connection.vendor == 'postgresql', 'COPY needs PostgreSQL')
+    def test_copy_engine_inserts_and_updates_in_one_merge(self):
+        self.import_items([self.item_row('1', 'SKU1', '2'), self.item_row('2', 'SKU2')], engine='copy')
+        first_pk = ItemVenda.objects.get(venda__numero=1).pk
+
+        self.import_items([self.item_row('1', 'SKU1', '3'), self.item_row('2', 'SKU2')], engine='copy')
+        self.assertEqual(ItemVenda.objects.get(venda__numero=1).pk, first_pk)
+        self.assertEqual(self.stored_items(), [
+            (1, 'SKU1', 3.0, Decimal('30.00'), Decimal('30.00'), 1),
+            (2, 'SKU2', 1.0, Decimal('10.00'), Decimal('10.00'), 1),
+        ])
+
+    def test_copy_payload_keeps_integer_keys_with_null_foreign_keys(self):
+        records = send_data_to_db.Command().frame_to_records(pd.DataFrame({
+            'venda_id': [1, 2], 'cliente_id': [10, 10], 'vendedor_id': pd.array([1, None], dtype='Int64'),
+            'produto_id': ['SKU1', 'SKU2'], 'quantidade_produto': [1.0, 3.5],
+        }))
+        frame = bulk_copy.records_to_frame(ItemVenda, records)
+        fields = bulk_copy.model_columns(ItemVenda, frame)
+
+        # Without the Int64 cast the missing vendedor turns the column into floats ('1.0')
+        self.assertEqual(bulk_copy.copy_payload(frame, fields).splitlines(), [
+            '1,10,1,SKU1,1.0',
+            '2,10,\\N,SKU2,3.5',
+        ])
+
+
+class ColumnCleanerTests(TestCase):
+    def test_columns_are_converted_by_field_type(self):
+        frame = pd.DataFrame({
+            'número': ['12', ' 13 ', '1.5', '-'],
+            'data da venda': ['2024-01-31', '31/01/2024', '01/31/2024', 'ontem'],
+            'e-commerce': [' Shopee ', '', None, 'Pdv'],
+        })
+        mapping = {'Número': 'numero', 'Data da venda': 'data_compra', 'E-commerce': 'canal_venda'}
+        with self.assertLogs('apps.coremodels.cleaning', 'ERROR'):
+            cleaned = ColumnCleaner(Vendas, mapping).clean(frame)
+
+        self.assertEqual(cleaned.to_dict(orient='list'), {
+            'numero': [12, 13, None, None],
+            'data_compra': [date(2024, 1, 31)] * 3 + [None],
+            'canal_venda': ['Shopee', None, None, 'Pdv'],
+        })
+
+    def test_decimals_keep_the_precision_of_the_file(self):
+        frame = pd.DataFrame({'preço': ['R$ 1,50', '2.25', '', 'abc']})
+        with self.assertLogs('apps.coremodels.cleaning', 'ERROR'):
+            cleaned = ColumnCleaner(Produtos, {'preço': 'preco'}).clean(frame)
+        self.assertEqual(cleaned['preco'].tolist(), [Decimal('1.50'), Decimal('2.25'), None, None])
+
+
+class NaturalKeyLookupTests(TestCase):
+    def test_keys_match_case_insensitively_and_in_batches(self):
+        for numero, loja in [(1, 'Servi'), (1, 'IMP'), (2, 'servi')]:
+            Vendas.objects.create(numero=numero, loja=loja, canal_venda='Pdv', situacao='Atendido', data_compra=date(2024, 1, 1))
+        keys_df = pd.DataFrame({'numero': [1, 1, 3, None, 1], 'loja': [' SERVI ', 'imp', 'servi', 'servi', 'servi']})
+        keys = natural_keys.normalize_keys(Vendas, ['numero', 'loja'], keys_df)
+        self.assertEqual(sorted(keys), [(1.0, 'imp'), (1.0, 'servi'), (3.0, 'servi')])
+
+        with mock.patch.object(natural_keys, 'LOOKUP_BATCH_SIZE', 1):
+            found = natural_keys.fetch_by_natural_keys(Vendas, ['numero', 'loja'], keys)
+        self.assertEqual(sorted((venda.numero, venda.loja) for venda in found), [(1, 'IMP'), (1, 'Servi')])
+
+
+class IncrementalImportTests(ItemVendaImportTestCase):
+    def import_produtos(self, rows):
+        path = Path(self.tmp.name) / 'Produtos.csv'
+        columns = ['Código (SKU)', 'Descrição', 'Unidade', 'Preço', 'Preço promocional', 'Estoque disponível', 'Custo']
+        pd.DataFrame([{column: row.get(column, '0') for column in columns} for row in rows]).to_csv(path, index=False)
+        out = StringIO()
+        with redirect_stdout(StringIO()):
+            call_command('send_simple_data_to_db', str(path), stdout=out)
+        return out.getvalue()
+
+    def test_unchanged_rows_are_skipped(self):
+        rows = [{'Código (SKU)': 'P1', 'Descrição': 'Um', 'Preço': '1,00'}, {'Código (SKU)': 'P2', 'Descrição': 'Dois'}]
+        self.assertIn('created: 2, changed: 0, unchanged: 0', self.import_produtos(rows))
+
+        # Not written again: a change made in the database meanwhile is kept
+        Produtos.objects.filter(sku='P2').update(descricao='Editado')
+        rows[0]['Preço'] = '1,50'
+        self.assertIn('created: 0, changed: 1, unchanged: 1', self.import_produtos(rows))
+        self.assertEqual(Produtos.objects.get(sku='P1').preco, Decimal('1.50'))
+        self.assertEqual(Produtos.objects.get(sku='P2').descricao, 'Editado')
+
+    def test_unchanged_items_are_skipped(self):
+        rows = [self.item_row('1', 'SKU1'), self.item_row('2', 'SKU2')]
+        self.assertIn('created: 2, changed: 0, unchanged: 0', self.import_items(rows))
+        rows[1]['quantidade'] = '4'
+        self.assertIn('created: 0, changed: 1, unchanged: 1', self.import_items(rows))
+        self.assertEqual(ItemVenda.objects.get(venda__numero=2).quantidade_produto, 4.0)
+
+
+class ChunkedImportTests(ItemVendaImportTestCase):
+    def test_chunked_import_matches_the_whole_file(self):
+        rows = [self.item_row('1', 'SKU1', '3', '0,10'), self.item_row('2', 'SKU1', '1', '5,00'),
+                self.item_row('1', 'SKU2', '2', '0,35')]
+        self.import_items(rows)
+        whole = self.stored_items()
+        ItemVenda.objects.all().delete()
+
+        self.import_items(rows, chunksize=1)
+        self.assertEqual(self.stored_items(), whole)
+        # preco_final adds up the items of the sale even when they are read in different chunks
+        self.assertEqual(ItemVenda.objects.filter(venda__numero=1).first().preco_final, Decimal('1.00'))
+
+
+class TypedStagingTests(TestCase):
+    FILES = {
+        'Produtos': pd.DataFrame({
+            'Código (SKU)': ['P1', 'P2'], 'Descrição': ['Um', 'Dois'], 'Unidade': ['UN', 'CX'], 'Preço': ['1234,56', '2'],
+            'Preço promocional': ['0,10', '-'], 'Estoque disponível': ['3', '0'], 'Custo': ['1,5', '2'],
+        }),
+        'Vendas': pd.DataFrame({
+            'Número': ['1', '2'], 'Data da venda': ['15/01/2024', '01/02/2024'], 'E-commerce': ['Pdv', 'Shopee'],
+            'Situação da venda': ['Atendido', 'Atendido'], 'Loja': ['servi', 'imp'],
+        }),
+    }
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def stage(self, model_name, suffix):
+        """Write the file the way concate_csv does for `suffix`."""
+        path = Path(self.tmp.name) / f'{model_name}{suffix}'
+        df = self.FILES[model_name]
+        if staging.is_columnar(path):
+            parsers = send_simple_data_to_db.Command.staging_parsers(model_name)
+            staging.write_frame(staging.parse_columns(df, parsers), path, staging.typed_schema(df.columns, parsers))
+        else:
+            df.to_csv(path, index=False)
+        return path
+
+    def import_file(self, path):
+        with redirect_stdout(StringIO()):
+            call_command('send_simple_data_to_db', str(path), stdout=StringIO())
+
+    def test_numbers_and_dates_are_stored_typed(self):
+        produtos = staging.read_frame(self.stage('Produtos', '.parquet'))
+        self.assertEqual(produtos['preço'].dtype, np.float64)
+        self.assertEqual(produtos['preço'].tolist()[0], 1234.56)
+        self.assertTrue(produtos['preço promocional'].isna().tolist()[1])
+        self.assertEqual(produtos['descrição'].dtype, object)
+
+        vendas = staging.read_frame(self.stage('Vendas', '.feather'))
+        self.assertEqual(vendas['data da venda'].dtype.kind, 'M')
+        self.assertEqual(vendas['data da venda'].dt.date.tolist(), [date(2024, 1, 15), date(2024, 2, 1)])
+
+    def test_fix_clientes_keeps_the_types_of_the_file(self):
+        clientes = pd.DataFrame({column: [''] * 3 for column in send_simple_data_to_db.Command.COLUMN_MAPPINGS['Clientes']})
+        clientes.update(pd.DataFrame({
+            'id': ['123', '124', '125'], 'nome': ['ana  silva', 'Ana Silva', 'Bruno'], 'endereço': ['Rua 1'] * 3,
+            'cep': ['13000-000'] * 3, 'cnpj / cpf': ['1', '2', '3'], 'tipo pessoa': ['F'] * 3,
+            'contribuinte': ['Não'] * 3, 'limite de crédito': ['10,50', '', '0'],
+        }))
+        clientes = clientes.rename(columns={'id': 'ID', 'nome': 'Nome'})
+        clientes['loja'] = ['imp', 'servi', 'imp']
+        patcher = mock.patch.object(cep_index, '_index', build_cep_index(self.tmp.name, FAIXAS))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        parsers = send_simple_data_to_db.Command.staging_parsers('Clientes')
+        source = Path(self.tmp.name) / 'entrada' / 'Clientes.parquet'
+        source.parent.mkdir()
+        staging.write_frame(staging.parse_columns(clientes, parsers), source, staging.typed_schema(clientes.columns, parsers))
+
+        output_dir = Path(self.tmp.name) / 'saida'
+        call_command('Fix_clientes', str(source), str(output_dir), stdout=StringIO(), stderr=StringIO())
+        fixed = output_dir / 'Clientes.parquet'
+        self.assertEqual(staging.read_table(fixed).schema, staging.read_table(source).schema)
+
+        self.import_file(fixed)
+        # The servi row wins the duplicated name and keeps its ID
+        self.assertEqual(
+            list(Clientes.objects.order_by('id').values_list('id', 'nome', 'limite_credito')),
+            [(124, 'Ana Silva', None), (125, 'Bruno', Decimal('0.00'))],
+        )
+
+    def test_typed_files_import_like_the_csv(self):
+        for model, fields in [(Produtos, ('sku', 'descricao', 'preco', 'preco_promocional', 'estoque_disponivel', 'custo')),
+                              (Vendas, ('numero', 'loja', 'data_compra', 'canal_venda', 'situacao'))]:
+            imported = {}
+            for suffix in ('.csv', '.parquet', '.feather'):
+                model.objects.all().delete()
+                self.import_file(self.stage(model.__name__, suffix))
+                imported[suffix] = list(model.objects.order_by(fields[0]).values_list(*fields))
+            self.assertEqual(len(imported['.csv']), 2)
+            self.assertEqual(imported['.parquet'], imported['.csv'])
+            self.assertEqual(imported['.feather'], imported['.csv'])
+
+
+class ItemVendaMatchingTests(ItemVendaImportTestCase):
+    def test_existing_items_are_updated_in_place(self):
+        self.import_items([self.item_row('1', 'SKU1'), self.item_row('2', 'SKU2')])
+        pks = dict(ItemVenda.objects.values_list('venda__numero', 'pk'))
+
+        # Keys match case-insensitively; the second (1, SKU1) row and the unknown sale 3 are skipped
+        output = self.import_items([
+            self.item_row('1', 'sku1', '5'), self.item_row('1', 'SKU1', '9'), self.item_row('3', 'SKU1'),
+            self.item_row('2', 'SKU2'),
+        ])
+        self.assertIn('created: 0, changed: 1, unchanged: 1, skipped: 2', output)
+        self.assertEqual(dict(ItemVenda.objects.values_list('venda__numero', 'pk')), pks)
+        self.assertEqual(ItemVenda.objects.get(pk=pks[1]).quantidade_produto, 5.0)
+
+
+class ForeignKeyCacheTests(ItemVendaImportTestCase):
+    def test_only_the_requested_keys_are_loaded(self):
+        Produtos.objects.create(sku='Outro', descricao='Outro')
+        command = send_data_to_db.Command()
+
+        with self.assertNumQueries(1):
+            produtos = command.load_cache('Produtos', pd.Series(['sku1', 'sku2', 'nao existe', None]), 'sku')
+        self.assertEqual(produtos, {'sku1': 'SKU1', 'sku2': 'SKU2'})
+
+        vendas = command.load_cache('Vendas', pd.Series(['2|servi', '2|imp']), 'numero', 'loja')
+        self.assertEqual(vendas, {'2|servi': Vendas.objects.get(numero=2).pk})
+        self.assertEqual(command.load_cache('Clientes', pd.Series([], dtype=object), 'id'), {})
+
+
+class PrecoFinalTests(TestCase):
+    def test_totals_are_added_in_cents(self):
+        command = send_data_to_db.Command()
+        dataframe = pd.DataFrame({
+            'venda': ['1', '1', '1', '2'],
+            'valor_unitario': ['0,1', '0,2', '0,333', '1,004'],
+            'quantidade_produto': ['1', '1', '3', '1'],
+        })
+        command.clean_numeric_columns(dataframe)
+
+        self.assertEqual(dataframe['valor_total'].tolist(), [0.1, 0.2, 1.0, 1.0])
+        # 0.1 + 0.2 + 1.0 is exactly 1.3, not 1.3000000000000003
+        self.assertEqual(command.compute_preco_final(dataframe).tolist(), [1.3, 1.3, 1.3, 1.0])
+
+
+class CepIndexLookupTests(CepIndexTestCase):
+    def test_ceps_are_normalized_from_text_and_numbers(self):
+        numeric = cep_index.normalize_ceps(['13.000-000', 13140001, ' 13300-000 ', '', 'abc', '123456789', None, '1' * 40])
+        self.assertEqual(numeric.tolist(), [13000000, 13140001, 13300000, -1, -1, -1, -1, -1])
+        self.assertEqual(cep_index.normalize_ceps([]).tolist(), [])
+        with self.assertRaises(ValueError):
+            cep_index.normalize_ceps([['13000-000']])
+
+    def test_ranges_are_matched_like_the_bisect_search(self):
+        ids = self.index.lookup_ids([13000000, 13139999, 13140000, 13200000, 12999999, 13314999, 13315000])
+        names = [self.index.localidades[i][0] if i != cep_index.NOT_FOUND else None for i in ids.tolist()]
+        # Exact start, end of a range, next range, gap, before the first range, last CEP, after the last one
+        self.assertEqual(names, ['Campinas', 'Campinas', 'Paulínia', None, None, 'Itu', None])
+
+    def test_invalid_values_are_told_apart_from_unknown_ceps(self):
+        ids = self.index.resolve_ids(['13010-100', '13200-000', 'sem cep', '13010100'])
+        self.assertEqual(ids.tolist(), [0, cep_index.NOT_FOUND, cep_index.INVALID, 0])
+        self.assertEqual(self.index.lookup('13.305-000'), ('Itu', 'SP'))
+        self.assertIsNone(self.index.lookup('1234567890'))
+        self.assertIs(cep_index.get_index(), self.index)
+
+    def test_index_is_stale_only_when_missing_or_older_than_the_spreadsheet(self):
+        source = Path(self.tmp.name) / 'Lista_de_CEPs.xlsx'
+        self.assertTrue(cep_index.is_stale(source, Path(self.tmp.name) / 'vazio'))
+        self.assertFalse(cep_index.is_stale(source, self.tmp.name))
+        source.touch()
+        ranges = Path(self.tmp.name) / cep_index.RANGES_FILE
+        os.utime(ranges, (ranges.stat().st_atime, source.stat().st_mtime - 10))
+        self.assertTrue(cep_index.is_stale(source, self.tmp.name))
+
+
+class ReassignRoutesTests(TestCase):
+    def setUp(self):
+        self.rotas = [Rotas.objects.create(nome_rota=f'Rota {numero}', dia_semana=numero, Numero_rota=numero)
+                      for numero in (1, 2)]
+        for rota, cidade in [(self.rotas[0], 'Itu'), (self.rotas[1], 'ITU'), (self.rotas[1], 'Campinas')]:
+            CidadesRotas.objects.create(rota=rota, cidade=cidade)
+        self.clientes = {
+            chave: Clientes.objects.create(
+                nome=chave, tipo_pessoa='J', cpf_cnpj=chave, cep='00000-000', endereco='Rua 1',
+                localidade_chave=chave, rota=rota,
+            )
+            for chave, rota in [('itu', None), ('campinas', self.rotas[0]), ('sorocaba', self.rotas[0]),
+                                ('paulinia', None)]
+        }
+
+    def rotas_dos_clientes(self):
+        return dict(Clientes.objects.values_list('localidade_chave', 'rota_id'))
+
+    def test_routes_set_by_hand_are_kept(self):
+        changed = localidades.reassign_routes([' Itu ', 'Sorocaba', 'Campinas'])
+
+        # Only the client without a route is assigned; Itu is served by both routes, the lowest id wins
+        self.assertEqual(changed, {self.clientes['itu'].id})
+        self.assertEqual(self.rotas_dos_clientes(), {
+            'itu': self.rotas[0].id, 'campinas': self.rotas[0].id, 'sorocaba': self.rotas[0].id, 'paulinia': None,
+        })
+
+    def test_clients_of_the_changed_route_follow_the_city_map(self):
+        changed = localidades.reassign_routes(['Campinas', 'Sorocaba'], rotas=[self.rotas[0].id])
+
+        self.assertEqual(changed, {self.clientes['campinas'].id, self.clientes['sorocaba'].id})
+        self.assertEqual(self.rotas_dos_clientes(), {
+            'itu': None, 'campinas': self.rotas[1].id, 'sorocaba': None, 'paulinia': None,
+        })
+        self.assertEqual(localidades.reassign_routes(['Campinas', 'Sorocaba'], rotas=[self.rotas[0].id]), set())
+        self.assertEqual(localidades.reassign_routes([]), set())
+
+    def test_overwrite_reassigns_every_city(self):
+        self.assertEqual(localidades.reassign_routes(overwrite=True), {
+            self.clientes['itu'].id, self.clientes['campinas'].id, self.clientes['sorocaba'].id,
+        })
+        self.assertEqual(self.rotas_dos_clientes()['campinas'], self.rotas[1].id)
+        self.assertEqual(localidades.reassign_routes(overwrite=True), set())
@@ -1,27 +1,41 @@
 from rest_framework import serializers
 from apps.coremodels.models import Clientes, ItemVenda, Rotas
-from django.db.models import Q, Value, Max
-from django.db.models.functions import Coalesce
+from apps.coremodels.flat_serializers import FlatSerializer, decimal_string, iso_date
+from decimal import Decimal
+
+PURCHASE_STATS = ('ultima_compra', 'total_gasto', 'numero_compras')
 
 class ClientSerializer(serializers.ModelSerializer):
+    """
+    Serialize clients from `Clientes.objects.with_purchase_stats()` (plus
+    select_related('rota') for lists): the purchase stats are then read from
+    the annotations instead of one query per client.
+    """
     ultima_compra = serializers.SerializerMethodField()
+    total_gasto = serializers.SerializerMethodField()
+    numero_compras = serializers.SerializerMethodField()
     nome_rota = serializers.CharField(source='rota.nome_rota', read_only=True)
 
     class Meta:
         model = Clientes
         fields = '__all__'
 
+    def purchase_stats(self, obj):
+        # Objects not loaded through with_purchase_stats() get all the stats in one query
+        if not all(hasattr(obj, stat) for stat in PURCHASE_STATS):
+            stats = Clientes.objects.with_purchase_stats().filter(id=obj.id).values(*PURCHASE_STATS).first() or {}
+            for stat in PURCHASE_STATS:
+                setattr(obj, stat, stats.get(stat))
+        return obj
+
     def get_ultima_compra(self, obj):
-        ultima_compra = Clientes.objects.annotate(
-            ultima_compra=Coalesce(
-                Max(
-                    "compras_cliente__venda__data_compra",
-                    filter=Q(compras_cliente__venda__canal_venda="Pdv") & ~Q(compras_cliente__venda__situacao="Cancelado")
-                ),
-                Value(None)
-            )
-        ).get(id=obj.id).ultima_compra
-        return ultima_compra
+        return self.purchase_stats(obj).ultima_compra
+
+    def get_total_gasto(self, obj):
+        return self.purchase_stats(obj).total_gasto or Decimal('0.00')
+
+    def get_numero_compras(self, obj):
+        return self.purchase_stats(obj).numero_compras or 0
 
 class PurchaseSerializer(serializers.ModelSerializer):
     id = serializers.IntegerField(source='venda.id', read_only=True)
@@ -53,3 +67,19 @@ class PurchaseSerializer(serializers.ModelSerializer):
             'preco_final',
             'origem',
         ]
+
+# Same output as PurchaseSerializer, from ItemVenda.values_list()
+# ('origem' is left out: Clientes has no such attribute, so DRF skips it)
+PURCHASE_FLAT_SERIALIZER = FlatSerializer(
+    ('id', 'venda_id'),
+    ('data_compra', 'venda__data_compra', iso_date),
+    ('situacao', 'venda__situacao'),
+    ('sku', 'produto_id'),
+    ('produto', 'produto__descricao'),
+    ('preco_unitario', 'produto__preco', decimal_string()),
+    ('quantidade_produto', 'quantidade_produto', decimal_string()),
+    ('valor_total', 'valor_total', decimal_string()),
+    ('valor_desconto', 'valor_desconto', decimal_string()),
+    ('frete', 'frete', decimal_string()),
+    ('preco_final', 'preco_final', decimal_string()),
+)
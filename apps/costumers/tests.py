@@ -1,3 +1,204 @@
+import json
+import tempfile
+from datetime import date
+from decimal import Decimal
+from importlib import import_module
+from unittest import mock
+
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.core.cache import cache
 from django.test import TestCase
 
-# Create your tests here.
+from apps.coremodels import cep_index, data_version, rollups
+from apps.coremodels.models import Clientes, EstatisticasClientes, ItemVenda, Produtos, Rotas, Vendas
+from apps.coremodels.tests import FAIXAS, build_cep_index
+from .serializers import ClientSerializer
+
+
+class ClientSerializerQueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        rota = Rotas.objects.create(nome_rota='Rota 1', dia_semana=1, Numero_rota=1)
+        Clientes.objects.bulk_create([
+            Clientes(
+                nome=f'Cliente {index}', tipo_pessoa='F', cpf_cnpj=str(index), cep='00000-000',
+                endereco='Rua 1', rota=rota if index % 2 else None
+            )
+            for index in range(1000)
+        ])
+        cls.cliente = Clientes.objects.get(cpf_cnpj='1')
+        produto = Produtos.objects.create(sku='SKU1', descricao='Produto 1')
+
+        for numero, (canal, situacao, data_compra) in enumerate([
+            ('Pdv', 'Atendido', date(2024, 1, 10)),
+            ('Pdv', 'Atendido', date(2024, 3, 5)),
+            ('Pdv', 'Cancelado', date(2024, 5, 1)),
+            ('Shopee', 'Atendido', date(2024, 6, 1)),
+        ]):
+            venda = Vendas.objects.create(numero=numero, canal_venda=canal, situacao=situacao, data_compra=data_compra)
+            ItemVenda.objects.create(
+                venda=venda, cliente=cls.cliente, produto=produto, quantidade_produto=1,
+                valor_total=Decimal('10.00'), preco_final=Decimal('10.00'),
+            )
+
+    def test_serializing_a_list_uses_a_constant_number_of_queries(self):
+        clientes = Clientes.objects.with_purchase_stats().select_related('rota')
+        with self.assertNumQueries(1):
+            data = ClientSerializer(clientes, many=True).data
+        self.assertEqual(len(data), 1000)
+
+    def test_purchase_stats_only_count_valid_pdv_sales(self):
+        annotated = Clientes.objects.with_purchase_stats().get(id=self.cliente.id)
+        data = ClientSerializer(annotated).data
+        self.assertEqual(data['ultima_compra'], date(2024, 3, 5))
+        self.assertEqual(data['numero_compras'], 2)
+        self.assertEqual(Decimal(data['total_gasto']), Decimal('20.00'))
+
+        # A plain instance falls back to a single query for all the stats
+        plain = Clientes.objects.get(id=self.cliente.id)
+        with self.assertNumQueries(2):
+            self.assertEqual(ClientSerializer(plain).data, data)
+
+
+class CachedClientRankingTests(TestCase):
+    params = {'start_date': '2024-01-01', 'end_date': '2024-12-31'}
+
+    def setUp(self):
+        self.produto = Produtos.objects.create(sku='SKU1', descricao='Produto 1')
+        self.add_sale('Cliente 1', numero=1, valor='30.00')
+
+    def add_sale(self, nome, numero, valor):
+        cliente = Clientes.objects.create(nome=nome, tipo_pessoa='F', cpf_cnpj=nome, cep='00000-000', endereco='Rua 1')
+        venda = Vendas.objects.create(numero=numero, canal_venda='Pdv', situacao='Atendido', data_compra=date(2024, 5, 1))
+        ItemVenda.objects.create(
+            venda=venda, cliente=cliente, produto=self.produto, quantidade_produto=1,
+            valor_total=Decimal(valor), preco_final=Decimal(valor),
+        )
+
+    def test_ranking_is_cached_until_the_data_version_changes(self):
+        self.assertEqual(settings.CACHES['default']['BACKEND'], 'django.core.cache.backends.db.DatabaseCache')
+        first = self.client.get('/api/clientes_ranking/', self.params).json()
+        self.assertEqual([row['nome'] for row in first], ['Cliente 1'])
+
+        self.add_sale('Cliente 2', numero=2, valor='50.00')
+        self.assertEqual(self.client.get('/api/clientes_ranking/', self.params).json(), first)
+
+        # What an import does once it commits
+        data_version.bump()
+        ranking = self.client.get('/api/clientes_ranking/', self.params).json()
+        self.assertEqual([row['nome'] for row in ranking], ['Cliente 2', 'Cliente 1'])
+
+    def test_a_lost_version_never_matches_older_keys(self):
+        old_key = data_version.cache_key('clientes_ranking')
+        data_version.bump()
+        # e.g. culled from the cache table
+        cache.delete(data_version.DATA_VERSION_KEY)
+        self.assertNotEqual(data_version.cache_key('clientes_ranking'), old_key)
+
+
+class CachedInactiveClientsTests(TestCase):
+    def setUp(self):
+        self.produto = Produtos.objects.create(sku='SKU1', descricao='Produto 1')
+        self.add_old_sale('Cliente 1', numero=1)
+
+    def add_old_sale(self, nome, numero):
+        cliente = Clientes.objects.create(nome=nome, tipo_pessoa='F', cpf_cnpj=nome, cep='00000-000', endereco='Rua 1')
+        venda = Vendas.objects.create(numero=numero, canal_venda='Pdv', situacao='Atendido', data_compra=date(2020, 1, 1))
+        ItemVenda.objects.create(
+            venda=venda, cliente=cliente, produto=self.produto, quantidade_produto=1,
+            valor_total=Decimal('10.00'), preco_final=Decimal('10.00'),
+        )
+        rollups.refresh_client_stats([cliente.id])
+
+    def test_inactive_clients_are_cached_until_the_data_version_changes(self):
+        first = self.client.get('/api/clientes_inativos/').json()
+        self.assertEqual([row['info']['nome'] for row in first], ['Cliente 1'])
+
+        self.add_old_sale('Cliente 2', numero=2)
+        self.assertEqual(self.client.get('/api/clientes_inativos/').json(), first)
+
+        data_version.bump()
+        inativos = self.client.get('/api/clientes_inativos/').json()
+        self.assertEqual([row['info']['nome'] for row in inativos], ['Cliente 1', 'Cliente 2'])
+        self.assertEqual(len(inativos[1]['purchases']), 1)
+
+    def test_migration_fills_the_stats_of_existing_clients(self):
+        migration = import_module('apps.coremodels.migrations.0037_backfill_estatisticas_clientes')
+        # Sales imported before the stats table existed
+        EstatisticasClientes.objects.all().delete()
+        data_version.bump()
+        self.assertEqual(self.client.get('/api/clientes_inativos/').json(), [])
+
+        migration.backfill_estatisticas_clientes(django_apps, None)
+        data_version.bump()
+        self.assertEqual([row['info']['nome'] for row in self.client.get('/api/clientes_inativos/').json()], ['Cliente 1'])
+
+
+class ClientsListingPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for index, (nome, cidade) in enumerate([
+            ('Bruno', 'Itu'), ('Ana', 'Campinas'), ('Bruno', 'Campinas'), ('Carla', 'Itu'),
+            ('Ana', 'Itu'), ('Consumidor Final', 'Itu'),
+        ]):
+            Clientes.objects.create(
+                nome=nome, cidade=cidade, tipo_pessoa='F', cpf_cnpj=str(index), cep='00000-000', endereco='Rua 1'
+            )
+
+    def pages(self, **params):
+        pages, cursor = [], None
+        while True:
+            query = dict(params, **({'cursor': cursor} if cursor else {}))
+            response = self.client.get('/api/clientes_listagem/', query)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            pages.append([(cliente['nome'], cliente['id']) for cliente in data['results']])
+            cursor = data['next_cursor']
+            if cursor is None:
+                return pages
+
+    def test_pages_follow_name_then_id_without_gaps(self):
+        expected = list(Clientes.objects.exclude(nome='Consumidor Final').order_by('nome', 'id').values_list('nome', 'id'))
+        pages = self.pages(limit=2)
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual(sum(pages, []), expected)
+
+    def test_filters_apply_before_paginating(self):
+        pages = self.pages(limit=1, cidade='itu')
+        self.assertEqual([nome for page in pages for nome, _ in page], ['Ana', 'Bruno', 'Carla'])
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api/clientes_listagem/', {'cursor': 'nao-e-um-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ResolveCepsTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        patcher = mock.patch.object(cep_index, '_index', build_cep_index(tmp.name, FAIXAS))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def resolve(self, payload):
+        return self.client.post('/api/ceps/resolve/', json.dumps(payload), content_type='application/json')
+
+    def test_results_follow_the_posted_order(self):
+        response = self.resolve({'ceps': ['13300-000', 13010100, '13200-000', 'abc', '13.010-100', '']})
+        self.assertEqual(response.status_code, 200)
+        # Only the localities found are listed, numbered in index order
+        self.assertEqual(response.json(), {
+            'localidades': [['Campinas', 'SP'], ['Itu', 'SP']],
+            'resultado': [1, 0, -1, None, 0, None],
+            'invalidos': ['abc', ''],
+        })
+        self.assertEqual(self.resolve(['13140000']).json()['localidades'], [['Paulínia', 'SP']])
+
+    def test_bad_payloads_are_rejected(self):
+        self.assertEqual(self.resolve({'ceps': '13300-000'}).status_code, 400)
+        response = self.client.post('/api/ceps/resolve/', 'nao e json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get('/api/ceps/resolve/').status_code, 405)
+        with mock.patch('apps.costumers.views.CEP_BATCH_MAX', 2):
+            self.assertEqual(self.resolve(['13300-000'] * 3).status_code, 400)
@@ -3,37 +3,40 @@ from decimal import Decimal
 from itertools import groupby
 from operator import itemgetter
 from django.shortcuts import get_object_or_404
-from apps.coremodels.models import Clientes, ItemVenda
+from apps.coremodels import cep_index, data_version, localidades, rollups, streaming
+from apps.coremodels.models import Clientes, EstatisticasClientes, ItemVenda
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
 from rest_framework.views import APIView
-from .serializers import ClientSerializer, PurchaseSerializer
+from .serializers import PURCHASE_FLAT_SERIALIZER, ClientSerializer
 from django.core.cache import cache  # Para caching
-from django.db.models import Count, Q, Max, Value, Prefetch, Sum, DecimalField, Subquery, OuterRef
-from django.db.models.functions import Coalesce
+from django.db.models import Count, Q, F, Max, Value, Prefetch, Sum, DecimalField, Subquery, OuterRef, Exists, Window
+from django.db.models.functions import Coalesce, RowNumber
 from django.utils.timezone import now
+import base64
 import json
-import pandas as pd
+import numpy as np
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
-from bisect import bisect_left
 
 @api_view(['GET', 'PUT'])
 def client_profile_api(request, client_id):
     try:
         # Retrieve the client by ID or return a 404 error if not found
-        cliente = get_object_or_404(Clientes, id=client_id)
+        cliente = get_object_or_404(Clientes.objects.with_purchase_stats().select_related('rota'), id=client_id)
 
-        # Retrieve all purchases for the current client
-        compras_cliente = ItemVenda.objects.filter(cliente=cliente).select_related('venda', 'produto')
+        # Retrieve all purchases for the current client (only the serialized columns)
+        compras_cliente = PURCHASE_FLAT_SERIALIZER.values(ItemVenda.objects.filter(cliente=cliente))
 
         # Serialize client and purchase data
         client_data = ClientSerializer(cliente).data
-        purchases_data = PurchaseSerializer(compras_cliente, many=True).data
+        purchases_data = PURCHASE_FLAT_SERIALIZER.serialize(compras_cliente)
 
         if request.method == 'PUT':
             # Update client data with provided request data
             data = request.data
+            previous_rota_id = cliente.rota_id
+            previous_cep, previous_cidade = cliente.cep, cliente.cidade
             cliente.nome = data.get('nome', cliente.nome)
             cliente.fantasia = data.get('fantasia', cliente.fantasia)
             cliente.tipo_pessoa = data.get('tipo_pessoa', cliente.tipo_pessoa)
@@ -54,8 +57,16 @@ def client_profile_api(request, client_id):
             cliente.contribuinte = data.get('contribuinte', cliente.contribuinte)
             cliente.codigo_regime_tributario = data.get('codigo_regime_tributario', cliente.codigo_regime_tributario)
 
+            if cliente.cep != previous_cep or cliente.cidade != previous_cidade or cliente.localidade_chave is None:
+                # A route sent in the request wins over the one of the new city
+                localidades.assign_localidades([cliente], assign_rota='rota' not in data)
+
             cliente.save()
 
+            # The client's sales are summed per route in VendasDiarias
+            if cliente.rota_id != previous_rota_id:
+                rollups.refresh_daily_sales(rollups.dates_of_clientes([cliente.id]))
+
         return Response({
             'client': client_data,
             'purchases': purchases_data,
@@ -65,222 +76,345 @@ def client_profile_api(request, client_id):
             'error': str(e),
         }, status=500)
 
+INACTIVE_DEFAULT_DAYS = 30
+INACTIVE_DEFAULT_PURCHASES = 10
+
 class InactiveClientsWithPdvSales(APIView):
+    """
+    Clients whose last valid Pdv purchase is older than `days` (default 30),
+    each with its last `purchases` Pdv purchases (default 10, 0 omits them).
+    """
     def get(self, request):
         try:
             start_time = datetime.now()
+            try:
+                days = parse_bounded_int(request.GET.get("days"), INACTIVE_DEFAULT_DAYS, 36500)
+                purchases_limit = parse_bounded_int(request.GET.get("purchases"), INACTIVE_DEFAULT_PURCHASES, CLIENT_LIST_MAX_LIMIT)
+            except ValueError:
+                return Response({"error": "Invalid days or purchases."}, status=400)
+
+            today = now().date()
+            cutoff_date = today - timedelta(days=days)
+
+            cache_key = data_version.cache_key("clientes_inativos_com_vendas_pdv", today, days, purchases_limit)
             print(f"{start_time} - Checking cache for inactive clients with PDV sales...")
-            cached_data = cache.get("clientes_inativos_com_vendas_pdv")
-            if cached_data:
+            cached_data = cache.get(cache_key)
+            if cached_data is not None:
                 print(f"{datetime.now()} - Cache hit. Returning cached data.")
                 return Response(cached_data, status=200)
 
-            print(f"{datetime.now()} - Fetching and processing data...")
-            today = now().date()
-            cutoff_date = today - timedelta(days=30)
-
-            # Fetch all clients and purchases in a single operation
-            all_compras = ItemVenda.objects.filter(
-                Q(venda__canal_venda="Pdv") & ~Q(venda__situacao="Cancelado")
-            ).select_related(
-                "venda", "produto"
-            ).only(
-                "cliente_id", "produto__descricao", "produto__preco",
-                "venda__id", "venda__data_compra", "quantidade_produto", 
-                "valor_total", "valor_desconto", "frete", "preco_final"
-            )
-
-            clientes_filtrados = Clientes.objects.filter(
-                id__in=all_compras.values_list("cliente_id", flat=True)
-            ).annotate(
-                ultima_compra=Max(
-                    "compras_cliente__venda__data_compra",
-                    filter=Q(compras_cliente__venda__data_compra__lt=cutoff_date)
-                )
+            # Inactivity is an index range scan of the Pdv rows of EstatisticasClientes
+            print(f"{datetime.now()} - Fetching inactive clients (last PDV purchase before {cutoff_date})...")
+            inativos = EstatisticasClientes.objects.filter(
+                canal_venda="Pdv", ultima_compra__lt=cutoff_date
             ).exclude(
-                nome__iexact="Consumidor Final"
-            ).only(
-                "id", "nome", "fantasia", "cpf_cnpj", "cep"
+                cliente__nome__iexact="Consumidor Final"
             )
 
-            # Map purchases by client ID
-            compras_by_client = {}
-            for compra in all_compras:
-                compras_by_client.setdefault(compra.cliente_id, []).append({
-                    "id": compra.venda.id,
-                    "data_compra": compra.venda.data_compra,
-                    "produto": compra.produto.descricao,
-                    "quantidade_produto": compra.quantidade_produto,
-                    "valor_total": compra.valor_total,
-                })
-
-            # Structure data for response
-            print(f"{datetime.now()} - Structuring data...")
-            clientes_ativos = []
-            for cliente in clientes_filtrados:
-                start_process_time = datetime.now()
-                print(f"{start_process_time} - Processing client {cliente.id} - {cliente.nome}...")
-
-                cliente_data = {
+            clientes_inativos = {
+                row["cliente_id"]: {
                     "info": {
-                        "id": cliente.id,
-                        "nome": cliente.nome,
-                        "fantasia": cliente.fantasia,
-                        "cpf_cnpj": cliente.cpf_cnpj,
-                        "ultima_compra": cliente.ultima_compra,
-                        "cep": cliente.cep,
+                        "id": row["cliente_id"],
+                        "nome": row["cliente__nome"],
+                        "fantasia": row["cliente__fantasia"],
+                        "cpf_cnpj": row["cliente__cpf_cnpj"],
+                        "ultima_compra": row["ultima_compra"],
+                        "cep": row["cliente__cep"],
+                        "localidade": row["cliente__localidade"],
                     },
-                    "purchases": compras_by_client.get(cliente.id, []),
+                    "purchases": [],
                 }
+                for row in inativos.order_by("cliente__nome", "cliente_id").values(
+                    "cliente_id", "ultima_compra", "cliente__nome", "cliente__fantasia", "cliente__cpf_cnpj", "cliente__cep",
+                    "cliente__localidade"
+                ).iterator(chunk_size=2000)
+            }
 
-                end_process_time = datetime.now()
-                print(f"{end_process_time} - Finished processing client {cliente.id} - {cliente.nome} in {(end_process_time - start_process_time).total_seconds()} seconds")
-                clientes_ativos.append(cliente_data)
-
-            # Cache the results
-            cache.set("clientes_inativos_com_vendas_pdv", clientes_ativos, timeout=3600)
-            print(f"{datetime.now()} - Returning response...")
-            return Response(clientes_ativos, status=200)
+            if purchases_limit and clientes_inativos:
+                # Only the last purchases of each inactive client are read
+                print(f"{datetime.now()} - Fetching the last {purchases_limit} purchases of {len(clientes_inativos)} clients...")
+                compras = ItemVenda.objects.filter(
+                    cliente_id__in=inativos.values("cliente_id"),
+                    venda__canal_venda="Pdv",
+                ).exclude(
+                    venda__situacao="Cancelado"
+                ).annotate(
+                    posicao=Window(
+                        RowNumber(),
+                        partition_by=F("cliente_id"),
+                        order_by=[F("venda__data_compra").desc(), F("id_item_venda").desc()]
+                    )
+                ).filter(
+                    posicao__lte=purchases_limit
+                ).values(
+                    "cliente_id", "venda_id", "venda__data_compra", "produto__descricao", "quantidade_produto", "valor_total"
+                ).order_by("cliente_id", "posicao")
+
+                for compra in compras.iterator(chunk_size=2000):
+                    cliente = clientes_inativos.get(compra["cliente_id"])
+                    if cliente is not None:
+                        cliente["purchases"].append({
+                            "id": compra["venda_id"],
+                            "data_compra": compra["venda__data_compra"],
+                            "produto": compra["produto__descricao"],
+                            "quantidade_produto": compra["quantidade_produto"],
+                            "valor_total": compra["valor_total"],
+                        })
+
+            clientes_data = list(clientes_inativos.values())
+            cache.set(cache_key, clientes_data, timeout=3600)
+            print(f"{datetime.now()} - Returning {len(clientes_data)} clients in {(datetime.now() - start_time).total_seconds():.2f} seconds")
+            return Response(clientes_data, status=200)
 
         except Exception as e:
             print(f"{datetime.now()} - Unexpected error: {str(e)}")
             return Response({"error": "Ocorreu um erro inesperado.", "details": str(e)}, status=500)
 
-# Load the CEP range table
-file_path = 'datasets/Lista_de_CEPs.xlsx'
-cep_table = pd.read_excel(file_path)
-
-# Preprocess the CEP ranges and cities into a sorted list
-cep_ranges = []
-for _, row in cep_table.iterrows():
-    faixa_inicio, faixa_fim = row['Faixa de CEP'].split(' a ')
-    faixa_inicio = int(faixa_inicio.replace('-', ''))
-    faixa_fim = int(faixa_fim.replace('-', ''))
-    localidade = row['Localidade']
-    cep_ranges.append((faixa_inicio, faixa_fim, localidade))
+CEP_NOT_FOUND = "Localidade não encontrada"
 
-# Sort the ranges by their start values for efficient searching
-cep_ranges.sort()
-
-# Optimized function to get the city by CEP using binary search
 def get_city_by_cep(cep: str) -> str:
-    numeric_cep = int(cep.replace('-', ''))
-    # Binary search to find the correct range
-    idx = bisect_left([faixa[0] for faixa in cep_ranges], numeric_cep)
-    
-    if idx < len(cep_ranges):
-        faixa_inicio, faixa_fim, localidade = cep_ranges[idx]
-        if faixa_inicio <= numeric_cep <= faixa_fim:
-            return localidade
-    
-    # Check the previous range if the binary search is at an exact end
-    if idx > 0:
-        faixa_inicio, faixa_fim, localidade = cep_ranges[idx - 1]
-        if faixa_inicio <= numeric_cep <= faixa_fim:
-            return localidade
-    
-    return "Localidade não encontrada"
+    # Binary search (np.searchsorted) over the compiled CEP ranges, loaded on first use
+    localidade = cep_index.get_index().lookup(cep)
+    return localidade[0] if localidade else CEP_NOT_FOUND
+
+CEP_BATCH_MAX = 200_000
+
+def parse_cep_payload(body):
+    """
+    CEPs posted as {"ceps": [...]} or as a bare JSON array; items may be
+    strings ('01310-100') or numbers (1310100). Raises ValueError otherwise.
+    """
+    data = json.loads(body)
+    ceps = data.get('ceps', []) if isinstance(data, dict) else data
+    if not isinstance(ceps, list):
+        raise ValueError('Formato de entrada inválido. A lista de CEPs é esperada.')
+    if len(ceps) > CEP_BATCH_MAX:
+        raise ValueError(f'No máximo {CEP_BATCH_MAX} CEPs por requisição.')
+    return ceps
 
 @csrf_exempt
 def get_cities_and_coordinates_from_ceps(request):
     try:
         if request.method == 'POST':
             try:
-                data = json.loads(request.body)
-                ceps = data.get('ceps', [])
-
-                if not isinstance(ceps, list):
-                    return JsonResponse({'error': 'Formato de entrada inválido. A lista de CEPs é esperada.'}, status=400)
-
-                response = {}
-                for cep in ceps:
-                    city = get_city_by_cep(cep)
-                    if city != "Localidade não encontrada":
-                        response[cep] = {
-                            'cidade': city,
-                        }
-
-                return JsonResponse(response, status=200)
+                ceps = parse_cep_payload(request.body)
             except json.JSONDecodeError:
                 return JsonResponse({'error': 'JSON inválido.'}, status=400)
+            except ValueError as e:
+                return JsonResponse({'error': str(e)}, status=400)
+
+            # One vectorized search for the whole list; CEPs not found or invalid are left out
+            response = {}
+            for cep, localidade in zip(ceps, cep_index.get_index().lookup_many(ceps)):
+                if localidade:
+                    response[str(cep)] = {
+                        'cidade': localidade[0],
+                    }
+
+            return JsonResponse(response, status=200)
         else:
             return JsonResponse({'error': 'Método não permitido.'}, status=405)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
+@csrf_exempt
+def resolve_ceps(request):
+    """
+    Batch CEP -> locality resolution with a compact response aligned with the
+    posted list:
+
+        {"localidades": [["Campinas", "SP"], ...],
+         "resultado": [0, 0, -1, null, ...],
+         "invalidos": ["abc", ...]}
+
+    Each `resultado` entry is the index of the CEP's locality in `localidades`,
+    -1 when no CEP range contains it, or null when it is not a valid CEP
+    (those are also listed in `invalidos`).
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método não permitido.'}, status=405)
+    index = cep_index.get_index()
+    try:
+        ceps = parse_cep_payload(request.body)
+        ids = index.resolve_ids(ceps)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'JSON inválido.'}, status=400)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    # Only the localities that were found are sent, renumbered from 0
+    found = ids >= 0
+    distinct, positions = np.unique(ids[found], return_inverse=True)
+    resultado = ids.astype(object)
+    resultado[found] = positions
+    resultado[ids == cep_index.NOT_FOUND] = -1
+    invalid = ids == cep_index.INVALID
+    resultado[invalid] = None
+
+    return JsonResponse({
+        'localidades': [list(index.localidades[localidade_id]) for localidade_id in distinct.tolist()],
+        'resultado': resultado.tolist(),
+        'invalidos': [ceps[position] for position in np.flatnonzero(invalid).tolist()],
+    }, status=200)
+
+CLIENT_LIST_DEFAULT_LIMIT = 50
+CLIENT_LIST_MAX_LIMIT = 500
+
+def encode_client_cursor(nome, client_id):
+    """Opaque keyset cursor for the (nome, id) ordering of the clients listing."""
+    return base64.urlsafe_b64encode(json.dumps([nome, client_id]).encode()).decode()
+
+def decode_client_cursor(cursor):
+    nome, client_id = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    return nome, int(client_id)
+
+def parse_bounded_int(value, default, maximum):
+    if value in (None, ''):
+        return default
+    return max(0, min(int(value), maximum))
+
+def filter_clients_listing(clientes, params):
+    """
+    Server-side filters of the clients listing. Text filters are
+    case-insensitive `contains`; `produto` may be repeated, with a leading
+    '+' (bought) or '-' (never bought) like the product tags of the frontend.
+    """
+    for param, lookup in (
+        ('nome', 'nome__icontains'),
+        ('cidade', 'cidade__icontains'),
+        ('estado', 'estado__icontains'),
+        ('rota', 'rota__nome_rota__icontains'),
+        ('vendedor', 'vendedor__nome__icontains'),
+        ('situacao', 'situacao__iexact'),
+        ('tipo_pessoa', 'tipo_pessoa__iexact'),
+    ):
+        if params.get(param):
+            clientes = clientes.filter(**{lookup: params[param]})
+
+    if params.get('rota_id'):
+        clientes = clientes.filter(rota_id=int(params['rota_id']))
+    if params.get('vendedor_id'):
+        clientes = clientes.filter(vendedor_id=int(params['vendedor_id']))
+
+    if params.get('ultima_compra_de'):
+        clientes = clientes.filter(ultima_compra__gte=datetime.strptime(params['ultima_compra_de'], '%Y-%m-%d').date())
+    if params.get('ultima_compra_ate'):
+        clientes = clientes.filter(ultima_compra__lte=datetime.strptime(params['ultima_compra_ate'], '%Y-%m-%d').date())
+
+    for tag in params.getlist('produto'):
+        tag = tag.strip()
+        if len(tag) < 2 or tag[0] not in '+-':
+            continue
+        bought = Exists(ItemVenda.objects.filter(
+            cliente_id=OuterRef('id'), produto__descricao__icontains=tag[1:].strip()
+        ).exclude(venda__situacao="Cancelado"))
+        clientes = clientes.filter(bought if tag[0] == '+' else ~bought)
+
+    return clientes
+
 @api_view(['GET'])
 def all_clients_with_pdv_sales(request):
+    """
+    Clients listing, keyset-paginated by (nome, id).
+
+    Query params: `limit` (default 50), `cursor` (the `next_cursor` of the
+    previous page), `purchases` (purchases embedded per client, default 0),
+    and the filters of `filter_clients_listing`.
+    """
     try:
-        # Check cache
-        cached_data = cache.get("all_clients_with_pdv_sales")
-        if cached_data:
-            return Response(cached_data, status=200)
+        params = request.GET
+        try:
+            limit = parse_bounded_int(params.get('limit'), CLIENT_LIST_DEFAULT_LIMIT, CLIENT_LIST_MAX_LIMIT) or CLIENT_LIST_DEFAULT_LIMIT
+            purchases_limit = parse_bounded_int(params.get('purchases'), 0, CLIENT_LIST_MAX_LIMIT)
+            cursor = decode_client_cursor(params['cursor']) if params.get('cursor') else None
+        except (ValueError, TypeError):
+            return Response({"error": "Invalid limit, purchases or cursor."}, status=400)
+
+        # Channel with the last non-cancelled purchase of each client, evaluated only for the rows of the page
+        ultimo_canal = EstatisticasClientes.objects.filter(
+            cliente_id=OuterRef('id')
+        ).order_by('-ultima_compra', 'canal_venda')
 
-        # Fetch and annotate clients with their last PDV purchase
         clientes = Clientes.objects.annotate(
-            ultima_compra=Coalesce(
-                Max(
-                    "compras_cliente__venda__data_compra",
-                    filter=~Q(compras_cliente__venda__situacao="Cancelado")
-                ),
-                Value(None)
-            ),
-            canal=Coalesce(
-                "compras_cliente__venda__canal_venda",
-                Value(None)
-            ),
-            rota_cidade=Coalesce(
-                "rota__nome_rota",
-                Value(None)
-            )
+            ultima_compra=Subquery(ultimo_canal.values('ultima_compra')[:1]),
+            canal=Subquery(ultimo_canal.values('canal_venda')[:1]),
         ).exclude(
             nome__iexact="Consumidor Final"
-        ).prefetch_related(
-            Prefetch(
-                "compras_cliente",
-                queryset=ItemVenda.objects.select_related("venda", "produto").filter(
-                    ~Q(venda__situacao="Cancelado")
-                ),
-                to_attr="compras"
-            )
         )
 
-        # Serialize data for clients and embed purchases inside each client
-        clientes_data = [
-            {
-                "id": cliente.id,
-                "nome": cliente.nome,
-                "tipo_pessoa": cliente.tipo_pessoa,
-                "rota": cliente.rota_cidade,
-                "bairro": cliente.bairro,
-                "cidade": cliente.cidade,
-                "estado": cliente.estado,
-                "situacao": cliente.situacao,
-                "vendedor": cliente.vendedor,
-                "limite_credito": cliente.limite_credito,
-                "ultima_compra": cliente.ultima_compra,
-                "canal": cliente.canal,
-                "purchases": [
-                    {
-                        'id': purchase.venda.id,
-                        'descricao': purchase.produto.descricao,
-                    }
-                    for purchase in cliente.compras
-                ] if cliente.compras else [],
-            }
-            for cliente in clientes
-        ]
+        try:
+            clientes = filter_clients_listing(clientes, params)
+        except ValueError:
+            return Response({"error": "Invalid filter value. Dates use YYYY-MM-DD."}, status=400)
+
+        if cursor:
+            nome, client_id = cursor
+            clientes = clientes.filter(Q(nome__gt=nome) | Q(nome=nome, id__gt=client_id))
+
+        # One extra row tells whether there is a next page
+        page = list(
+            clientes.order_by('nome', 'id').values(
+                'id', 'nome', 'tipo_pessoa', 'bairro', 'cidade', 'estado', 'situacao',
+                'limite_credito', 'ultima_compra', 'canal', 'rota__nome_rota', 'vendedor__nome',
+            )[:limit + 1]
+        )
+        has_next = len(page) > limit
+        page = page[:limit]
+
+        purchases_by_client = {}
+        if purchases_limit and page:
+            # Most recent purchases first, at most `purchases_limit` per client
+            purchases = ItemVenda.objects.filter(
+                cliente_id__in=[cliente['id'] for cliente in page]
+            ).exclude(
+                venda__situacao="Cancelado"
+            ).annotate(
+                posicao=Window(
+                    RowNumber(),
+                    partition_by=F('cliente_id'),
+                    order_by=[F('venda__data_compra').desc(), F('id_item_venda').desc()]
+                )
+            ).filter(
+                posicao__lte=purchases_limit
+            ).values('cliente_id', 'venda_id', 'produto__descricao').order_by('cliente_id', 'posicao')
+
+            for purchase in purchases:
+                purchases_by_client.setdefault(purchase['cliente_id'], []).append({
+                    'id': purchase['venda_id'],
+                    'descricao': purchase['produto__descricao'],
+                })
 
-        # Cache the results
-        cache.set("all_clients_with_pdv_sales", clientes_data, timeout=3600)
+        for cliente in page:
+            cliente['rota'] = cliente.pop('rota__nome_rota')
+            cliente['vendedor'] = cliente.pop('vendedor__nome')
+            cliente['purchases'] = purchases_by_client.get(cliente['id'], [])
 
-        return Response(clientes_data, status=200)
+        next_cursor = encode_client_cursor(page[-1]['nome'], page[-1]['id']) if has_next else None
+
+        # ?stream=json|ndjson (NDJSON sends the cursor in the X-Next-Cursor header)
+        mode = streaming.stream_mode(request)
+        if mode:
+            return streaming.streaming_response(page, mode, key="results", extra={"next_cursor": next_cursor, "limit": limit})
+
+        return Response({
+            "results": page,
+            "next_cursor": next_cursor,
+            "limit": limit,
+        }, status=200)
 
     except Exception as e:
         return Response({"error": "Unexpected error occurred.", "details": str(e)}, status=500)
 
+TOP_CLIENTS_DEFAULT_LIMIT = 20
+TOP_CLIENTS_MAX_LIMIT = 500
+
 @api_view(["GET"])
 def top_20_clients(request):
+    """
+    Clients ranked by valid Pdv spending in [start_date, end_date].
+    `limit` sets the number of clients (default 20). Cached per
+    (start_date, end_date, limit) until the next import.
+    """
     try:
         # Get the current date
         default_date = datetime.now().date()
@@ -288,6 +422,7 @@ def top_20_clients(request):
         # Capture date parameters from request
         start_date = request.GET.get("start_date")
         end_date = request.GET.get("end_date")
+        all_time = not start_date and not end_date
 
         # Set default date range if not provided
         if not start_date:
@@ -299,63 +434,55 @@ def top_20_clients(request):
         try:
             start_date = datetime.strptime(start_date, "%Y-%m-%d").date()
             end_date = datetime.strptime(end_date, "%Y-%m-%d").date()
+            limit = parse_bounded_int(request.GET.get("limit"), TOP_CLIENTS_DEFAULT_LIMIT, TOP_CLIENTS_MAX_LIMIT) or TOP_CLIENTS_DEFAULT_LIMIT
         except ValueError:
-            return Response({"error": "Invalid date format. Use YYYY-MM-DD."}, status=400)
+            return Response({"error": "Invalid date format (use YYYY-MM-DD) or limit."}, status=400)
 
-        # Filter sales within the date range and not cancelled
-        sales_in_date_range = ItemVenda.objects.filter(
-            venda__canal_venda="Pdv"
-        ).exclude(
-            venda__situacao="Cancelado"
-        ).filter(
-            venda__data_compra__gte=start_date,
-            venda__data_compra__lte=end_date
-        )
-
-        # Aggregate data based only on the filtered sales
-        total_gasto_subquery = sales_in_date_range.filter(
-            cliente_id=OuterRef('id')
-        ).values('cliente_id').annotate(
-            total_gasto=Coalesce(
-                Sum('valor_total'),
-                Value(Decimal("0.00"), output_field=DecimalField())
-            )
-        ).values('total_gasto')
-
-        numero_compras_subquery = sales_in_date_range.filter(
-            cliente_id=OuterRef('id')
-        ).values('cliente_id').annotate(
-            numero_compras=Count('venda', distinct=True)
-        ).values('numero_compras')
+        cache_key = data_version.cache_key("clientes_ranking", "all" if all_time else f"{start_date}:{end_date}", limit)
+        cached_data = cache.get(cache_key)
+        if cached_data is not None:
+            return Response(cached_data, status=200)
 
-        ultima_compra_subquery = sales_in_date_range.filter(
-            cliente_id=OuterRef('id')
-        ).values('cliente_id').annotate(
-            ultima_compra=Max('venda__data_compra')
-        ).values('ultima_compra')
-
-        # Filter and annotate clients
-        clientes_filtrados = Clientes.objects.annotate(
-            total_gasto=Subquery(total_gasto_subquery),
-            numero_compras=Subquery(numero_compras_subquery),
-            ultima_compra=Subquery(ultima_compra_subquery)
-        ).exclude(
-            nome__iexact="Consumidor Final"
-        ).filter(
-            total_gasto__gt=0  # Only include clients with purchases in the period
-        ).order_by("-total_gasto")[:20]
+        if all_time:
+            # Without a period the all-time ranking is read from the per-client stats
+            ranking = EstatisticasClientes.objects.filter(
+                canal_venda="Pdv", total_gasto__gt=0
+            ).exclude(
+                cliente__nome__iexact="Consumidor Final"
+            ).order_by("-total_gasto", "cliente_id").values(
+                "cliente_id", "ultima_compra", "total_gasto", "numero_compras", nome=F("cliente__nome")
+            )[:limit]
+        else:
+            # One GROUP BY cliente_id over the items of the period, sorted and limited by the database
+            ranking = ItemVenda.objects.filter(
+                venda__canal_venda="Pdv",
+                venda__data_compra__gte=start_date,
+                venda__data_compra__lte=end_date,
+            ).exclude(
+                venda__situacao="Cancelado"
+            ).exclude(
+                cliente__nome__iexact="Consumidor Final"
+            ).values("cliente_id").annotate(
+                nome=F("cliente__nome"),
+                total_gasto=Sum("valor_total"),
+                numero_compras=Count("venda", distinct=True),
+                ultima_compra=Max("venda__data_compra"),
+            ).filter(
+                total_gasto__gt=0  # Only include clients with purchases in the period
+            ).order_by("-total_gasto", "cliente_id")[:limit]
 
         # Serialize client data
         clientes_serializados = [
             {
-                "id": cliente.id,
-                "nome": cliente.nome,
-                "ultima_compra": cliente.ultima_compra,
-                "total_gasto": cliente.total_gasto,
-                "numero_compras": cliente.numero_compras,
+                "id": row["cliente_id"],
+                "nome": row["nome"],
+                "ultima_compra": row["ultima_compra"],
+                "total_gasto": row["total_gasto"],
+                "numero_compras": row["numero_compras"],
             }
-            for cliente in clientes_filtrados
+            for row in ranking
         ]
+        cache.set(cache_key, clientes_serializados, timeout=3600)
         return Response(clientes_serializados, status=200)
     except Exception as e:
         return Response({"error": str(e)}, status=400)
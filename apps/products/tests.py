@@ -1,3 +1,79 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
 from django.test import TestCase
 
-# Create your tests here.
+from apps.coremodels import rollups
+from apps.coremodels.models import Clientes, ItemVenda, Produtos, Rotas, Vendas, Vendedores
+
+
+class HomePageDataQueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        rota = Rotas.objects.create(nome_rota='Rota 1', dia_semana=1, Numero_rota=1)
+        vendedor = Vendedores.objects.create(id=1, nome='Vendedor 1')
+        produtos = [Produtos.objects.create(sku=f'SKU{index}', descricao=f'Produto {index}') for index in range(3)]
+        clientes = [
+            Clientes.objects.create(
+                nome=f'Cliente {index}', tipo_pessoa='F', cpf_cnpj=str(index), cep='00000-000',
+                endereco='Rua 1', rota=rota if index % 2 else None
+            )
+            for index in range(4)
+        ]
+
+        today = date.today()
+        for index in range(12):
+            venda = Vendas.objects.create(
+                numero=index,
+                canal_venda='Pdv' if index % 3 else 'Shopee',
+                situacao='Cancelado' if index == 5 else 'Atendido',
+                data_compra=today - timedelta(days=index * 5),
+            )
+            for produto in produtos:
+                ItemVenda.objects.create(
+                    venda=venda, cliente=clientes[index % 4], vendedor=vendedor if index % 2 else None,
+                    produto=produto, quantidade_produto=2, valor_unitario=Decimal('10.00'),
+                    valor_total=Decimal('20.00'), valor_desconto=Decimal('5.00'), preco_final=Decimal('60.00'),
+                )
+
+        cls.params = {
+            'startDate': (today - timedelta(days=90)).strftime('%d-%m-%Y'),
+            'endDate': today.strftime('%d-%m-%Y'),
+        }
+
+    def test_live_metrics_use_two_queries(self):
+        # The grouped query for the period + the individual sales of the last 30 days
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/homepage/', {**self.params, 'source': 'live'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Decimal(str(response.json()['totalPdvSales'])), Decimal('420.00'))
+
+    def test_response_keeps_the_original_shapes(self):
+        data = self.client.get('/api/homepage/', {**self.params, 'source': 'live'}).json()
+        # venda_count counts item rows, as the original per-channel query did
+        self.assertEqual(
+            [(row['canal_venda'], row['venda_count']) for row in data['channelData']],
+            [('Pdv', 21), ('Shopee', 12)],
+        )
+        # One row per sale, item value and vendedor, with the sale id (the 3 equal items of a sale are one row)
+        self.assertEqual(len(data['lastMonthSales']), 6)
+        self.assertEqual(set(data['lastMonthSales'][0]), {'id', 'data_compra', 'value', 'quantity', 'vendedor'})
+        self.assertEqual(
+            [sale['id'] for sale in data['lastWeekSales']],
+            [sale['id'] for sale in data['lastMonthSales'] if sale['data_compra'] >= str(date.today() - timedelta(days=7))],
+        )
+
+        empty = self.client.get('/api/homepage/', {'startDate': '01-01-2000', 'endDate': '31-01-2000', 'source': 'live'}).json()
+        self.assertEqual(
+            [Decimal(str(empty[key])) for key in ('totalPdvSales', 'totalEcommerceSales', 'totalCanceledSales')],
+            [Decimal('0')] * 3,
+        )
+
+    def test_rollup_metrics_match_live(self):
+        live = self.client.get('/api/homepage/', {**self.params, 'source': 'live'}).json()
+        rollups.refresh_daily_sales()
+
+        # VendasDiarias.exists() + the rows of the period + the sales of the last 30 days
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/homepage/', self.params)
+        self.assertEqual(response.json(), live)
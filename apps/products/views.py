@@ -5,7 +5,8 @@ from django.http import JsonResponse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from apps.coremodels.models import Produtos, ItemVenda, Clientes, Vendas
+from apps.coremodels import rollups, streaming
+from apps.coremodels.models import Produtos, ItemVenda, Clientes, Vendas, VendasDiarias
 from django.db.models import Count, Sum, F, Q, Prefetch
 from django.db.models.functions import Cast
 from .serializers import ProdutoSerializer
@@ -33,12 +34,19 @@ class AllProductsView(APIView):
         t1 = time()
         logger.info(f'Produtos Query Time: {t1 - t0} seconds')
 
-        # Convert queryset to a list of dictionaries
-        produtos_data = list(produtos.values(
+        produtos_values = produtos.values(
             'sku', 'descricao', 'preco', 'preco_promocional', 
             'estoque_disponivel', 'unidade', 'custo', 
             'numero_vendas', 'total_vendido'
-        ))
+        )
+
+        # ?stream=json|ndjson: rows are encoded and sent as they are read
+        mode = streaming.stream_mode(request)
+        if mode:
+            return streaming.streaming_response(produtos_values.iterator(chunk_size=streaming.STREAM_CHUNK_SIZE), mode)
+
+        # Convert queryset to a list of dictionaries
+        produtos_data = list(produtos_values)
 
         t2 = time()
         logger.info(f'Produtos Data Conversion Time: {t2 - t1} seconds')
@@ -136,115 +144,12 @@ def homePageData(request):
             print(error_msg)
             return JsonResponse({"error": error_msg}, status=400)
 
-        valid_sales = Vendas.objects.filter(
-            ~Q(situacao__iexact='Cancelado'),
-            data_compra__range=(start_date, end_date)
-        )
-
-        total_pdv_sales = (
-            valid_sales.filter(canal_venda='Pdv')
-            .annotate(venda_total=Coalesce(Sum(F('itens_venda__valor_total')), Decimal('0.00')))
-            .aggregate(total=Sum('venda_total'))['total']
-        )
-
-        total_ecommerce_sales = (
-            valid_sales.exclude(canal_venda='Pdv')
-            .annotate(venda_total=Coalesce(Sum(F('itens_venda__valor_total')), Decimal('0.00')))
-            .aggregate(total=Sum('venda_total'))['total']
-        )
-
-        total_canceled_sales = (
-            Vendas.objects.filter(situacao__iexact='Cancelado', data_compra__range=(start_date, end_date))
-            .annotate(venda_total=Coalesce(Sum(F('itens_venda__valor_total')), Decimal('0.00')))
-            .aggregate(total=Sum('venda_total'))['total']
-        )
-
-        channel_data = (
-            valid_sales.annotate(
-                venda_total=Coalesce(Sum(F('itens_venda__valor_total'), output_field=DecimalField()), Decimal('0.00'))
-            )
-            .values('canal_venda')
-            .annotate(
-                venda_count=Count('id'),
-                item_count=Coalesce(Sum(F('itens_venda__quantidade_produto'), output_field=DecimalField()), Decimal('0.00'))
-            )
-            .order_by('canal_venda')
-        )
-
-        today = date.today()
-        one_week_ago = today - timedelta(days=7)
-        one_month_ago = today - timedelta(days=30)
-        two_months_ago = today - timedelta(days=60)
-
-        def aggregate_sales(queryset):
-            return list(
-                queryset.annotate(
-                    value=Coalesce(F('itens_venda__valor_total'), Decimal('0.00')),
-                    quantity=Coalesce(Sum(F('itens_venda__quantidade_produto'), output_field=DecimalField()), Decimal('0.00')),
-                    vendedor=Coalesce(F('itens_venda__vendedor__nome'), Value('Sem Vendedor'))
-                ).values('id', 'data_compra', 'value', 'quantity', 'vendedor').order_by('data_compra')
-            )
-
-        last_week_sales = aggregate_sales(valid_sales.filter(data_compra__range=(one_week_ago, today)))
-        last_month_sales = aggregate_sales(valid_sales.filter(data_compra__range=(one_month_ago, today)))
-
-        total_last_month_sales = valid_sales.filter(data_compra__range=(one_month_ago, today)).aggregate(
-            total=Sum(F('itens_venda__valor_total'))
-        )['total'] or Decimal('0.00')
-        average_sales_per_last_month = (total_last_month_sales / 30).quantize(Decimal('0.00'))
-
-        total_last_two_months_sales = valid_sales.filter(data_compra__range=(two_months_ago, one_month_ago)).aggregate(
-            total=Sum(F('itens_venda__valor_total'))
-        )['total'] or Decimal('0.00')
-        average_sales_per_last_two_months = (total_last_two_months_sales / 30).quantize(Decimal('0.00'))
-
-        sales_per_route = (
-            valid_sales.filter(itens_venda__cliente__rota__isnull=False)
-            .values('itens_venda__cliente__rota__nome_rota')
-            .annotate(
-                total_sales=Coalesce(Sum(F('itens_venda__valor_total')), Decimal('0.00'))
-            )
-            .order_by('itens_venda__cliente__rota__nome_rota')
-        )
-
-        discounted_value_expr = ExpressionWrapper(
-            F('itens_venda__valor_total') * (
-                1 - F('itens_venda__valor_desconto') / 100
-            ),
-            output_field=DecimalField(max_digits=10, decimal_places=2)
-        )
-
-        total_day_sales = valid_sales.filter(data_compra=today).annotate(
-            discounted_value=discounted_value_expr
-        ).aggregate(total=Sum('discounted_value'))['total'] or Decimal('0.00')
-
-        total_week_sales = valid_sales.filter(data_compra__range=(one_week_ago, today)).annotate(
-            discounted_value=discounted_value_expr
-        ).aggregate(total=Sum('discounted_value'))['total'] or Decimal('0.00')
-
-        total_month_sales = valid_sales.filter(data_compra__range=(one_month_ago, today)).annotate(
-            discounted_value=discounted_value_expr
-        ).aggregate(total=Sum('discounted_value'))['total'] or Decimal('0.00')
-
-        response_data = {
-            "totalPdvSales": total_pdv_sales,
-            "totalEcommerceSales": total_ecommerce_sales,
-            "totalCanceledSales": total_canceled_sales,
-            "startDate": start_date.strftime('%Y-%m-%d'),
-            "endDate": end_date.strftime('%Y-%m-%d'),
-            "channelData": list(channel_data),
-            "lastWeekSales": last_week_sales,
-            "lastMonthSales": last_month_sales,
-            "totalDaySales": total_day_sales,
-            "totalWeekSales": total_week_sales,
-            "totalMonthSales": total_month_sales,
-            "averageSalesPerLastMonth": average_sales_per_last_month,
-            "averageSalesPerLastTwoMonths": average_sales_per_last_two_months,
-            "salesPerRoute": [
-                {"routeName": entry["itens_venda__cliente__rota__nome_rota"], "value": entry["total_sales"]}
-                for entry in sales_per_route
-            ],
-        }
+        # The daily rollup is filled for the whole history by migration 0036 and kept up to date by the imports;
+        # ?source=live forces the queries over Vendas and ItemVenda
+        if request.GET.get('source') != 'live' and VendasDiarias.objects.exists():
+            response_data = rollup_home_page_data(start_date, end_date)
+        else:
+            response_data = live_home_page_data(start_date, end_date)
 
         return JsonResponse(response_data, safe=False)
 
@@ -253,6 +158,127 @@ def homePageData(request):
         print(error_msg)
         return JsonResponse({"error": error_msg}, status=500)
 
+def live_home_page_data(start_date, end_date):
+    """
+    Homepage metrics computed directly from ItemVenda: one grouped query for
+    the period (per day/canal/situação/vendedor/rota, with the same totals as
+    VendasDiarias) and every KPI and series assembled from it in Python.
+    """
+    items = ItemVenda.objects.filter(venda__data_compra__range=(start_date, end_date))
+    grouped = rollups.daily_sales_values(
+        items,
+        'venda__data_compra', 'venda__canal_venda', 'venda__situacao', 'vendedor__nome', 'cliente__rota__nome_rota'
+    )
+    rows = [
+        {
+            'data': row['venda__data_compra'],
+            'canal_venda': row['venda__canal_venda'],
+            'situacao': row['venda__situacao'],
+            'valor_total': row['total'],
+            'valor_com_desconto': row['total_com_desconto'],
+            'quantidade_itens': row['quantidade'] or 0,
+            'numero_itens': row['itens'],
+            'numero_vendas': row['vendas'],
+            'vendedor__nome': row['vendedor__nome'],
+            'rota__nome_rota': row['cliente__rota__nome_rota'],
+        }
+        for row in grouped
+    ]
+    return summarize_home_page_rows(rows, start_date, end_date, recent_sales(start_date, end_date))
+
+def rollup_home_page_data(start_date, end_date):
+    """Homepage metrics computed from the VendasDiarias rows of the period (a single query)."""
+    rows = list(
+        VendasDiarias.objects.filter(data__range=(start_date, end_date)).values(
+            'data', 'canal_venda', 'situacao', 'valor_total', 'valor_com_desconto',
+            'quantidade_itens', 'numero_itens', 'numero_vendas', 'vendedor__nome', 'rota__nome_rota'
+        )
+    )
+    return summarize_home_page_rows(rows, start_date, end_date, recent_sales(start_date, end_date))
+
+def recent_sales(start_date, end_date):
+    """
+    Rows of lastMonthSales: the valid sales of the last 30 days within the
+    period, one row per sale, item value and vendedor. The charts list
+    individual sales, so these are read from Vendas/ItemVenda in both modes;
+    the window is never longer than 30 days.
+    """
+    today = date.today()
+    sales = Vendas.objects.filter(
+        ~Q(situacao__iexact='Cancelado'),
+        data_compra__range=(start_date, end_date),
+    ).filter(data_compra__range=(today - timedelta(days=30), today))
+    return list(
+        sales.annotate(
+            value=Coalesce(F('itens_venda__valor_total'), Decimal('0.00')),
+            quantity=Coalesce(Sum(F('itens_venda__quantidade_produto'), output_field=DecimalField()), Decimal('0.00')),
+            vendedor=Coalesce(F('itens_venda__vendedor__nome'), Value('Sem Vendedor'))
+        ).values('id', 'data_compra', 'value', 'quantity', 'vendedor').order_by('data_compra')
+    )
+
+def summarize_home_page_rows(rows, start_date, end_date, last_month_sales):
+    """
+    Build the homepage response from sales already summed per day, canal,
+    situação, vendedor and rota (VendasDiarias rows or the live grouped query)
+    and the individual sales of the last 30 days (`recent_sales`).
+    """
+    rows = sorted(rows, key=lambda row: row['data'])
+
+    def is_canceled(row):
+        return (row['situacao'] or '').lower() == 'cancelado'
+
+    def total(selected, field='valor_total'):
+        return sum((row[field] for row in selected), Decimal('0.00'))
+
+    valid_rows = [row for row in rows if not is_canceled(row)]
+    canceled_rows = [row for row in rows if is_canceled(row)]
+    pdv_rows = [row for row in valid_rows if row['canal_venda'] == 'Pdv']
+    ecommerce_rows = [row for row in valid_rows if row['canal_venda'] != 'Pdv']
+
+    today = date.today()
+    one_week_ago = today - timedelta(days=7)
+    one_month_ago = today - timedelta(days=30)
+    two_months_ago = today - timedelta(days=60)
+
+    def between(first, last):
+        return [row for row in valid_rows if first <= row['data'] <= last]
+
+    channels = {}
+    for row in valid_rows:
+        # venda_count has always been the number of item rows of the channel
+        channel = channels.setdefault(row['canal_venda'], {'venda_count': 0, 'item_count': Decimal('0.00')})
+        channel['venda_count'] += row['numero_itens']
+        channel['item_count'] += Decimal(str(row['quantidade_itens']))
+    channel_data = [
+        {'canal_venda': canal_venda, **values}
+        for canal_venda, values in sorted(channels.items(), key=lambda item: (item[0] is None, item[0] or ''))
+    ]
+
+    routes = {}
+    for row in valid_rows:
+        if row['rota__nome_rota'] is not None:
+            routes[row['rota__nome_rota']] = routes.get(row['rota__nome_rota'], Decimal('0.00')) + row['valor_total']
+
+    return {
+        "totalPdvSales": total(pdv_rows),
+        "totalEcommerceSales": total(ecommerce_rows),
+        "totalCanceledSales": total(canceled_rows),
+        "startDate": start_date.strftime('%Y-%m-%d'),
+        "endDate": end_date.strftime('%Y-%m-%d'),
+        "channelData": channel_data,
+        "lastWeekSales": [sale for sale in last_month_sales if sale['data_compra'] >= one_week_ago],
+        "lastMonthSales": last_month_sales,
+        "totalDaySales": total(between(today, today), 'valor_com_desconto'),
+        "totalWeekSales": total(between(one_week_ago, today), 'valor_com_desconto'),
+        "totalMonthSales": total(between(one_month_ago, today), 'valor_com_desconto'),
+        "averageSalesPerLastMonth": (total(between(one_month_ago, today)) / 30).quantize(Decimal('0.00')),
+        "averageSalesPerLastTwoMonths": (total(between(two_months_ago, one_month_ago)) / 30).quantize(Decimal('0.00')),
+        "salesPerRoute": [
+            {"routeName": route_name, "value": value}
+            for route_name, value in sorted(routes.items())
+        ],
+    }
+
 class ProductInfoView(APIView):
     def get(self, request):
         print("GET /api/products-list")
@@ -274,31 +300,17 @@ class ProductInfoView(APIView):
             # Buscar produtos com pré-carregamento
             produtos = Produtos.objects.all().prefetch_related(item_vendas_prefetch)
 
-            # Preparar a resposta
-            data = {'produtos': []}
+            # ?stream=json|ndjson: the items are prefetched per chunk of products
+            mode = streaming.stream_mode(request)
+            if mode:
+                produtos_data = (
+                    self.product_data(produto)
+                    for produto in produtos.iterator(chunk_size=streaming.STREAM_CHUNK_SIZE)
+                )
+                return streaming.streaming_response(produtos_data, mode, key='produtos')
 
-            for produto in produtos:
-                produto_data = {
-                    'sku': produto.sku,
-                    'descricao': produto.descricao,
-                    'preco': str(produto.preco),
-                    'estoque_disponivel': str(produto.estoque_disponivel),
-                    'custo': str(produto.custo),
-                    'total_vendido': str(sum(venda.total_vendido for venda in produto.prefetched_vendas)),
-                    'numero_vendas': str(len(produto.prefetched_vendas)),
-                    'valor_total_vendido': None,
-                    'vendas': []
-                }
-            
-                for venda in produto.prefetched_vendas:
-                    produto_data['vendas'].append({
-                        'data_compra': venda.data_compra,
-                        'valor_vendido': venda.valor_total,
-                    })
-            
-                produto_data['valor_total_vendido'] = str(sum(venda['valor_vendido'] for venda in produto_data['vendas']))
-            
-                data['produtos'].append(produto_data)
+            # Preparar a resposta
+            data = {'produtos': [self.product_data(produto) for produto in produtos]}
 
             print("Returning response data for all products")
             return Response(data, status=status.HTTP_200_OK)
@@ -306,3 +318,25 @@ class ProductInfoView(APIView):
         except Exception as e:
             print(f"Error retrieving products: {str(e)}")
             return Response({'error': 'Internal server error', 'details': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def product_data(self, produto):
+        produto_data = {
+            'sku': produto.sku,
+            'descricao': produto.descricao,
+            'preco': str(produto.preco),
+            'estoque_disponivel': str(produto.estoque_disponivel),
+            'custo': str(produto.custo),
+            'total_vendido': str(sum(venda.total_vendido for venda in produto.prefetched_vendas)),
+            'numero_vendas': str(len(produto.prefetched_vendas)),
+            'valor_total_vendido': None,
+            'vendas': []
+        }
+
+        for venda in produto.prefetched_vendas:
+            produto_data['vendas'].append({
+                'data_compra': venda.data_compra,
+                'valor_vendido': venda.valor_total,
+            })
+
+        produto_data['valor_total_vendido'] = str(sum(venda['valor_vendido'] for venda in produto_data['vendas']))
+        return produto_data
@@ -1,42 +1,179 @@
 # file: your_project/your_app/management/commands/combine_sales_orders.py
 
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from django.core.management.base import BaseCommand
 import logging
 import unidecode
 
+from apps.coremodels import staging
+from apps.coremodels.management.commands import send_data_to_db
+
 # Set up logging for debugging
 logger = logging.getLogger(__name__)
 
+# Client name -> ID map, loaded once per worker process by `init_worker`
+_clients_df = None
+
+
+def normalize_names(names):
+    """Unidecode and lowercase a Series of names, converting each distinct name only once."""
+    names = names.astype(str)
+    mapping = {name: unidecode.unidecode(name).lower() for name in names.unique()}
+    return names.map(mapping)
+
+
+def init_worker(clients_df):
+    global _clients_df
+    _clients_df = clients_df
+
+
+def process_sales_file(csv_file, structure, clients_df=None):
+    """
+    Read one sale-order CSV, tag it with its loja and map "Nome do contato" to the client ID.
+
+    Returns (csv_file, table, error): `table` is a pyarrow Table (see `staging.to_table`),
+    so workers hand columnar buffers back to the parent instead of pickling DataFrames
+    row by row.
+    """
+    if clients_df is None:
+        clients_df = _clients_df
+
+    try:
+        df = pd.read_csv(csv_file)
+    except pd.errors.EmptyDataError:
+        return csv_file, None, f"Skipping empty file: {csv_file}"
+    except Exception as e:
+        return csv_file, None, f"Failed to read '{csv_file}': {str(e)}"
+
+    try:
+        # Validate required columns
+        required_columns = {'ID contato', 'Nome do contato'}
+        if not required_columns.issubset(df.columns):
+            missing = required_columns - set(df.columns)
+            return csv_file, None, f"Skipping file '{csv_file}' due to missing columns: {', '.join(missing)}"
+
+        # Add the loja column to indicate origin
+        df['loja'] = structure
+
+        # Normalize "Nome do contato" and map to "ID"
+        df['normalized_nome_contato'] = normalize_names(df['Nome do contato'])
+
+        # Merge with clients_df to map IDs
+        df = df.merge(
+            clients_df[['ID', 'normalized_name']],
+            left_on='normalized_nome_contato',
+            right_on='normalized_name',
+            how='left'
+        )
+
+        # Rename 'ID_y' to 'ID' if it exists after merging
+        if 'ID_y' in df.columns:
+            df = df.rename(columns={'ID_y': 'ID'})
+
+        # Retain original "ID contato" if no match is found in Clientes.csv
+        df['ID contato'] = df['ID'].combine_first(df['ID contato'])
+
+        # Drop temporary columns used for normalization and merging
+        df.drop(columns=['normalized_nome_contato', 'normalized_name', 'ID_x'], errors='ignore', inplace=True)
+
+        return csv_file, staging.to_table(df), None
+    except Exception as e:
+        return csv_file, None, f"Failed to read '{csv_file}': {str(e)}"
+
+
 class Command(BaseCommand):
     help = 'Combine CSV files with normalization and merging based on client data into a single file.'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of processes used to parse the sale-order files (default: 1, serial)'
+        )
+        parser.add_argument(
+            '--format',
+            choices=list(staging.FORMATS),
+            default='csv',
+            help='Output format: csv, or parquet/feather (typed columns, read through pyarrow by send_data_to_db)'
+        )
+
     def handle(self, *args, **kwargs):
+        workers = kwargs.get('workers') or 1
+        file_format = kwargs.get('format') or 'csv'
         base_folder = Path('datasets/basefiles/sellorders')
         combined_folder = Path('datasets/csv')
-        combined_file_path = combined_folder / "itemVenda.csv"
+        combined_file_path = staging.staging_path(combined_folder, "itemVenda", file_format)
         combined_folder.mkdir(parents=True, exist_ok=True)
 
         # Define the structures to process
         structures = ['servi', 'imp']
 
-        # Load and normalize the client mapping CSV
-        clients_file = combined_folder / "Clientes.csv"
+        # Load and normalize the client mapping, from the file written by concate_csv in the same format
+        clients_file = staging.staging_path(combined_folder, "Clientes", file_format)
+        if not clients_file.is_file():
+            clients_file = combined_folder / "Clientes.csv"
         if clients_file.is_file():
             try:
-                clients_df = pd.read_csv(clients_file)
+                if staging.is_columnar(clients_file):
+                    clients_df = staging.read_frame(clients_file, columns=['ID', 'Nome'])
+                    clients_df = clients_df.rename(columns={'id': 'ID', 'nome': 'Nome'})
+                    # Written as an integer column by concate_csv; older staging files still hold it as text
+                    clients_df['ID'] = pd.to_numeric(clients_df['ID'], errors='coerce')
+                else:
+                    clients_df = pd.read_csv(clients_file)
                 # Normalize client names for comparison
-                clients_df['normalized_name'] = clients_df['Nome'].apply(lambda x: unidecode.unidecode(str(x)).lower())
+                clients_df['normalized_name'] = normalize_names(clients_df['Nome'])
+                clients_df = clients_df[['ID', 'normalized_name']]
             except Exception as e:
-                self.stderr.write(self.style.ERROR(f"Failed to read 'Clientes.csv': {str(e)}"))
+                self.stderr.write(self.style.ERROR(f"Failed to read '{clients_file.name}': {str(e)}"))
                 return
         else:
             self.stderr.write(self.style.ERROR(f"Clients file '{clients_file}' does not exist."))
             return
 
+        sales_files = self.collect_sales_files(base_folder, structures)
+
+        if workers > 1:
+            # The client map is sent once to each worker, not with every file
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(clients_df,)) as executor:
+                results = list(executor.map(
+                    process_sales_file,
+                    [csv_file for csv_file, _ in sales_files],
+                    [structure for _, structure in sales_files],
+                ))
+        else:
+            results = [process_sales_file(csv_file, structure, clients_df) for csv_file, structure in sales_files]
+
         combined_data = []  # Collect all data here
+        for csv_file, table, error in results:
+            if error:
+                self.stderr.write(self.style.ERROR(error))
+                continue
+            combined_data.append(table.to_pandas())
+            self.stdout.write(self.style.SUCCESS(f"Read and processed file: {csv_file}"))
 
+        # Combine all dataframes into one and save
+        if combined_data:
+            final_combined_df = pd.concat(combined_data, ignore_index=True)
+            if staging.is_columnar(combined_file_path):
+                # Same column types as the ItemVenda file written by concate_csv
+                parsers = send_data_to_db.Command.staging_parsers()
+                staging.write_frame(
+                    staging.parse_columns(final_combined_df, parsers), combined_file_path,
+                    staging.typed_schema(final_combined_df.columns, parsers)
+                )
+            else:
+                final_combined_df.to_csv(combined_file_path, index=False)
+            self.stdout.write(self.style.SUCCESS(f"Combined CSV saved to {combined_file_path}"))
+        else:
+            self.stderr.write(self.style.WARNING("No valid files found to combine."))
+
+    def collect_sales_files(self, base_folder, structures):
+        """Return (csv_file, structure) for every file under <structure>/csv/<year>/<zip>/."""
+        sales_files = []
         for structure in structures:
             structure_folder = base_folder / structure / 'csv'
 
@@ -54,57 +191,5 @@ class Command(BaseCommand):
                         continue
 
                     for csv_file in zip_folder.glob("*.csv"):
-                        try:
-                            df = pd.read_csv(csv_file)
-
-                            # Validate required columns
-                            required_columns = {'ID contato', 'Nome do contato'}
-                            if not required_columns.issubset(df.columns):
-                                missing = required_columns - set(df.columns)
-                                self.stderr.write(
-                                    self.style.ERROR(
-                                        f"Skipping file '{csv_file}' due to missing columns: {', '.join(missing)}"
-                                    )
-                                )
-                                continue
-
-                            # Add the loja column to indicate origin
-                            df['loja'] = structure
-
-                            # ...
-                            
-                            # Normalize "Nome do contato" and map to "ID"
-                            df['normalized_nome_contato'] = df['Nome do contato'].apply(lambda x: unidecode.unidecode(str(x)).lower())
-
-                            # Merge with clients_df to map IDs
-                            df = df.merge(
-                                clients_df[['ID', 'normalized_name']],
-                                left_on='normalized_nome_contato',
-                                right_on='normalized_name',
-                                how='left'
-                            )
-
-                            # Rename 'ID_y' to 'ID' if it exists after merging
-                            if 'ID_y' in df.columns:
-                                df = df.rename(columns={'ID_y': 'ID'})
-
-                            # Retain original "ID contato" if no match is found in Clientes.csv
-                            df['ID contato'] = df['ID'].combine_first(df['ID contato'])
-
-                            # Drop temporary columns used for normalization and merging
-                            df.drop(columns=['normalized_nome_contato', 'normalized_name', 'ID_x'], errors='ignore', inplace=True)
-
-                            combined_data.append(df)
-                            self.stdout.write(self.style.SUCCESS(f"Read and processed file: {csv_file}"))
-                        except pd.errors.EmptyDataError:
-                            self.stderr.write(self.style.ERROR(f"Skipping empty file: {csv_file}"))
-                        except Exception as e:
-                            self.stderr.write(self.style.ERROR(f"Failed to read '{csv_file}': {str(e)}"))
-
-        # Combine all dataframes into one and save
-        if combined_data:
-            final_combined_df = pd.concat(combined_data, ignore_index=True)
-            final_combined_df.to_csv(combined_file_path, index=False)
-            self.stdout.write(self.style.SUCCESS(f"Combined CSV saved to {combined_file_path}"))
-        else:
-            self.stderr.write(self.style.WARNING("No valid files found to combine."))
+                        sales_files.append((csv_file, structure))
+        return sales_files
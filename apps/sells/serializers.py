@@ -1,6 +1,7 @@
 # serializers.py
 from rest_framework import serializers
 from apps.coremodels.models import Rotas, CidadesRotas, Vendas, ItemVenda
+from apps.coremodels.flat_serializers import FlatSerializer, decimal_string, iso_date
 
 class RotaSerializer(serializers.ModelSerializer):
     cidades = serializers.SerializerMethodField()
@@ -13,6 +14,16 @@ class RotaSerializer(serializers.ModelSerializer):
         # Extract all cities for the route
         return [cidade.cidade for cidade in obj.cidades.all()]
 
+class RotaUpdateSerializer(serializers.Serializer):
+    """Payload of SingleRouteView.post; the fields left out keep their current value."""
+    rota_nome = serializers.CharField(max_length=255, required=False)
+    rota_numero = serializers.IntegerField(required=False)
+    rota_dia = serializers.IntegerField(required=False)
+    # Blank inputs from the form are accepted and dropped by the view
+    cidades = serializers.ListField(
+        child=serializers.CharField(allow_blank=True, allow_null=True), required=False, default=list
+    )
+
 class ItemVendaSerializer(serializers.ModelSerializer):
     class Meta:
         model = ItemVenda
@@ -40,4 +51,20 @@ class VendasSerializer(serializers.ModelSerializer):
             'situacao', 
             'loja', 
             'itens_venda'
-        ]
\ No newline at end of file
+        ]
+
+# Same output as VendasSerializer / ItemVendaSerializer, from .values_list()
+VENDA_FLAT_SERIALIZER = FlatSerializer(
+    'id', 'numero', 'canal_venda', ('data_compra', 'data_compra', iso_date), 'situacao', 'loja'
+)
+
+ITEM_VENDA_FLAT_SERIALIZER = FlatSerializer(
+    'id_item_venda',
+    ('produto', 'produto_id'),
+    'quantidade_produto',
+    ('valor_unitario', 'valor_unitario', decimal_string()),
+    ('valor_total', 'valor_total', decimal_string()),
+    ('valor_desconto', 'valor_desconto', decimal_string()),
+    ('preco_final', 'preco_final', decimal_string()),
+    'loja',
+)
@@ -1,3 +1,104 @@
+import os
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+import pandas as pd
+from django.core.management import call_command
 from django.test import TestCase
 
-# Create your tests here.
+from apps.coremodels import staging
+from apps.coremodels.models import CidadesRotas, Clientes, Rotas
+
+
+class SingleRouteUpdateTests(TestCase):
+    def setUp(self):
+        self.rota = Rotas.objects.create(nome_rota='Rota 1', dia_semana=2, Numero_rota=1)
+        for cidade in ['Campinas', 'Itu']:
+            CidadesRotas.objects.create(rota=self.rota, cidade=cidade)
+        self.clientes = {
+            chave: Clientes.objects.create(
+                nome=chave, tipo_pessoa='J', cpf_cnpj=chave, cep='00000-000', endereco='Rua 1',
+                localidade_chave=chave, rota=self.rota if chave in ('campinas', 'itu') else None,
+            )
+            for chave in ['campinas', 'itu', 'sorocaba']
+        }
+
+    def test_city_diff_is_written_and_clients_follow_it(self):
+        response = self.client.post(
+            f'/api/rota/{self.rota.id}/', {'rota_nome': 'Rota 1', 'cidades': ['Itu', ' Sorocaba ', '', 'Itu']},
+            content_type='application/json',
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['cidades'], ['Itu', 'Sorocaba'])
+        # Kept cities are not deleted and inserted again
+        self.assertEqual(
+            list(CidadesRotas.objects.order_by('id').values_list('cidade', 'cidade_chave')),
+            [('Itu', 'itu'), ('Sorocaba', 'sorocaba')],
+        )
+        rotas = dict(Clientes.objects.values_list('localidade_chave', 'rota_id'))
+        self.assertEqual(rotas, {'campinas': None, 'itu': self.rota.id, 'sorocaba': self.rota.id})
+
+        # Read back straight away, no stale copy of the route is served
+        self.assertEqual(self.client.get(f'/api/rota/{self.rota.id}/').json()['cidades'], ['Itu', 'Sorocaba'])
+        self.assertEqual(self.client.get('/api/rotas/').json()[0]['cidades'], ['Itu', 'Sorocaba'])
+
+    def test_a_route_set_by_hand_is_not_changed(self):
+        outra = Rotas.objects.create(nome_rota='Rota 2', dia_semana=3, Numero_rota=2)
+        Clientes.objects.filter(localidade_chave='sorocaba').update(rota=outra)
+
+        self.client.post(
+            f'/api/rota/{self.rota.id}/', {'cidades': ['Campinas', 'Itu', 'Sorocaba']}, content_type='application/json'
+        )
+        self.assertEqual(Clientes.objects.get(localidade_chave='sorocaba').rota_id, outra.id)
+
+    def test_invalid_payloads_are_rejected(self):
+        for payload in [{'cidades': ['Itu', {'nome': 'Sorocaba'}]}, {'cidades': 'Itu'}, {'rota_dia': 'segunda'}, ['Itu']]:
+            response = self.client.post(f'/api/rota/{self.rota.id}/', payload, content_type='application/json')
+            self.assertEqual(response.status_code, 400, payload)
+        self.assertEqual(sorted(CidadesRotas.objects.values_list('cidade', flat=True)), ['Campinas', 'Itu'])
+
+
+class PrepareSalesRegistersTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.addCleanup(os.chdir, os.getcwd())
+        # The command reads and writes under datasets/ relative to the working directory
+        os.chdir(tmp.name)
+
+        csv_folder = Path('datasets/csv')
+        csv_folder.mkdir(parents=True)
+        pd.DataFrame({'ID': [7, 8], 'Nome': ['José Silva', 'Maria']}).to_csv(csv_folder / 'Clientes.csv', index=False)
+        for structure, contatos in [('servi', ['JOSE SILVA', 'Desconhecido']), ('imp', ['maria', 'Maria'])]:
+            for zip_name in ['a', 'b']:
+                folder = Path('datasets/basefiles/sellorders') / structure / 'csv' / '2024' / zip_name
+                folder.mkdir(parents=True)
+                pd.DataFrame({
+                    'Número do pedido': [1, 2], 'ID contato': [99, 100], 'Nome do contato': contatos,
+                    'Valor unitário': ['10,50', '3'],
+                }).to_csv(folder / 'pedidos.csv', index=False)
+
+    def combine(self, workers):
+        call_command('prepareSalesRegisters', workers=workers, stdout=StringIO(), stderr=StringIO())
+        combined = pd.read_csv('datasets/csv/itemVenda.csv')
+        return combined.sort_values(list(combined.columns)).reset_index(drop=True)
+
+    def test_worker_pool_matches_the_serial_run(self):
+        serial = self.combine(workers=1)
+        self.assertEqual(len(serial), 8)
+        self.assertEqual(
+            sorted(serial[['Nome do contato', 'ID contato']].drop_duplicates().itertuples(index=False, name=None)),
+            [('Desconhecido', 100), ('JOSE SILVA', 7), ('Maria', 8), ('maria', 8)],
+        )
+        pd.testing.assert_frame_equal(self.combine(workers=2), serial)
+
+    def test_columnar_output_is_typed(self):
+        call_command('prepareSalesRegisters', format='parquet', stdout=StringIO(), stderr=StringIO())
+        combined = staging.read_frame('datasets/csv/itemVenda.parquet')
+
+        self.assertEqual(combined['valor unitário'].dtype, 'float64')
+        self.assertEqual(sorted(set(combined['valor unitário'])), [3.0, 10.5])
+        self.assertEqual(combined['id contato'].dtype, 'int64')
+        self.assertEqual(sorted(set(combined['id contato'])), [7, 8, 100])
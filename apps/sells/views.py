@@ -1,11 +1,14 @@
 # views.py
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from apps.coremodels.models import Rotas, CidadesRotas, Vendas
+from apps.coremodels import data_version, localidades, streaming
+from apps.coremodels.models import Rotas, CidadesRotas, Vendas, ItemVenda
+from .serializers import ITEM_VENDA_FLAT_SERIALIZER, VENDA_FLAT_SERIALIZER, RotaUpdateSerializer
 from rest_framework import status
+from rest_framework.pagination import LimitOffsetPagination
 from django.db import transaction
-from .serializers import VendasSerializer
-
+from datetime import datetime
+from itertools import islice
 
 class RotaListView(APIView):
     def get(self, request, *args, **kwargs):
@@ -29,8 +32,8 @@ class RotaListView(APIView):
             route_number = route.Numero_rota
             route_day = days_of_week.get(route.dia_semana, "unknown")
 
-            # Fetch associated cities
-            cities = list(route.cidades_rota.values_list('cidade', flat=True))
+            # Associated cities, from the prefetch (values_list would query each route again)
+            cities = [cidade.cidade for cidade in route.cidades_rota.all()]
 
             # Add route data to JSON structure
             data.append({
@@ -60,7 +63,7 @@ class SingleRouteView(APIView):
                 "rota_nome": route.nome_rota,
                 "rota_numero": route.Numero_rota,
                 "rota_dia": route.dia_semana,
-                "cidades": list(route.cidades_rota.values_list('cidade', flat=True)),
+                "cidades": [cidade.cidade for cidade in route.cidades_rota.all()],
             }
 
             print(f"Returning data {data}")
@@ -75,51 +78,51 @@ class SingleRouteView(APIView):
     def post(self, request, rota_id, *args, **kwargs):
         """
         Edit route data, including adding/removing cities.
+
+        The route row is locked and the city diff is written with one DELETE
+        and one bulk INSERT in a single transaction; the response is built
+        from the diff instead of reading the cities back.
         """
+        serializer = RotaUpdateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        payload = serializer.validated_data
+
         try:
-            route = Rotas.objects.get(id=rota_id)
-
-            # Extract request data
-            route_name = request.data.get("rota_nome", route.nome_rota)
-            route_number = request.data.get("rota_numero", route.Numero_rota)
-            route_day = request.data.get("rota_dia", route.dia_semana)
-            city_list = request.data.get("cidades", [])
-
-            # Debugging input data
-            print(f"Route ID: {rota_id}")
-            print(f"Request Data: {request.data}")
-            print(f"City List in Request: {city_list}")
-
-            # Update the route
-            route.nome_rota = route_name
-            route.Numero_rota = route_number
-            route.dia_semana = route_day
-            route.save()
-
-            # Current cities linked to the route
-            current_cities = set(route.cidades_rota.values_list('cidade', flat=True))
-            print(f"Current Cities: {current_cities}")
-
-            # Identify cities to add or remove
-            new_cities = set(city_list)
-            cities_to_delete = current_cities - new_cities
-            cities_to_add = new_cities - current_cities
-
-            # Delete old cities
-            CidadesRotas.objects.filter(rota=route, cidade__in=cities_to_delete).delete()
-            print(f"Deleted Cities: {cities_to_delete}")
-
-            # Add new cities
-            with transaction.atomic():
-                for city in cities_to_add:
-                    CidadesRotas.objects.create(rota=route, cidade=city)
-                    print(f"Added City: {city}")
+            # Blank inputs from the form are not cities (the serializer already strips them)
+            new_cities = list(dict.fromkeys(city for city in payload["cidades"] if city))
 
-            # Final cities linked
-            final_cities = list(route.cidades_rota.values_list('cidade', flat=True))
-            print(f"Final Cities Linked to Route: {final_cities}")
+            with transaction.atomic():
+                route = Rotas.objects.select_for_update().get(id=rota_id)
+                route.nome_rota = payload.get("rota_nome", route.nome_rota)
+                route.Numero_rota = payload.get("rota_numero", route.Numero_rota)
+                route.dia_semana = payload.get("rota_dia", route.dia_semana)
+                route.save()
+
+                current = list(route.cidades_rota.order_by('id').values_list('id', 'cidade'))
+                current_cities = {cidade for _, cidade in current}
+                wanted = set(new_cities)
+                ids_to_delete = [city_id for city_id, cidade in current if cidade not in wanted]
+                cities_to_delete = current_cities - wanted
+                cities_to_add = [city for city in new_cities if city not in current_cities]
+
+                if ids_to_delete:
+                    CidadesRotas.objects.filter(id__in=ids_to_delete).delete()
+                if cities_to_add:
+                    # bulk_create skips save(), so the normalized key is filled here
+                    CidadesRotas.objects.bulk_create([
+                        CidadesRotas(rota=route, cidade=city, cidade_chave=localidades.normalize_city(city))
+                        for city in cities_to_add
+                    ])
+
+                # Clients of the added/removed cities follow the new route map (one UPDATE);
+                # routes set by hand on other clients are kept
+                if cities_to_add or cities_to_delete:
+                    localidades.reassign_routes(set(cities_to_add) | cities_to_delete, rotas=[route.id])
+
+            data_version.bump()
+            final_cities = [cidade for _, cidade in current if cidade in wanted] + cities_to_add
 
-            # Return success response
             return Response(
                 {
                     "message": "Rota atualizada com sucesso!",
@@ -138,8 +141,73 @@ class SingleRouteView(APIView):
             print(f"Error: {e}")
             return Response({"error": "Erro ao atualizar rota!"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+VENDAS_LOOKUP_BATCH_SIZE = 2000
+
+
+class VendasPagination(LimitOffsetPagination):
+    default_limit = 50
+    max_limit = 1000
+
+
 class VendasListAPIView(APIView):
+    """
+    Sales with their items, newest first, paginated with ?limit=&offset=.
+
+    Filters: start_date / end_date (YYYY-MM-DD), loja, canal_venda,
+    situacao (case-insensitive) and numero. With ?stream=json|ndjson every
+    filtered sale is streamed instead of one page.
+    """
     def get(self, request, *args, **kwargs):
-        vendas = Vendas.objects.prefetch_related('itens_venda').all()
-        serializer = VendasSerializer(vendas, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+        try:
+            vendas = self.filter_vendas(request.GET)
+        except ValueError:
+            return Response({"error": "Invalid filter. Dates use YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
+
+        vendas = VENDA_FLAT_SERIALIZER.values(vendas.order_by('-data_compra', '-id'))
+
+        mode = streaming.stream_mode(request)
+        if mode:
+            return streaming.streaming_response(
+                self.with_items(vendas.iterator(chunk_size=streaming.STREAM_CHUNK_SIZE)), mode
+            )
+
+        paginator = VendasPagination()
+        page = paginator.paginate_queryset(vendas, request, view=self)
+        return paginator.get_paginated_response(list(self.with_items(page)))
+
+    def filter_vendas(self, params):
+        vendas = Vendas.objects.all()
+        if params.get('start_date'):
+            vendas = vendas.filter(data_compra__gte=datetime.strptime(params['start_date'], '%Y-%m-%d').date())
+        if params.get('end_date'):
+            vendas = vendas.filter(data_compra__lte=datetime.strptime(params['end_date'], '%Y-%m-%d').date())
+        for param in ('loja', 'canal_venda', 'situacao'):
+            if params.get(param):
+                vendas = vendas.filter(**{f'{param}__iexact': params[param]})
+        if params.get('numero'):
+            vendas = vendas.filter(numero=int(params['numero']))
+        return vendas
+
+    def with_items(self, vendas):
+        """
+        Serialize the sale rows and attach `itens_venda`, reading the items
+        of each batch of sales as plain tuples (same output as VendasSerializer).
+        """
+        vendas = VENDA_FLAT_SERIALIZER.iter_rows(vendas)
+        while True:
+            batch = list(islice(vendas, VENDAS_LOOKUP_BATCH_SIZE))
+            if not batch:
+                return
+
+            itens = list(
+                ItemVenda.objects.filter(venda_id__in=[venda['id'] for venda in batch])
+                .order_by('venda_id', 'id_item_venda')
+                .values_list('venda_id', *ITEM_VENDA_FLAT_SERIALIZER.sources)
+            )
+            itens_por_venda = {}
+            for (venda_id, *_), item in zip(itens, ITEM_VENDA_FLAT_SERIALIZER.iter_rows(row[1:] for row in itens)):
+                itens_por_venda.setdefault(venda_id, []).append(item)
+
+            for venda in batch:
+                venda['itens_venda'] = itens_por_venda.get(venda['id'], [])
+                yield venda
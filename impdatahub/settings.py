@@ -47,6 +47,11 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'apps.coremodels.streaming.NDJSONRenderer',
+    ),
 }
 
 CORS_ALLOW_ALL_ORIGINS = False
@@ -121,6 +126,16 @@ DATABASES = {
 
 CONN_MAX_AGE = 60  # Conexões podem ser reutilizadas por 60 segundos
 
+# Cache compartilhado por todos os processos (workers da API e comandos de importação):
+# data_version.bump() num comando invalida as respostas em cache de todos os workers.
+# A tabela é criada pela migração coremodels 0035 (ou por `manage.py createcachetable`).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'cache_dados',
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -13,6 +13,7 @@ from apps.costumers.views import (
     client_profile_api,
     InactiveClientsWithPdvSales,
     get_cities_and_coordinates_from_ceps,
+    resolve_ceps,
     all_clients_with_pdv_sales,
     top_20_clients
     )
@@ -89,5 +90,6 @@ urlpatterns += [
     path('api/rotas/', RotaListView.as_view(), name='rotasList'),
     path('api/rota/<int:rota_id>/', SingleRouteView.as_view(), name='rotaPage'),
     path('api/ceps_to_latitude/', get_cities_and_coordinates_from_ceps, name='register'),
+    path('api/ceps/resolve/', resolve_ceps, name='resolve_ceps'),
     path('api/user/', get_user_name, name='user'),
 ]+ debug_toolbar_urls()+static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
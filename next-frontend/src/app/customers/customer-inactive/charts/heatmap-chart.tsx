@@ -31,6 +31,7 @@ interface ClientInfo {
   codigo_regime_tributario: string;
   limite_credito: number;
   ultima_compra: string | null;
+  localidade?: string | null; // Cidade do CEP, resolvida na importação
 }
 
 interface ClientData {
@@ -72,9 +73,11 @@ const InactiveClientsChoroplethMap: React.FC = () => {
       const clients: Record<string, ClientData> = JSON.parse(storedData);
 
       console.log("Extracting unique CEPs...");
+      // Only clients without a precomputed locality need their CEP resolved by the API
       const ceps = Array.from(
         new Set(
           Object.values(clients)
+            .filter((client) => !client?.info?.localidade)
             .map((client) => client?.info?.cep?.replace(/\./g, '').replace('-', '').replace(' ', ''))
             .filter((cep) => cep && cep.trim() !== '')
         )
@@ -87,8 +90,9 @@ const InactiveClientsChoroplethMap: React.FC = () => {
         setGeoJsonData(geoJson);
 
         console.log("Fetching city mapping data...");
-        const response = await axios.post(`${API_URL}/ceps_to_latitude/`, { ceps });
-        const cityMapping: Record<string, { cidade: string }> = response.data;
+        const cityMapping: Record<string, { cidade: string }> = ceps.length
+          ? (await axios.post(`${API_URL}/ceps_to_latitude/`, { ceps })).data
+          : {};
 
         console.log("Processing client data by city...");
         const cityCounts: Record<string, number> = {};
@@ -96,15 +100,15 @@ const InactiveClientsChoroplethMap: React.FC = () => {
 
         Object.values(clients).forEach((client) => {
           const clientCep = client.info.cep?.replace(/\./g, '').replace('-', '');
-          const cityInfo = clientCep ? cityMapping[clientCep] : null;
+          const cityName = client.info.localidade || (clientCep ? cityMapping[clientCep]?.cidade : null);
 
-          if (cityInfo && cityInfo.cidade) {
-            cityCounts[cityInfo.cidade] = (cityCounts[cityInfo.cidade] || 0) + 1;
+          if (cityName) {
+            cityCounts[cityName] = (cityCounts[cityName] || 0) + 1;
 
-            if (!clientGroups[cityInfo.cidade]) {
-              clientGroups[cityInfo.cidade] = [];
+            if (!clientGroups[cityName]) {
+              clientGroups[cityName] = [];
             }
-            clientGroups[cityInfo.cidade].push(client);
+            clientGroups[cityName].push(client);
           }
         });
 
@@ -4,7 +4,6 @@ import React, { useState, useEffect, useCallback, useMemo } from 'react';
 import axios from 'axios';
 import TableHandler from '@/components/table-components/table';
 import { SortDescriptor, Link, Spacer } from '@nextui-org/react';
-import { applyFilters } from '@/components/utility/process-filters';
 
 // Define the ClientInfo interface
 interface ClientInfo {
@@ -27,78 +26,100 @@ interface Purchase {
   descricao: string;
 }
 
+interface ClientPage {
+  results: ClientInfo[];
+  next_cursor: string | null;
+  limit: number;
+}
+
+type FilterStates = Record<
+  string,
+  string | boolean | [(string | undefined)?, (string | undefined)?] | string[]
+>;
+
 const API_URL = process.env.NEXT_PUBLIC_API_URL;
 
+// Purchases embedded per client (used by the "Compras" column and the product tags)
+const PURCHASES_PER_CLIENT = 10;
+
+// Text filters sent as they are to /clientes_listagem/
+const TEXT_FILTERS = ['nome', 'tipo_pessoa', 'cidade', 'estado', 'situacao', 'rota', 'vendedor'];
+
 const CustomerListTable: React.FC = () => {
   const [clients, setClients] = useState<ClientInfo[]>([]);
-  const [filteredClients, setFilteredClients] = useState<ClientInfo[]>([]);
+  const [filters, setFilters] = useState<Record<string, string | string[]>>({});
+  const [rowsPerPage, setRowsPerPage] = useState(25);
+  // Cursor of every page visited so far; the first page has no cursor
+  const [cursors, setCursors] = useState<(string | null)[]>([null]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [isLoading, setIsLoading] = useState(false);
   const [sortDescriptor, setSortDescriptor] = useState<SortDescriptor>({
     column: 'nome',
     direction: 'ascending',
   });
 
-  // Fetch client data
-  const fetchClients = useCallback(async () => {
+  // Fetch only the page being rendered
+  const fetchClients = useCallback(async (cursor: string | null) => {
+    setIsLoading(true);
     try {
-      const response = await axios.get<ClientInfo[]>(`${API_URL}/clientes_listagem/`);
-      if (Array.isArray(response.data)) setClients(response.data);
+      const response = await axios.get<ClientPage>(`${API_URL}/clientes_listagem/`, {
+        params: {
+          ...filters,
+          limit: rowsPerPage,
+          purchases: PURCHASES_PER_CLIENT,
+          ...(cursor ? { cursor } : {}),
+        },
+        paramsSerializer: { indexes: null },
+      });
+      if (Array.isArray(response.data.results)) {
+        setClients(response.data.results);
+        setNextCursor(response.data.next_cursor);
+      }
     } catch (error) {
       console.error('Error fetching client data:', error);
+    } finally {
+      setIsLoading(false);
     }
-  }, []);
+  }, [filters, rowsPerPage]);
 
-  useEffect(() => {
-    fetchClients();
-  }, [fetchClients]);
+  const currentCursor = cursors[cursors.length - 1];
 
   useEffect(() => {
-    setFilteredClients(clients);
-  }, [clients]);
+    fetchClients(currentCursor);
+  }, [fetchClients, currentCursor]);
 
-  const handleFilterChange = useCallback(
-    (
-      filterStates: Record<
-        string,
-        string | boolean | [(string | undefined)?, (string | undefined)?] | string[]
-      >
-    ) => {
-      console.log("filterStates", filterStates);
-  
-      const refinedStates = Object.entries(filterStates).reduce((acc, [key, value]) => {
-        console.log("filters", key, value);
-  
-        if (key === "tags" && Array.isArray(value)) {
-          const tagValues = value
-            .filter((v) => v !== undefined && v.trim() !== "") // Remove invalid values
-            .map((v) => v?.trim().toLowerCase()); // Normalize tags
-          if (tagValues.length > 0) {
-            acc["purchases.descricao"] = tagValues; // Map tags to purchases.descricao
-          }
-        } else if (value && value !== "") {
-          // Process other filters
-          acc[key] = Array.isArray(value)
-            ? value.map((v) => String(v).toLowerCase())
-            : [String(value).toLowerCase()];
-        }
-  
-        return acc;
-      }, {} as Record<string, unknown>);
-  
-      console.log("refinedStates", refinedStates);
-  
-      // Apply the refined filter states
-      const filteredData = applyFilters<ClientInfo>(
-        clients,
-        refinedStates,
-        "purchases.descricao" // Pass tagControl
-      );
-  
-      console.log("filteredData", filteredData);
-      setFilteredClients(filteredData);
-    },
-    [clients]
-  );
-  
+  // Page size and filters restart the listing from the first page
+  const handleRowsPerPageChange = useCallback((rows: number) => {
+    setRowsPerPage(rows);
+    setCursors([null]);
+  }, []);
+
+  const handleFilterChange = useCallback((filterStates: FilterStates) => {
+    const params: Record<string, string | string[]> = {};
+
+    Object.entries(filterStates).forEach(([key, value]) => {
+      // Select filters report a Set of the selected options
+      if ((value as unknown) instanceof Set) {
+        const selected = [...(value as unknown as Set<string>)];
+        if (selected.length === 1) params[key] = selected[0];
+      } else if (key === 'tags' && Array.isArray(value)) {
+        // "+produto" / "-produto", filtered by the purchases of each client
+        const tags = (value as (string | undefined)[])
+          .filter((v): v is string => v !== undefined && v.trim() !== '')
+          .map((v) => v.trim().toLowerCase());
+        if (tags.length > 0) params.produto = tags;
+      } else if (key === 'ultima_compra' && Array.isArray(value)) {
+        const [start, end] = value;
+        if (start) params.ultima_compra_de = start;
+        if (end) params.ultima_compra_ate = end;
+      } else if (TEXT_FILTERS.includes(key) && typeof value === 'string' && value.trim() !== '') {
+        params[key] = value.trim();
+      }
+    });
+
+    setFilters(params);
+    setCursors([null]);
+  }, []);
 
   const formatDate = (date: string) => {
     const parsedDate = new Date(date);
@@ -194,7 +215,7 @@ const CustomerListTable: React.FC = () => {
     <div className="mx-auto">
       <Spacer y={10} />
       <TableHandler
-        data={filteredClients}
+        data={clients}
         idKey={['id', 'nome']}
         filters={[
           { field: 'input', controlfield: 'nome', placeholder: 'Filtrar pelo nome', className: 'col-span-8' },
@@ -218,6 +239,8 @@ const CustomerListTable: React.FC = () => {
           { field: 'input', controlfield: 'cidade', placeholder: 'Filtrar pela cidade', className: 'col-span-4' },
           { field: 'input', controlfield: 'estado', placeholder: 'Filtrar pelo estado', className: 'col-span-4' },
           { field: 'input', controlfield: 'situacao', placeholder: 'Filtrar pela situação', className: 'col-span-8' },
+          { field: 'input', controlfield: 'rota', placeholder: 'Filtrar pela rota', className: 'col-span-4' },
+          { field: 'input', controlfield: 'vendedor', placeholder: 'Filtrar pelo vendedor', className: 'col-span-4' },
           { field: 'comparator', type: 'date', controlfield: 'ultima_compra', placeholder: 'Filtrar pela data da ultima compra', className: 'col-span-8' }
         ]}
         columns={visibleColumns}
@@ -225,6 +248,15 @@ const CustomerListTable: React.FC = () => {
         sortDescriptor={sortDescriptor}
         onSortChange={setSortDescriptor}
         onFilterStatesChange={handleFilterChange}
+        onRowsPerPageChange={handleRowsPerPageChange}
+        cursorPagination={{
+          currentPage: cursors.length,
+          hasPrevious: cursors.length > 1,
+          hasNext: nextCursor !== null,
+          isLoading,
+          onPrevious: () => setCursors((previous) => previous.slice(0, -1)),
+          onNext: () => nextCursor && setCursors((previous) => [...previous, nextCursor]),
+        }}
         renderCell={(item: ClientInfo, columnKey: keyof ClientInfo) => renderCell(item, columnKey)}
       />
     </div>
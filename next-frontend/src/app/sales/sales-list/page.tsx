@@ -4,7 +4,6 @@ import React, { useState, useCallback, useEffect, useMemo } from 'react';
 import axios from 'axios';
 import TableHandler from '@/components/table-components/table';
 import { SortDescriptor, Link, Spacer } from '@nextui-org/react';
-import { applyFilters } from '@/components/utility/process-filters';
 
 interface ItemVenda {
   id_item_venda: number;
@@ -27,12 +26,28 @@ interface Venda {
   itens_venda: ItemVenda[];
 }
 
+interface VendasPage {
+  count: number;
+  next: string | null;
+  previous: string | null;
+  results: Venda[];
+}
+
+type FilterStates = Record<string, string | boolean | [(string | undefined)?, (string | undefined)?]>;
+
 // Define the API URL
 const API_URL = process.env.NEXT_PUBLIC_API_URL;
 
+// Filters sent as they are to /vendas/
+const SERVER_FILTERS = ['numero', 'loja', 'situacao', 'canal_venda'];
+
 const SellListTable: React.FC = () => {
   const [sells, setSells] = useState<Venda[]>([]);
-  const [filteredSells, setFilteredSells] = useState<Venda[]>([]);
+  const [count, setCount] = useState(0);
+  const [filters, setFilters] = useState<Record<string, string>>({});
+  const [rowsPerPage, setRowsPerPage] = useState(25);
+  const [page, setPage] = useState(1);
+  const [isLoading, setIsLoading] = useState(false);
   const [sortDescriptor, setSortDescriptor] = useState<SortDescriptor>({
     column: 'data_compra',
     direction: 'ascending',
@@ -48,34 +63,47 @@ const SellListTable: React.FC = () => {
     { columnKey: 'itens_venda', label: 'Itens', visible: true, sortable: false },
   ], []);
 
-  // Fetch data from API
+  // Fetch only the page being rendered
   const fetchSells = useCallback(async () => {
+    setIsLoading(true);
     try {
-      const response = await axios.get<Venda[]>(`${API_URL}/vendas/`);
-      setSells(response.data);
+      const response = await axios.get<VendasPage>(`${API_URL}/vendas/`, {
+        params: { ...filters, limit: rowsPerPage, offset: (page - 1) * rowsPerPage },
+      });
+      setSells(response.data.results);
+      setCount(response.data.count);
     } catch (error) {
       console.error('Erro ao buscar dados das vendas:', error);
+    } finally {
+      setIsLoading(false);
     }
-  }, []);
+  }, [filters, rowsPerPage, page]);
 
   useEffect(() => {
     fetchSells();
   }, [fetchSells]);
 
-  // Apply filters whenever sells change
-  useEffect(() => {
-    const filteredData = applyFilters<Venda>(sells, {});
-    setFilteredSells(filteredData);
-  }, [sells]);
+  // Page size and filters restart the listing from the first page
+  const handleRowsPerPageChange = useCallback((rows: number) => {
+    setRowsPerPage(rows);
+    setPage(1);
+  }, []);
 
   // Handle filter changes
-  const handleFilterChange = useCallback((filterStates: Record<string, string | boolean | [(string | undefined)?, (string | undefined)?]>) => {
-    const refinedStates = Object.fromEntries(
-      Object.entries(filterStates).map(([key, value]) => [key, value])
-    );
-    const filteredData = applyFilters<Venda>(sells, refinedStates);
-    setFilteredSells(filteredData);
-  }, [sells]);
+  const handleFilterChange = useCallback((filterStates: FilterStates) => {
+    const params: Record<string, string> = {};
+    Object.entries(filterStates).forEach(([key, value]) => {
+      if (key === 'data_compra' && Array.isArray(value)) {
+        const [start, end] = value;
+        if (start) params.start_date = start;
+        if (end) params.end_date = end;
+      } else if (SERVER_FILTERS.includes(key) && typeof value === 'string' && value.trim() !== '') {
+        params[key] = value.trim();
+      }
+    });
+    setFilters(params);
+    setPage(1);
+  }, []);
 
   // Render cell content
   const renderCell = useCallback((row: Venda, columnKey: string) => {
@@ -113,19 +141,30 @@ const SellListTable: React.FC = () => {
     <div className="container mx-auto">
       <Spacer y={10} />
       <TableHandler
-        data={filteredSells}
+        data={sells}
         idKey={['numero', 'id']}
         filters={[
           { field: 'input', controlfield: 'numero', placeholder: 'Número do Pedido', className: 'col-span-8' },
           { field: 'input', controlfield: 'loja', placeholder: 'Loja', className: 'col-span-8' },
           { field: 'input', controlfield: 'situacao', placeholder: 'Situação', className: 'col-span-4' },
           { field: 'input', controlfield: 'canal_venda', placeholder: 'Canal de Venda', className: 'col-span-4' },
+          { field: 'comparator', type: 'date', controlfield: 'data_compra', placeholder: 'Data da Compra', className: 'col-span-8' },
         ]}
         columns={visibleColumns}
         className="container mx-auto"
         sortDescriptor={sortDescriptor}
         onSortChange={setSortDescriptor}
         onFilterStatesChange={handleFilterChange}
+        onRowsPerPageChange={handleRowsPerPageChange}
+        cursorPagination={{
+          currentPage: page,
+          hasPrevious: page > 1,
+          hasNext: page * rowsPerPage < count,
+          isLoading,
+          dataCount: count,
+          onPrevious: () => setPage((current) => Math.max(current - 1, 1)),
+          onNext: () => setPage((current) => current + 1),
+        }}
         renderCell={renderCell}
       />
     </div>
@@ -0,0 +1,39 @@
+// src/components/CursorBottomContent.tsx
+import React from "react";
+import { Button } from "@nextui-org/react";
+
+export interface CursorPagination {
+    currentPage: number;
+    hasPrevious: boolean;
+    hasNext: boolean;
+    isLoading?: boolean;
+    dataCount?: number;
+    onPrevious: () => void;
+    onNext: () => void;
+}
+
+const CursorBottomContentComponent: React.FC<CursorPagination> = ({
+  currentPage, hasPrevious, hasNext, isLoading, dataCount,
+  onPrevious, onNext
+}) => {
+  return (
+    <div className="py-2 px-2 flex justify-between items-center">
+      <div className="flex gap-2 items-center">
+        <Button size="sm" variant="light" className="text-default-200" isDisabled={!hasPrevious || isLoading} onPress={onPrevious}>
+          Anterior
+        </Button>
+        <span className="text-md text-default-300">Página {currentPage}</span>
+        <Button size="sm" variant="light" className="text-default-200" isDisabled={!hasNext || isLoading} onPress={onNext}>
+          Próxima
+        </Button>
+      </div>
+      {dataCount !== undefined && (
+        <span className="text-md text-default-300">
+          Total de registos: {dataCount}
+        </span>
+      )}
+    </div>
+  );
+}
+
+export default CursorBottomContentComponent;
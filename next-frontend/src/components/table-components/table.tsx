@@ -12,6 +12,7 @@ import {
 
 import TopContentComponent from "./top-content";
 import BottomContentComponent from "./bottom-content";
+import CursorBottomContentComponent, { CursorPagination } from "./cursor-bottom-content";
 
 interface TableHandlerProps<T>{
 	data: T[];
@@ -23,6 +24,9 @@ interface TableHandlerProps<T>{
 	onSortChange: (descriptor: SortDescriptor) => void;
 	renderCell: (item: T, columnKey: keyof T) => React.ReactNode;
 	onFilterStatesChange: (states: Record<string, string | boolean | [(string | undefined)?, (string | undefined)?]>) => void
+	// Server-side (cursor) pagination: `data` is already the current page
+	cursorPagination?: CursorPagination;
+	onRowsPerPageChange?: (rowsPerPage: number) => void;
 }
 
 interface Columns {
@@ -69,10 +73,16 @@ const TableHandler = <T,>(props: TableHandlerProps<T>): React.ReactElement => {
   const pages = Math.ceil(props.data.length / rowsPerPage);
 
   const paginatedData = React.useMemo(() => {
+    if (props.cursorPagination) return sortedData;
     const start = (page - 1) * rowsPerPage;
     const end = start + rowsPerPage;
     return sortedData.slice(start, end);
-  }, [sortedData, rowsPerPage, page]);
+  }, [sortedData, rowsPerPage, page, props.cursorPagination]);
+
+  const handleLineChange = (line: number) => {
+    setRowsPerPage(line);
+    props.onRowsPerPageChange?.(line);
+  };
 
   const handleColumnsChange = (updatedColumns: Columns[]) => {
     // handle column visibility changes here
@@ -121,20 +131,24 @@ const TableHandler = <T,>(props: TableHandlerProps<T>): React.ReactElement => {
             line={rowsPerPage}
             onFilterStatesChange={props.onFilterStatesChange}
             onColumnsChange={handleColumnsChange}
-            onLineChange={setRowsPerPage}
+            onLineChange={handleLineChange}
           />
         </div>
       }
       bottomContentPlacement="outside"
       bottomContent={
         <div>
-          <BottomContentComponent
-            dataCount={props.data.length}
-            rowsPerPage={rowsPerPage}
-            currentPage={page}
-            pages={pages}
-            onPageChange={setPage}
-          />
+          {props.cursorPagination ? (
+            <CursorBottomContentComponent {...props.cursorPagination} />
+          ) : (
+            <BottomContentComponent
+              dataCount={props.data.length}
+              rowsPerPage={rowsPerPage}
+              currentPage={page}
+              pages={pages}
+              onPageChange={setPage}
+            />
+          )}
         </div>
       }
     >